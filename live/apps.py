@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LiveConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'live'
+
+    def ready(self):
+        # Connects the connection_created receivers, registers the checks
+        from . import checks, db, metrics  # noqa: F401
@@ -0,0 +1,74 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+
+@dataclass
+class LoadResult:
+    name: str
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies) + self.errors
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent) -> float:
+        if not self.latencies:
+            return 0.0
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[
+            percent - 1
+        ]
+
+    def row(self) -> str:
+        return (
+            f"{self.name:<18}{self.requests:>9}{self.errors:>8}"
+            f"{self.throughput:>10.1f}"
+            f"{self.percentile(50) * 1000:>10.1f}"
+            f"{self.percentile(95) * 1000:>10.1f}"
+            f"{self.percentile(99) * 1000:>10.1f}"
+        )
+
+
+HEADER = (
+    f"{'scenario':<18}{'requests':>9}{'errors':>8}{'req/s':>10}"
+    f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+)
+
+
+def run_load(name, call, total, concurrency) -> LoadResult:
+    """
+    Run ``call(i)`` for ``i`` in ``range(total)`` on ``concurrency`` threads.
+
+    ``call`` returns ``True`` on success; exceptions and ``False`` are errors.
+    """
+    result = LoadResult(name)
+    lock = threading.Lock()
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception:
+            ok = False
+        latency = time.perf_counter() - started
+        with lock:
+            if ok:
+                result.latencies.append(latency)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(total)))
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,202 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+
+from .metrics import Counter, registry
+from .models import Stream
+
+STREAM_KEY = "live:stream:{}:{}"
+STREAM_VERSION_KEY = "live:stream-version:{}"
+STREAM_LIST_VERSION_KEY = "live:stream-version:list"
+STREAM_VERSION_TTL = 24 * 60 * 60
+
+stream_cache_requests = registry.register(
+    Counter("live_stream_cache_requests_total", "Stream cache lookups by result.")
+)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS) -> bool:
+    """Whether other processes see what is written to the ``alias`` cache."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+class LocalBackend:
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+
+    def get(self, key) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set_many(self, values: dict, ttl):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class SharedBackend:
+    """A Django cache alias, shared by every process using the same cache."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get(self, key) -> Optional[dict]:
+        return self.cache.get(key)
+
+    def set_many(self, values: dict, ttl):
+        self.cache.set_many(values, ttl)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(keys)
+
+
+class StreamCache:
+    """
+    Read-through cache of ``Stream`` rows keyed by pk and by Mux ``stream_id``.
+
+    Rows are stored as plain dicts of the concrete field values and rebuilt
+    with ``Stream.from_db``, so callers get a regular model instance. Entries
+    are dropped by the ``post_save``/``post_delete`` receivers in models.py.
+    The ``local`` backend only sees invalidations from its own process, other
+    workers catch up after ``LIVE_STREAM_CACHE_TTL`` seconds; use ``shared``
+    when that is too long.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+        self.fields = [field.attname for field in Stream._meta.concrete_fields]
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    name = settings.LIVE_STREAM_CACHE_BACKEND
+                    if name == "local":
+                        self._backend = LocalBackend(
+                            settings.LIVE_STREAM_CACHE_MAX_ENTRIES
+                        )
+                    elif name == "shared":
+                        self._backend = SharedBackend(settings.LIVE_STREAM_CACHE_ALIAS)
+                    else:
+                        raise ValueError(f"Unknown stream cache backend {name!r}.")
+        return self._backend
+
+    def key(self, lookup, value):
+        return STREAM_KEY.format(lookup, value)
+
+    def get(self, lookup, value) -> Optional[Stream]:
+        if value is None:
+            return None
+        backend = settings.LIVE_STREAM_CACHE_BACKEND
+        data = self.backend.get(self.key(lookup, value))
+        if data is not None:
+            stream_cache_requests.inc(backend=backend, result="hit")
+            return self.build(data)
+
+        stream_cache_requests.inc(backend=backend, result="miss")
+        data = (
+            Stream.objects.using(DEFAULT_DB_ALIAS)
+            .filter(**{lookup: value})
+            .values(*self.fields)
+            .first()
+        )
+        if data is None:
+            return None
+        keys = [self.key("pk", data["id"])]
+        if data["stream_id"] is not None:
+            keys.append(self.key("stream_id", data["stream_id"]))
+        self.backend.set_many(
+            dict.fromkeys(keys, data),
+            settings.LIVE_STREAM_CACHE_TTL,
+        )
+        return self.build(data)
+
+    def build(self, data: dict) -> Stream:
+        return Stream.from_db(
+            DEFAULT_DB_ALIAS, self.fields, [data[field] for field in self.fields]
+        )
+
+    def invalidate(self, stream: Stream):
+        keys = [self.key("pk", stream.pk)]
+        if stream.stream_id is not None:
+            keys.append(self.key("stream_id", stream.stream_id))
+        self.backend.delete_many(keys)
+
+
+stream_cache = StreamCache()
+
+
+class StreamVersions:
+    """
+    Opaque version tokens of each stream and of the stream list, kept in the
+    shared cache.
+
+    Rendered pages put the version in their cache key, so bumping it on every
+    change retires all of them at once without knowing which keys exist.
+    """
+
+    def new_version(self) -> str:
+        return uuid.uuid4().hex[:12]
+
+    def get_many(self, keys) -> dict:
+        versions = cache.get_many(keys)
+        missing = {key: self.new_version() for key in keys if key not in versions}
+        if missing:
+            # add() so concurrent readers agree on the first version
+            for key, version in missing.items():
+                cache.add(key, version, STREAM_VERSION_TTL)
+            versions.update(cache.get_many(list(missing)))
+        return versions
+
+    def get(self, pk) -> str:
+        key = STREAM_VERSION_KEY.format(pk)
+        return self.get_many([key])[key]
+
+    def get_list(self) -> str:
+        return self.get_many([STREAM_LIST_VERSION_KEY])[STREAM_LIST_VERSION_KEY]
+
+    def get_streams(self, pks) -> dict:
+        keys = {STREAM_VERSION_KEY.format(pk): pk for pk in pks}
+        return {keys[key]: version for key, version in self.get_many(keys).items()}
+
+    def bump(self, pk):
+        cache.set_many(
+            {
+                STREAM_VERSION_KEY.format(pk): self.new_version(),
+                STREAM_LIST_VERSION_KEY: self.new_version(),
+            },
+            STREAM_VERSION_TTL,
+        )
+
+
+stream_versions = StreamVersions()
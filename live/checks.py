@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .cache import is_shared_cache
+
+HINT = "Set REDIS_URL or MEMCACHED_LOCATION."
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    if is_shared_cache():
+        return []
+    errors = []
+    if settings.MUX_VIEWER_COUNTS_POLLING:
+        errors.append(
+            Error(
+                "MUX_VIEWER_COUNTS_POLLING needs a shared cache: the web workers "
+                "would never see the counts written by poll_viewer_counts.",
+                hint=HINT,
+                id="live.E001",
+            )
+        )
+    if settings.MUX_ASYNC_JOBS:
+        errors.append(
+            Error(
+                "MUX_ASYNC_JOBS needs a shared cache: the web workers would keep "
+                "serving the pages cached before run_mux_jobs changed a stream.",
+                hint=HINT,
+                id="live.E002",
+            )
+        )
+    return errors
+
+
+@register(deploy=True)
+def shared_cache_deploy_check(app_configs, **kwargs):
+    if is_shared_cache():
+        return []
+    return [
+        Warning(
+            "The default cache is process-local: viewer counts, stream versions "
+            "and the live-now feed are not shared between workers.",
+            hint=HINT,
+            id="live.W001",
+        )
+    ]
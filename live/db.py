@@ -0,0 +1,122 @@
+"""
+Database routing and connection setup.
+
+Views with ``replica_reads = True`` read from a random alias of
+``DATABASE_REPLICAS`` on GET and HEAD; everything else reads and writes the
+primary. Reads stay on the primary once the request has written, and for
+``DATABASE_REPLICA_PIN`` seconds after any unsafe request of the same client
+(the ``PRIMARY_COOKIE`` cookie), so clients see their own writes while the
+replicas catch up. Code that fills a shared cache reads the primary with
+``.using(DEFAULT_DB_ALIAS)`` or ``use_primary()``, a lagging replica would
+otherwise cache stale rows for everyone.
+
+SQLite connections get the ``SQLITE_PRAGMAS`` when they open.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PRIMARY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def use_primary():
+    return replica_reads(False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # The rest of the request reads its own write
+        _replica_reads.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django would run a sync process_view in a thread
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with use_primary():
+            response = self.get_response(request)
+        return self.pin_primary(request, response)
+
+    async def __acall__(self, request):
+        with use_primary():
+            response = await self.get_response(request)
+        return self.pin_primary(request, response)
+
+    def pin_primary(self, request, response):
+        if request.method not in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICA_PIN,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        if (
+            getattr(view_class, "replica_reads", False)
+            and request.method in SAFE_METHODS
+            and PRIMARY_COOKIE not in request.COOKIES
+        ):
+            # Reset when __call__ leaves use_primary(); a streaming body is
+            # consumed after that and reads the primary
+            _replica_reads.set(True)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ReplicaMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .stats import viewer_counts
+from .tokens import status_tokens
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = object()
+
+
+def snapshot(stream_id) -> Optional[dict]:
+    """Current status and viewer counts of a stream, ``None`` once it is gone."""
+    status_token = status_tokens.get(stream_id)
+    if status_token is None:
+        return None
+
+    try:
+        counts = viewer_counts.get(stream_id, status_token.token)
+    except Exception:
+        counts = {}
+
+    return {
+        "status": status_token.status,
+        "views": counts.get("views", 0),
+        "viewers": counts.get("viewers", 0),
+    }
+
+
+class StreamTopic:
+    """Latest payload of one stream, shared by every connection watching it."""
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.subscribers = 0
+        self.version = 0
+        self.payload = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, payload):
+        if self.version and payload == self.payload:
+            return
+        self.payload = payload
+        self.version += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, timeout) -> bool:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class StreamEventHub:
+    """
+    Fans status and viewer-count updates out to server-sent event connections.
+
+    Each stream has a single polling task per process, started with its first
+    listener and cancelled with its last one. Connections only keep the version
+    of the last payload they sent, so idle viewers cost one suspended coroutine.
+    """
+
+    def __init__(self):
+        self._topics: dict[int, StreamTopic] = {}
+
+    async def listen(self, stream_id):
+        topic = self._subscribe(stream_id)
+        version = 0
+        try:
+            while True:
+                if topic.version == version:
+                    if not await topic.wait(settings.LIVE_EVENTS_HEARTBEAT):
+                        yield HEARTBEAT
+                    continue
+
+                version = topic.version
+                yield topic.payload
+                if topic.payload is None:
+                    return
+        finally:
+            self._unsubscribe(topic)
+
+    def _subscribe(self, stream_id) -> StreamTopic:
+        topic = self._topics.get(stream_id)
+        if topic is None:
+            topic = self._topics[stream_id] = StreamTopic(stream_id)
+            topic.task = asyncio.create_task(self._poll(topic))
+        topic.subscribers += 1
+        return topic
+
+    def _unsubscribe(self, topic: StreamTopic):
+        topic.subscribers -= 1
+        if topic.subscribers == 0:
+            topic.task.cancel()
+            self._topics.pop(topic.stream_id, None)
+
+    async def _poll(self, topic: StreamTopic):
+        fetch = sync_to_async(snapshot, thread_sensitive=False)
+        while True:
+            try:
+                payload = await fetch(topic.stream_id)
+            except Exception:
+                logger.exception("Could not poll stream %s.", topic.stream_id)
+            else:
+                topic.publish(payload)
+                if payload is None:
+                    return
+            await asyncio.sleep(settings.LIVE_EVENTS_INTERVAL)
+
+
+stream_events = StreamEventHub()
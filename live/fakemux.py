@@ -0,0 +1,257 @@
+"""
+Local stand-in for the parts of the Mux API this project uses.
+
+Serves live streams, simulcast targets, stream keys and the ``/counts`` viewer
+endpoint from memory, with configurable latency and error injection, so the
+views can be exercised and load tested without a Mux account. Start it with
+``manage.py run_fake_mux`` and point ``MUX_API_HOST``/``MUX_STATS_URL`` at it.
+"""
+
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LIVE_STREAMS = "/video/v1/live-streams"
+
+
+class FakeMux:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Number of upcoming requests answered with a 503
+        self.fail_next = 0
+        self.live_streams: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def new_id(self):
+        return secrets.token_hex(16)
+
+    def create_live_stream(self, body: dict) -> dict:
+        live_stream = {
+            "id": self.new_id(),
+            "created_at": str(int(time.time())),
+            "stream_key": secrets.token_hex(18),
+            "status": "idle",
+            "playback_ids": [
+                {"id": self.new_id(), "policy": policy}
+                for policy in body.get("playback_policy") or ["public"]
+            ],
+            "latency_mode": body.get("latency_mode") or "standard",
+            "test": bool(body.get("test")),
+            "simulcast_targets": [],
+        }
+        with self.lock:
+            self.live_streams[live_stream["id"]] = live_stream
+        return live_stream
+
+    def list_live_streams(self, limit=25, page=1, status=None) -> list:
+        with self.lock:
+            live_streams = [
+                live_stream
+                for live_stream in self.live_streams.values()
+                if status is None or live_stream["status"] == status
+            ]
+        start = (page - 1) * limit
+        return live_streams[start : start + limit]
+
+
+class FakeMuxHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeMuxServer"
+
+    routes = [
+        ("GET", r"/counts", "counts"),
+        ("POST", rf"{LIVE_STREAMS}", "create_live_stream"),
+        ("GET", rf"{LIVE_STREAMS}", "list_live_streams"),
+        ("GET", rf"{LIVE_STREAMS}/(?P<id>\w+)", "get_live_stream"),
+        ("PATCH", rf"{LIVE_STREAMS}/(?P<id>\w+)", "update_live_stream"),
+        ("DELETE", rf"{LIVE_STREAMS}/(?P<id>\w+)", "delete_live_stream"),
+        ("POST", rf"{LIVE_STREAMS}/(?P<id>\w+)/reset-stream-key", "reset_stream_key"),
+        ("PUT", rf"{LIVE_STREAMS}/(?P<id>\w+)/complete", "complete"),
+        ("PUT", rf"{LIVE_STREAMS}/(?P<id>\w+)/disable", "disable"),
+        ("PUT", rf"{LIVE_STREAMS}/(?P<id>\w+)/enable", "enable"),
+        (
+            "POST",
+            rf"{LIVE_STREAMS}/(?P<id>\w+)/simulcast-targets",
+            "create_simulcast_target",
+        ),
+        (
+            "GET",
+            rf"{LIVE_STREAMS}/(?P<id>\w+)/simulcast-targets/(?P<target>\w+)",
+            "get_simulcast_target",
+        ),
+        (
+            "DELETE",
+            rf"{LIVE_STREAMS}/(?P<id>\w+)/simulcast-targets/(?P<target>\w+)",
+            "delete_simulcast_target",
+        ),
+    ]
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        fake = self.server.fake
+        time.sleep(max(0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+        with fake.lock:
+            failing = fake.fail_next > 0
+            fake.fail_next -= failing
+        if failing or fake.error_rate and random.random() < fake.error_rate:
+            return self.respond(503, error="Injected failure.")
+
+        for route_method, pattern, name in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if match and route_method == method:
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                return getattr(self, name)(body=body, query=query, **match.groupdict())
+
+        self.respond(404, error="Not found.")
+
+    def respond(self, status, data=None, error=None):
+        if error is not None:
+            payload = {"error": {"type": "error", "messages": [error]}}
+        else:
+            payload = {"data": data if data is not None else {}}
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def live_stream(self, id):
+        live_stream = self.server.fake.live_streams.get(id)
+        if live_stream is None:
+            self.respond(404, error="Live stream not found.")
+        return live_stream
+
+    def counts(self, query, **kwargs):
+        if not query.get("token"):
+            return self.respond(403, error="Missing token.")
+        viewers = random.randint(0, 1000)
+        self.respond(200, [{"viewers": viewers, "views": viewers * 3}])
+
+    def create_live_stream(self, body, **kwargs):
+        self.respond(201, self.server.fake.create_live_stream(body))
+
+    def list_live_streams(self, query, **kwargs):
+        live_streams = self.server.fake.list_live_streams(
+            limit=int(query.get("limit", 25)),
+            page=int(query.get("page", 1)),
+            status=query.get("status"),
+        )
+        self.respond(200, live_streams)
+
+    def get_live_stream(self, id, **kwargs):
+        live_stream = self.live_stream(id)
+        if live_stream is not None:
+            self.respond(200, live_stream)
+
+    def update_live_stream(self, id, body, **kwargs):
+        live_stream = self.live_stream(id)
+        if live_stream is not None:
+            if body.get("latency_mode"):
+                live_stream["latency_mode"] = body["latency_mode"]
+            self.respond(200, live_stream)
+
+    def delete_live_stream(self, id, **kwargs):
+        with self.server.fake.lock:
+            live_stream = self.server.fake.live_streams.pop(id, None)
+        if live_stream is None:
+            return self.respond(404, error="Live stream not found.")
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def reset_stream_key(self, id, **kwargs):
+        live_stream = self.live_stream(id)
+        if live_stream is not None:
+            live_stream["stream_key"] = secrets.token_hex(18)
+            self.respond(201, live_stream)
+
+    def set_status(self, id, status):
+        live_stream = self.live_stream(id)
+        if live_stream is not None:
+            live_stream["status"] = status
+            self.respond(200)
+
+    def complete(self, id, **kwargs):
+        self.set_status(id, "idle")
+
+    def disable(self, id, **kwargs):
+        self.set_status(id, "disabled")
+
+    def enable(self, id, **kwargs):
+        self.set_status(id, "idle")
+
+    def create_simulcast_target(self, id, body, **kwargs):
+        live_stream = self.live_stream(id)
+        if live_stream is not None:
+            target = {
+                "id": self.server.fake.new_id(),
+                "passthrough": body.get("passthrough"),
+                "status": "idle",
+                "stream_key": body.get("stream_key"),
+                "url": body.get("url"),
+            }
+            live_stream["simulcast_targets"].append(target)
+            self.respond(201, target)
+
+    def find_simulcast_target(self, id, target):
+        live_stream = self.live_stream(id)
+        if live_stream is None:
+            return None, None
+        for simulcast_target in live_stream["simulcast_targets"]:
+            if simulcast_target["id"] == target:
+                return live_stream, simulcast_target
+        self.respond(404, error="Simulcast target not found.")
+        return None, None
+
+    def get_simulcast_target(self, id, target, **kwargs):
+        _, simulcast_target = self.find_simulcast_target(id, target)
+        if simulcast_target is not None:
+            self.respond(200, simulcast_target)
+
+    def delete_simulcast_target(self, id, target, **kwargs):
+        live_stream, simulcast_target = self.find_simulcast_target(id, target)
+        if simulcast_target is not None:
+            live_stream["simulcast_targets"].remove(simulcast_target)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+class FakeMuxServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, fake: FakeMux, verbose=False):
+        super().__init__(address, FakeMuxHandler)
+        self.fake = fake
+        self.verbose = verbose
@@ -0,0 +1,358 @@
+"""
+Index of the streams that are live now, kept in the shared cache.
+
+Each ordering of the feed ("recent", newest first, and "viewers", most
+watched first) is a sorted list of ``[sort key, pk]`` pairs split into chunks
+of about ``CHUNK_SIZE`` pairs under their own keys. A small directory key
+holds the first pair, length and id of every chunk, so reading a page fetches
+the directory, the one or two chunks covering it and the entries of that page:
+no query runs on a warm cache and no read grows with the number of live
+streams. Chunks are copied on write under new ids, so readers never see half
+an edit.
+
+Status transitions update the index in place: ``post_save`` and
+``post_delete`` for single saves, explicit ``update`` calls after the bulk
+writes of the webhooks and the reconciler. An edit rewrites only the chunks it
+touches, found through the ``[sort key, pk]`` pairs each indexed stream keeps
+under its rank key. Edits take a short cache lock; when it is busy the
+directories are dropped instead and the next read rebuilds them from the
+``(status, created_at)`` index. A rebuild runs in one process at a time, the
+other readers wait for its result. Everything expires together
+``LIVE_NOW_TTL`` seconds after the rebuild, which bounds any drift. The index
+is always filled from the primary database, never a replica, and needs a
+cache shared by every process (see ``CACHES``).
+"""
+
+import bisect
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Stream, StreamStatus
+from .stats import VIEWER_COUNTS_KEY
+
+ORDER_KEY = "live:now:{}"
+CHUNK_KEY = "live:now:{}:{}"
+RANK_KEY = "live:now:rank:{}"
+ENTRY_KEY = "live:now:stream:{}"
+LOCK_KEY = "live:now:lock"
+LOCK_TIMEOUT = 5
+REBUILD_KEY = "live:now:rebuild"
+REBUILD_TIMEOUT = 5
+REBUILD_POLL_INTERVAL = 0.05
+# Pairs per chunk; edits split a chunk when it grows past twice this size
+CHUNK_SIZE = 500
+
+ORDERINGS = ("recent", "viewers")
+ENTRY_FIELDS = ["id", "stream_id", "title", "description", "playback_id", "created_at"]
+
+
+class LiveNowIndex:
+    def get_viewers(self, pks) -> dict:
+        entries = cache.get_many([VIEWER_COUNTS_KEY.format(pk) for pk in pks])
+        return {
+            pk: entries.get(VIEWER_COUNTS_KEY.format(pk), {}).get("viewers", 0)
+            for pk in pks
+        }
+
+    def sort_keys(self, entries: list) -> dict:
+        viewers = self.get_viewers([entry["id"] for entry in entries])
+        return {
+            "recent": [
+                [-entry["created_at"].timestamp(), entry["id"]] for entry in entries
+            ],
+            "viewers": [[-viewers[entry["id"]], entry["id"]] for entry in entries],
+        }
+
+    def new_chunks(self, ordering, pairs: list, size=None) -> tuple[list, dict]:
+        """Directory rows and cache values of ``pairs`` cut into fresh chunks."""
+        size = size or CHUNK_SIZE
+        rows, values = [], {}
+        for start in range(0, len(pairs), size):
+            chunk = pairs[start : start + size]
+            chunk_id = uuid.uuid4().hex[:12]
+            rows.append([chunk[0], len(chunk), chunk_id])
+            values[CHUNK_KEY.format(ordering, chunk_id)] = chunk
+        return rows, values
+
+    def ranks(self, orders: dict) -> dict:
+        """Rank values of the pairs in ``orders``, ``{ordering: pairs}``."""
+        ranks = {}
+        for ordering, pairs in orders.items():
+            for pair in pairs:
+                ranks.setdefault(RANK_KEY.format(pair[1]), {})[ordering] = pair
+        return ranks
+
+    def rebuild(self) -> dict:
+        locked = cache.add(REBUILD_KEY, 1, REBUILD_TIMEOUT)
+        if not locked:
+            # Another process is rebuilding, its result serves this read too
+            deadline = time.monotonic() + REBUILD_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(REBUILD_POLL_INTERVAL)
+                directories = self.get_directories()
+                if directories is not None:
+                    return directories
+
+        try:
+            entries = list(
+                Stream.objects.using(DEFAULT_DB_ALIAS)
+                .filter(status=StreamStatus.ACTIVE)
+                .order_by("-created_at", "-id")
+                .values(*ENTRY_FIELDS)
+            )
+            orders = {
+                ordering: sorted(pairs)
+                for ordering, pairs in self.sort_keys(entries).items()
+            }
+            expires_at = time.time() + settings.LIVE_NOW_TTL
+            directories, values = {}, {}
+            for ordering, pairs in orders.items():
+                rows, chunks = self.new_chunks(ordering, pairs)
+                directories[ordering] = {"expires_at": expires_at, "chunks": rows}
+                values.update(chunks)
+            values.update(self.ranks(orders))
+            values.update({ENTRY_KEY.format(entry["id"]): entry for entry in entries})
+            cache.set_many(values, settings.LIVE_NOW_TTL)
+            # Written last, so readers never find a directory without its chunks
+            cache.set_many(
+                {
+                    ORDER_KEY.format(ordering): directory
+                    for ordering, directory in directories.items()
+                },
+                settings.LIVE_NOW_TTL,
+            )
+            return directories
+        finally:
+            if locked:
+                cache.delete(REBUILD_KEY)
+
+    def get_directories(self):
+        keys = {ORDER_KEY.format(ordering): ordering for ordering in ORDERINGS}
+        directories = cache.get_many(keys)
+        if len(directories) < len(keys):
+            return None
+        return {keys[key]: directory for key, directory in directories.items()}
+
+    def get_directory(self, ordering) -> dict:
+        directory = cache.get(ORDER_KEY.format(ordering))
+        if directory is None:
+            directory = self.rebuild()[ordering]
+        return directory
+
+    def get_pairs(self, ordering, offset, limit) -> list:
+        for _ in range(2):
+            directory = self.get_directory(ordering)
+            chunk_ids, skip, position = [], 0, 0
+            for _, count, chunk_id in directory["chunks"]:
+                if position + count > offset and position < offset + limit:
+                    if not chunk_ids:
+                        skip = offset - position
+                    chunk_ids.append(chunk_id)
+                position += count
+
+            keys = [CHUNK_KEY.format(ordering, chunk_id) for chunk_id in chunk_ids]
+            chunks = cache.get_many(keys)
+            if len(chunks) == len(keys):
+                pairs = [pair for key in keys for pair in chunks[key]]
+                return pairs[skip : skip + limit]
+            # A chunk was evicted, start over from the database
+            cache.delete_many([ORDER_KEY.format(o) for o in ORDERINGS])
+        return []
+
+    def get_page(self, ordering, offset, limit) -> list:
+        pks = [pk for _, pk in self.get_pairs(ordering, offset, limit)]
+        cached = cache.get_many([ENTRY_KEY.format(pk) for pk in pks])
+        entries = {pk: cached.get(ENTRY_KEY.format(pk)) for pk in pks}
+
+        missing = [pk for pk, entry in entries.items() if entry is None]
+        if missing:
+            loaded = (
+                Stream.objects.using(DEFAULT_DB_ALIAS)
+                .filter(pk__in=missing, status=StreamStatus.ACTIVE)
+                .values(*ENTRY_FIELDS)
+            )
+            loaded = {entry["id"]: entry for entry in loaded}
+            cache.set_many(
+                {ENTRY_KEY.format(pk): entry for pk, entry in loaded.items()},
+                settings.LIVE_NOW_TTL,
+            )
+            entries.update(loaded)
+
+        viewers = self.get_viewers(pks)
+        return [{**entries[pk], "viewers": viewers[pk]} for pk in pks if entries[pk]]
+
+    def update(self, streams: list):
+        """Apply the current status of ``streams``, which need ``id`` and ``status``."""
+        if not streams:
+            return
+        active = {s.pk: s for s in streams if s.status == StreamStatus.ACTIVE}
+        inactive = [stream.pk for stream in streams if stream.pk not in active]
+
+        entries = [
+            {name: getattr(stream, name) for name in ENTRY_FIELDS}
+            for stream in active.values()
+            if not stream.get_deferred_fields().intersection(ENTRY_FIELDS)
+        ]
+        # Instances loaded with .only(), like the webhook batches
+        deferred = set(active) - {entry["id"] for entry in entries}
+        if deferred:
+            entries += (
+                Stream.objects.using(DEFAULT_DB_ALIAS)
+                .filter(pk__in=deferred)
+                .values(*ENTRY_FIELDS)
+            )
+
+        cache.set_many(
+            {ENTRY_KEY.format(entry["id"]): entry for entry in entries},
+            settings.LIVE_NOW_TTL,
+        )
+        cache.delete_many([ENTRY_KEY.format(pk) for pk in inactive])
+        self.edit_orders(self.sort_keys(entries), [stream.pk for stream in streams])
+
+    def remove(self, pks: list):
+        cache.delete_many([ENTRY_KEY.format(pk) for pk in pks])
+        self.edit_orders({}, pks)
+
+    def set_viewers(self, counts: dict):
+        """
+        Re-rank the "viewers" ordering with a fresh round of viewer counts.
+        Reads and rewrites the whole ordering, so only the poller calls it.
+        """
+        directories = self.get_directories()
+        if directories is None or not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+            return
+        try:
+            recent = directories["recent"]
+            keys = [CHUNK_KEY.format("recent", row[2]) for row in recent["chunks"]]
+            chunks = cache.get_many(keys)
+            if len(chunks) < len(keys):
+                return
+            pks = [pk for key in keys for _, pk in chunks[key]]
+            # Streams missing from the round keep their last known count
+            missing = [pk for pk in pks if pk not in counts]
+            counts = {**self.get_viewers(missing), **counts}
+            ranked = sorted([-counts[pk], pk] for pk in pks)
+
+            ttl = max(1, recent["expires_at"] - time.time())
+            rows, values = self.new_chunks("viewers", ranked)
+            ranks = cache.get_many([RANK_KEY.format(pk) for pk in pks])
+            for pair in ranked:
+                key = RANK_KEY.format(pair[1])
+                values[key] = {**ranks.get(key, {}), "viewers": pair}
+            cache.set_many(values, ttl)
+            directory = {"expires_at": recent["expires_at"], "chunks": rows}
+            cache.set(ORDER_KEY.format("viewers"), directory, ttl)
+        finally:
+            cache.delete(LOCK_KEY)
+
+    def edit_orders(self, added: dict, changed: list):
+        """
+        Insert the ``added`` pairs, ``{ordering: pairs}``, after removing the
+        pairs indexed for the ``changed`` pks.
+        """
+        keys = [ORDER_KEY.format(ordering) for ordering in ORDERINGS]
+        if self.get_directories() is None:
+            # Nothing to edit, the next read builds the orderings
+            cache.delete_many(keys)
+            return
+        ranks = cache.get_many([RANK_KEY.format(pk) for pk in changed])
+        if not any(added.values()) and not ranks:
+            return
+
+        if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+            cache.delete_many(keys)
+            return
+        try:
+            # Read again under the lock
+            directories = self.get_directories()
+            if directories is None:
+                cache.delete_many(keys)
+                return
+            values = {}
+            for ordering, directory in directories.items():
+                removed = [
+                    rank[ordering] for rank in ranks.values() if ordering in rank
+                ]
+                edited = self.edit_chunks(
+                    ordering, directory, added.get(ordering, []), removed
+                )
+                if edited is None:
+                    cache.delete_many(keys)
+                    return
+                values.update(edited)
+
+            expires_at = min(d["expires_at"] for d in directories.values())
+            ttl = max(1, expires_at - time.time())
+            values.update(self.ranks(added))
+            cache.delete_many([key for key in ranks if key not in values])
+            directory_values = {key: values.pop(key) for key in keys if key in values}
+            cache.set_many(values, ttl)
+            cache.set_many(directory_values, ttl)
+        finally:
+            cache.delete(LOCK_KEY)
+
+    def edit_chunks(self, ordering, directory: dict, added: list, removed: list):
+        """
+        Cache values of the chunks touched by the edit and of the new
+        directory, or ``None`` when a touched chunk was evicted.
+        """
+        rows = directory["chunks"]
+        firsts = [row[0] for row in rows]
+
+        def locate(pair):
+            return max(bisect.bisect_right(firsts, pair) - 1, 0)
+
+        touched = {}
+        for pair in removed:
+            touched.setdefault(locate(pair), ([], []))[1].append(pair)
+        for pair in added:
+            touched.setdefault(locate(pair), ([], []))[0].append(pair)
+        if not touched:
+            return {}
+
+        keys = {
+            index: CHUNK_KEY.format(ordering, rows[index][2])
+            for index in touched
+            if index < len(rows)
+        }
+        chunks = cache.get_many(list(keys.values()))
+        if len(chunks) < len(keys):
+            return None
+
+        values = {}
+        new_rows = list(rows)
+        # From the end, so the indexes of the rows still to replace hold
+        for index in sorted(touched, reverse=True):
+            chunk_added, chunk_removed = touched[index]
+            chunk = chunks.get(keys.get(index), [])
+            chunk = [pair for pair in chunk if pair not in chunk_removed]
+            for pair in chunk_added:
+                if pair not in chunk:
+                    bisect.insort(chunk, pair)
+            # Split only past twice the size, so edits around it do not churn
+            size = CHUNK_SIZE if len(chunk) > 2 * CHUNK_SIZE else max(len(chunk), 1)
+            replacement, chunk_values = self.new_chunks(ordering, chunk, size)
+            new_rows[index : index + 1] = replacement
+            values.update(chunk_values)
+
+        values[ORDER_KEY.format(ordering)] = {**directory, "chunks": new_rows}
+        return values
+
+
+class LiveNowFeed:
+    """Sliceable view of one ordering of the index, for the paginators."""
+
+    def __init__(self, ordering="recent"):
+        self.ordering = ordering if ordering in ORDERINGS else "recent"
+
+    def __getitem__(self, page: slice) -> list:
+        return live_now.get_page(
+            self.ordering, page.start or 0, page.stop - (page.start or 0)
+        )
+
+
+live_now = LiveNowIndex()
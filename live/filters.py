@@ -0,0 +1,28 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .search import search_streams
+
+
+class StreamSearchFilter(BaseFilterBackend):
+    """Full-text search on ``?search=``, results ordered by relevance."""
+
+    search_param = "search"
+
+    def is_searching(self, request) -> bool:
+        return self.search_param in request.query_params
+
+    def filter_queryset(self, request, queryset, view):
+        if not self.is_searching(request):
+            return queryset
+        return search_streams(queryset, request.query_params[self.search_param])
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Words in the title or description, best matches first.",
+                "schema": {"type": "string"},
+            }
+        ]
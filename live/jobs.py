@@ -0,0 +1,211 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from mux_python.exceptions import NotFoundException
+
+from .models import MuxJob, MuxJobStatus, MuxOperation, Simulcast, StreamStatus
+from .mux import mux
+from .serializers import SimulcastSerializer
+from .views import (
+    CreateStream,
+    CreateStreamSimulcast,
+    DeleteStream,
+    FinishStream,
+    RemoveStreamSimulcast,
+    ResetStreamKey,
+)
+
+
+def create_stream(job: MuxJob):
+    stream = job.stream
+    if not stream.stream_id:
+        mux_stream_id = job.payload.get("mux_stream_id")
+        if mux_stream_id:
+            # An earlier attempt created the Mux stream but lost the local save
+            mux_data = mux.live_streams.get_live_stream(mux_stream_id)
+        else:
+            mux_data = CreateStream().create_mux_stream(
+                stream.visibility, stream.latency_mode, stream.test_mode
+            )
+            # Recorded before the stream is saved, so a retry reuses it; a
+            # crash between the two writes leaves an orphan for reconcile_mux
+            job.payload["mux_stream_id"] = mux_data.data.id
+            try:
+                MuxJob.objects.filter(pk=job.pk).update(payload=job.payload)
+            except Exception:
+                delete_mux_stream(mux_data.data.id)
+                raise
+        stream.stream_id = mux_data.data.id
+        stream.playback_id = mux_data.data.playback_ids[0].id
+        stream.stream_key = mux_data.data.stream_key
+        stream.save(
+            update_fields=["stream_id", "playback_id", "stream_key", "updated_at"]
+        )
+    return {"stream_id": stream.stream_id, "playback_id": stream.playback_id}
+
+
+def delete_mux_stream(stream_id):
+    try:
+        DeleteStream().delete_mux_stream(stream_id)
+    except NotFoundException:
+        pass  # Already deleted by an earlier attempt
+
+
+def cancel_create(stream) -> list:
+    """
+    Cancel the pending create job of ``stream`` and return the Mux streams its
+    attempts created. Raises while the create runs, so the delete retries.
+    """
+    creates = MuxJob.objects.filter(stream=stream, operation=MuxOperation.CREATE_STREAM)
+    # Conditional, like claim_jobs, so a worker cannot claim it meanwhile
+    creates.filter(status=MuxJobStatus.PENDING).update(
+        status=MuxJobStatus.FAILED, error="Cancelled by a delete."
+    )
+    if creates.filter(status=MuxJobStatus.RUNNING).exists():
+        raise RuntimeError("The stream is still being created on Mux.")
+    payloads = creates.values_list("payload", flat=True)
+    return [
+        payload["mux_stream_id"] for payload in payloads if "mux_stream_id" in payload
+    ]
+
+
+def delete_stream(job: MuxJob):
+    stream_ids = [job.payload["stream_id"]]
+    if stream_ids[0] is None and job.stream is not None:
+        # Queued while the stream waited on its create job
+        job.stream.refresh_from_db(fields=["stream_id"])
+        stream_ids = [job.stream.stream_id]
+        if stream_ids[0] is None:
+            stream_ids = cancel_create(job.stream)
+    for stream_id in stream_ids:
+        if stream_id is not None:
+            delete_mux_stream(stream_id)
+    if job.stream is not None:
+        job.stream.delete()
+        job.stream = None
+
+
+def finish_stream(job: MuxJob):
+    FinishStream().finish_mux_stream(job.stream.stream_id)
+    job.stream.status = StreamStatus.IDLE
+    job.stream.save(update_fields=["status", "updated_at"])
+
+
+def reset_stream_key(job: MuxJob):
+    job.stream.stream_key = ResetStreamKey().regenerate_mux_stream_key(
+        job.stream.stream_id
+    )
+    job.stream.save(update_fields=["stream_key", "updated_at"])
+
+
+def create_simulcast(job: MuxJob):
+    stream_key = job.payload["stream_key"]
+    url = job.payload["url"]
+    simulcast = Simulcast.objects.filter(
+        stream=job.stream, stream_key=stream_key
+    ).first()
+    if simulcast is None:
+        response = CreateStreamSimulcast().create_mux_simulcast(
+            job.stream.stream_id, stream_key, url
+        )
+        try:
+            with transaction.atomic():
+                simulcast = Simulcast.objects.create(
+                    simulcast_id=response.data.id,
+                    stream=job.stream,
+                    stream_key=stream_key,
+                    url=url,
+                )
+        except IntegrityError:
+            # The stream key is taken, the target must not outlive the failure
+            remove_mux_simulcast(job.stream.stream_id, response.data.id)
+            raise
+    return SimulcastSerializer(simulcast).data
+
+
+def remove_mux_simulcast(stream_id, simulcast_id):
+    try:
+        RemoveStreamSimulcast().remove_mux_simulcast(stream_id, simulcast_id)
+    except NotFoundException:
+        pass  # Already removed by an earlier attempt
+
+
+def remove_simulcast(job: MuxJob):
+    simulcast_id = job.payload["simulcast_id"]
+    remove_mux_simulcast(job.stream.stream_id, simulcast_id)
+    Simulcast.objects.filter(simulcast_id=simulcast_id).delete()
+
+
+HANDLERS = {
+    MuxOperation.CREATE_STREAM: create_stream,
+    MuxOperation.DELETE_STREAM: delete_stream,
+    MuxOperation.FINISH_STREAM: finish_stream,
+    MuxOperation.RESET_STREAM_KEY: reset_stream_key,
+    MuxOperation.CREATE_SIMULCAST: create_simulcast,
+    MuxOperation.REMOVE_SIMULCAST: remove_simulcast,
+}
+
+
+def claim_jobs(limit) -> list:
+    """Lock up to ``limit`` runnable jobs for this worker."""
+    now = timezone.now()
+    runnable = Q(status=MuxJobStatus.PENDING, run_after__lte=now) | Q(
+        # Jobs of a worker that died mid-run
+        status=MuxJobStatus.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.MUX_JOB_LEASE),
+    )
+    candidates = MuxJob.objects.filter(runnable).order_by("run_after")
+    claimed = []
+    for pk in candidates.values_list("pk", flat=True)[:limit]:
+        # Conditional update so concurrent workers never claim the same job
+        if (
+            MuxJob.objects.filter(runnable, pk=pk).update(
+                status=MuxJobStatus.RUNNING,
+                locked_at=now,
+                attempts=F("attempts") + 1,
+            )
+            == 1
+        ):
+            claimed.append(pk)
+    return list(MuxJob.objects.select_related("stream").filter(pk__in=claimed))
+
+
+def retry_delay(attempts) -> float:
+    delay = settings.MUX_JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return random.uniform(0, min(delay, settings.MUX_JOB_RETRY_BACKOFF_MAX))
+
+
+def run_job(job: MuxJob) -> MuxJob:
+    try:
+        if job.operation != MuxOperation.DELETE_STREAM and job.stream is None:
+            raise ValueError("The stream of this job no longer exists.")
+        job.result = HANDLERS[job.operation](job)
+    except Exception as exc:
+        job.error = str(exc) or exc.__class__.__name__
+        if job.attempts >= settings.MUX_JOB_MAX_ATTEMPTS:
+            job.status = MuxJobStatus.FAILED
+        else:
+            job.status = MuxJobStatus.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts)
+            )
+    else:
+        job.status = MuxJobStatus.SUCCEEDED
+        job.error = None
+
+    job.locked_at = None
+    job.save(
+        update_fields=[
+            "status",
+            "result",
+            "error",
+            "run_after",
+            "locked_at",
+            "updated_at",
+        ]
+    )
+    return job
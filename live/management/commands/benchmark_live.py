@@ -0,0 +1,107 @@
+import threading
+import uuid
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from live.benchmark import HEADER, run_load
+
+SCENARIOS = {
+    "create": "create_stream",
+    "list": "list_streams",
+    "retrieve": "retrieve_stream",
+    "status": "stream_status",
+    "simulcast-create": "create_simulcast",
+    "simulcast-list": "list_simulcasts",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the live API of a running server at a fixed concurrency and report "
+        "latency percentiles and throughput. Run the server against "
+        "`manage.py run_fake_mux` to keep Mux out of the measurement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per scenario."
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=SCENARIOS,
+            help="Scenario to run, may be repeated. Defaults to all of them.",
+        )
+
+    def handle(self, *args, **options):
+        self.base_url = options["base_url"].rstrip("/")
+        self.local = threading.local()
+        self.streams = []
+        self.lock = threading.Lock()
+
+        scenarios = options["scenario"] or list(SCENARIOS)
+        if "create" not in scenarios:
+            # Every other scenario needs streams to read
+            self.seed(min(options["requests"], 50), options["concurrency"])
+
+        self.stdout.write(HEADER)
+        for name in scenarios:
+            call = getattr(self, SCENARIOS[name])
+            result = run_load(name, call, options["requests"], options["concurrency"])
+            self.stdout.write(result.row())
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def url(self, path):
+        return f"{self.base_url}/live/{path}"
+
+    def stream(self, i) -> dict:
+        return self.streams[i % len(self.streams)]
+
+    def seed(self, count, concurrency):
+        run_load("seed", self.create_stream, count, concurrency)
+        if not self.streams:
+            raise CommandError(f"Could not create any stream at {self.base_url}.")
+
+    def create_stream(self, i):
+        response = self.session.post(
+            self.url("create/"), json={"title": f"Benchmark {uuid.uuid4().hex[:8]}"}
+        )
+        if response.status_code != 201:
+            return False
+        with self.lock:
+            self.streams.append(response.json())
+        return True
+
+    def list_streams(self, i):
+        return self.session.get(self.url("list/")).ok
+
+    def retrieve_stream(self, i):
+        return self.session.get(self.url(f"{self.stream(i)['stream_id']}/")).ok
+
+    def stream_status(self, i):
+        return self.session.get(self.url(f"status/{self.stream(i)['id']}")).ok
+
+    def create_simulcast(self, i):
+        key = uuid.uuid4().hex
+        response = self.session.post(
+            self.url("simulcast/create"),
+            json={
+                "stream": self.stream(i)["id"],
+                "stream_key": key,
+                "simulcast_id": key,
+                "url": "rtmp://127.0.0.1/live",
+            },
+        )
+        return response.ok
+
+    def list_simulcasts(self, i):
+        stream_id = self.stream(i)["stream_id"]
+        return self.session.get(self.url(f"simulcast/list/{stream_id}")).ok
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from live.models import Stream
+from live.renderers import FastJSONRenderer
+from live.serializers import (
+    SimpleStreamSerializer,
+    StreamSerializer,
+    compile_representation,
+)
+
+SERIALIZERS = [StreamSerializer, SimpleStreamSerializer]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the DRF serializers with the compiled .values() path on one large "
+        "page of streams. The rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs per path, the best one counts."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Stream.objects.bulk_create(
+                Stream(
+                    title=f"Benchmark stream {i} – ação",
+                    description=None if i % 3 else f"Description {i}",
+                    stream_id=f"benchmark-{i}",
+                    playback_id=f"benchmark-playback-{i}",
+                )
+                for i in range(options["rows"])
+            )
+            queryset = Stream.objects.filter(stream_id__startswith="benchmark-")
+
+            self.stdout.write(f"{'serializer':<24}{'path':<10}{'best ms':>10}")
+            for serializer_class in SERIALIZERS:
+                self.compare(serializer_class, queryset, options["repeat"])
+            transaction.set_rollback(True)
+
+    def compare(self, serializer_class, queryset, repeat):
+        queryset = queryset.order_by("-created_at", "-id")
+        representation = compile_representation(serializer_class)
+
+        def drf():
+            data = serializer_class(list(queryset), many=True).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            rows = queryset.values(*representation.columns)
+            return FastJSONRenderer().render(representation.represent(rows))
+
+        outputs = {}
+        for name, path in (("drf", drf), ("fast", fast)):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                outputs[name] = path()
+                best = min(best, time.perf_counter() - started)
+            self.stdout.write(
+                f"{serializer_class.__name__:<24}{name:<10}{best * 1000:>10.1f}"
+            )
+
+        if outputs["drf"] != outputs["fast"]:
+            raise CommandError(f"{serializer_class.__name__} outputs differ.")
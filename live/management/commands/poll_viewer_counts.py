@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from live.cache import is_shared_cache
+from live.feed import live_now
+from live.models import Stream, StreamStatus
+from live.stats import viewer_counts
+from live.tokens import status_tokens
+
+
+class Command(BaseCommand):
+    help = "Periodically fetch viewer counts for every active stream into the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.MUX_VIEWER_COUNTS_POLL_INTERVAL,
+            help="Seconds between two polling rounds.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.MUX_VIEWER_COUNTS_POLL_CONCURRENCY,
+            help="Maximum number of simultaneous requests to Mux.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run a single round and exit."
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError(
+                "The default cache is process-local, the web workers would never "
+                "see the polled counts. Set REDIS_URL or MEMCACHED_LOCATION."
+            )
+        interval = options["interval"]
+
+        with ThreadPoolExecutor(
+            max_workers=options["concurrency"], thread_name_prefix="viewer-counts"
+        ) as executor:
+            while True:
+                started = time.monotonic()
+                polled, failed = self.poll(executor)
+                close_old_connections()
+
+                if options["verbosity"] > 1 or failed:
+                    self.stdout.write(
+                        f"Polled {polled} active streams, {failed} failed "
+                        f"in {time.monotonic() - started:.2f}s."
+                    )
+                if options["once"]:
+                    return
+
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+
+    def poll(self, executor: ThreadPoolExecutor):
+        stream_ids = Stream.objects.filter(status=StreamStatus.ACTIVE).values_list(
+            "pk", flat=True
+        )
+        # Tokens come from the cache (or the DB) here so workers only do HTTP
+        status_tokens_by_pk = {pk: status_tokens.get(pk) for pk in stream_ids}
+        tokens = {
+            pk: status_token.token
+            for pk, status_token in status_tokens_by_pk.items()
+            if status_token is not None
+        }
+
+        results = executor.map(self.poll_stream, tokens.keys(), tokens.values())
+        viewers = {
+            pk: entry["viewers"]
+            for pk, entry in zip(tokens, results)
+            if entry is not None
+        }
+        live_now.set_viewers(viewers)
+        return len(tokens), len(tokens) - len(viewers)
+
+    def poll_stream(self, stream_id, token) -> Optional[dict]:
+        try:
+            return viewer_counts.set(stream_id, viewer_counts.fetch(token))
+        except Exception as exc:
+            self.stderr.write(f"Could not poll stream {stream_id}: {exc}")
+            return None
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from live.cache import is_shared_cache
+from live.reconcile import Reconciler
+
+
+class Command(BaseCommand):
+    help = (
+        "Correct local streams and simulcast targets that drifted from Mux. "
+        "Without --since every Mux live stream is checked."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=int,
+            help=(
+                "Incremental run: only check active streams and streams changed "
+                "locally in the last SINCE seconds."
+            ),
+        )
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Simultaneous requests to Mux.",
+        )
+        parser.add_argument(
+            "--delete-missing",
+            action="store_true",
+            help="Delete local streams Mux no longer knows instead of listing them.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report without writing anything."
+        )
+
+    def handle(self, *args, **options):
+        if not options["dry_run"] and not is_shared_cache():
+            raise CommandError(
+                "The default cache is process-local, the web workers would keep "
+                "serving pages cached before the corrections. Set REDIS_URL or "
+                "MEMCACHED_LOCATION."
+            )
+        reconciler = Reconciler(
+            page_size=options["page_size"],
+            concurrency=options["concurrency"],
+            dry_run=options["dry_run"],
+        )
+        if options["since"] is None:
+            report = reconciler.run_full(options["delete_missing"])
+        else:
+            since = timezone.now() - timedelta(seconds=options["since"])
+            report = reconciler.run_incremental(since, options["delete_missing"])
+
+        if options["verbosity"] > 1:
+            for stream_id in report.unknown:
+                self.stdout.write(f"Unknown on Mux: {stream_id}")
+        for stream_id in report.missing:
+            self.stdout.write(f"Missing on Mux: {stream_id}")
+        self.stdout.write(str(report))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from live.models import DEFAULT_THUMBNAIL, StreamThumbnail
+from live.thumbnails import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the WebP and JPEG renditions of uploaded thumbnails that have "
+        "none yet, a batch at a time in the thumbnail process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Thumbnails rendered in parallel and saved with one query.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render again the thumbnails that already have renditions.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = StreamThumbnail.objects.exclude(thumbnail=DEFAULT_THUMBNAIL).only(
+            "id", "stream_id", "thumbnail", "renditions"
+        )
+        if not options["all"]:
+            queryset = queryset.filter(renditions={})
+
+        rendered = failed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk).order_by("pk")[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            failures = thumbnails.render_many(batch)
+            for thumbnail, exc in failures:
+                self.stderr.write(f"Could not render {thumbnail.thumbnail}: {exc}")
+            rendered += len(batch) - len(failures)
+            failed += len(failures)
+
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{rendered} rendered, {failed} failed")
+
+        self.stdout.write(f"Rendered {rendered} thumbnails, {failed} failed.")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from live.fakemux import FakeMux, FakeMuxServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve an in-memory stand-in for the Mux API. Point MUX_API_HOST and "
+        "MUX_STATS_URL (<host>/counts) at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Seconds added to every call."
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.0,
+            help="Random +/- seconds added to the latency.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of calls answered with a 503.",
+        )
+
+    def handle(self, *args, **options):
+        fake = FakeMux(
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+        )
+        server = FakeMuxServer(
+            (options["host"], options["port"]), fake, verbose=options["verbosity"] > 1
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Fake Mux listening on http://{host}:{port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
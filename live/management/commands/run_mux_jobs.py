@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from live.cache import is_shared_cache
+from live.jobs import claim_jobs, run_job
+from live.models import MuxJobStatus
+
+
+class Command(BaseCommand):
+    help = "Execute queued Mux jobs (MUX_ASYNC_JOBS) with a local worker pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.MUX_JOB_WORKERS,
+            help="Number of jobs executed at the same time.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.MUX_JOB_POLL_INTERVAL,
+            help="Seconds to wait when no job is runnable.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain runnable jobs once and exit."
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError(
+                "The default cache is process-local, the web workers would keep "
+                "serving pages cached before the jobs ran. Set REDIS_URL or "
+                "MEMCACHED_LOCATION."
+            )
+        workers = options["workers"]
+
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="mux-jobs"
+        ) as executor:
+            while True:
+                jobs = claim_jobs(workers)
+                for job in executor.map(self.run, jobs):
+                    if job.status != MuxJobStatus.SUCCEEDED or options["verbosity"] > 1:
+                        self.stdout.write(
+                            f"Job {job.pk} ({job.operation}) {job.status}"
+                            + (f": {job.error}" if job.error else "")
+                        )
+                close_old_connections()
+
+                if not jobs:
+                    if options["once"]:
+                        return
+                    time.sleep(options["poll_interval"])
+
+    def run(self, job):
+        try:
+            return run_job(job)
+        finally:
+            close_old_connections()
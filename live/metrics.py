@@ -0,0 +1,291 @@
+"""
+Request, database and Mux metrics in the Prometheus text exposition format.
+
+Values are kept per process in plain dictionaries behind a lock, so recording
+costs a few dictionary updates per request. Scrape every worker (or run one
+worker per metrics port) to aggregate them, with ``METRICS_TOKEN`` as the
+bearer token.
+"""
+
+import bisect
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from .mux import mux
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in values.items():
+            yield self.name, labels, value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            values[index] += 1
+            values[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(value) for key, value in self._values.items()}
+        for labels, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + (("le", bound),), cumulative
+            cumulative += counts[-2]
+            yield f"{self.name}_bucket", labels + (("le", "+Inf"),), cumulative
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Collected:
+    """Metric whose samples are read from ``collect()`` at scrape time."""
+
+    def __init__(self, name, help, type, collect):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield self.name, tuple(sorted(labels.items())), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.register(
+    Histogram("http_request_duration_seconds", "Request latency by route.")
+)
+request_db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Database queries per request by route.",
+        buckets=QUERY_BUCKETS,
+    )
+)
+request_db_duration = registry.register(
+    Histogram("http_request_db_duration_seconds", "Database time per request by route.")
+)
+mux_call_duration = registry.register(
+    Histogram("mux_call_duration_seconds", "Mux call latency by operation.")
+)
+mux_call_errors = registry.register(
+    Counter("mux_call_errors_total", "Failed Mux calls by operation.")
+)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def collect_mux_retries():
+    for caller in mux.callers.values():
+        for operation, count in dict(caller.retries).items():
+            yield {"operation": operation}, count
+
+
+def collect_mux_circuits():
+    for service, caller in mux.callers.items():
+        yield {"service": service}, CIRCUIT_STATES[caller.breaker.state]
+
+
+def collect_mux_circuit_openings():
+    for service, caller in mux.callers.items():
+        yield {"service": service}, caller.breaker.opened
+
+
+registry.register(
+    Collected(
+        "mux_call_retries_total",
+        "Retried Mux calls by operation.",
+        "counter",
+        collect_mux_retries,
+    )
+)
+registry.register(
+    Collected(
+        "mux_circuit_state",
+        "Mux circuit breaker state by service (0 closed, 1 half open, 2 open).",
+        "gauge",
+        collect_mux_circuits,
+    )
+)
+registry.register(
+    Collected(
+        "mux_circuit_opened_total",
+        "Times the Mux circuit breaker opened by service.",
+        "counter",
+        collect_mux_circuit_openings,
+    )
+)
+
+
+def record_mux_call(operation, duration, error):
+    mux_call_duration.observe(duration, operation=operation)
+    if error is not None:
+        mux_call_errors.inc(operation=operation, error=error.__class__.__name__)
+
+
+mux.hooks.append(record_mux_call)
+
+
+class QueryTimer:
+    """Counts the queries of one request and their total time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Timer of the current request. Context variables follow the request into
+# the sync_to_async thread that runs a sync view under ASGI, where the
+# thread-local connections of its queries live.
+_query_timer = ContextVar("query_timer", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    timer = _query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - started
+        timer.count += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Connections are reopened on the same wrapper, install only once
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class MetricsMiddleware:
+    """Times requests and their queries; runs natively under WSGI and ASGI."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self.record(request, response, timer, started)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self.record(request, response, timer, started)
+        return response
+
+    def record(self, request, response, timer: QueryTimer, started):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        route = match.route if match is not None else "unmatched"
+        request_duration.observe(
+            duration, route=route, method=request.method, status=response.status_code
+        )
+        request_db_queries.observe(timer.count, route=route)
+        request_db_duration.observe(timer.duration, route=route)
+
+
+def metrics(request):
+    # Only for scrapers holding METRICS_TOKEN, hidden entirely without one
+    if not settings.METRICS_TOKEN:
+        raise Http404()
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stream',
+            name='playback_id',
+            field=models.CharField(db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='stream',
+            name='stream_id',
+            field=models.CharField(max_length=80, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='streamthumbnail',
+            name='thumbnail',
+            field=models.ImageField(default='lives/thumbnails/default.png', upload_to='lives/thumbnails/'),
+        ),
+        migrations.AddIndex(
+            model_name='stream',
+            index=models.Index(fields=['created_at', 'id'], name='live_stream_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stream',
+            index=models.Index(fields=['status', 'created_at'], name='live_stream_status_idx'),
+        ),
+    ]
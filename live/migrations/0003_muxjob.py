@@ -0,0 +1,35 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0002_stream_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MuxJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(choices=[('create_stream', 'Create stream'), ('delete_stream', 'Delete stream'), ('finish_stream', 'Finish stream'), ('reset_stream_key', 'Reset stream key'), ('create_simulcast', 'Create simulcast'), ('remove_simulcast', 'Remove simulcast')], max_length=32)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('payload', models.JSONField(default=dict)),
+                ('result', models.JSONField(null=True)),
+                ('error', models.TextField(null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stream', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mux_jobs', to='live.stream')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='live_muxjob_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stream',
+            index=models.Index(fields=['updated_at'], name='live_stream_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0005_stream_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='streamthumbnail',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
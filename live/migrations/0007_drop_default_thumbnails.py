@@ -0,0 +1,31 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:05
+
+from django.db import migrations
+
+DEFAULT_THUMBNAIL = 'lives/thumbnails/default.png'
+
+
+def drop_default_thumbnails(apps, schema_editor):
+    StreamThumbnail = apps.get_model('live', 'StreamThumbnail')
+    StreamThumbnail.objects.filter(thumbnail=DEFAULT_THUMBNAIL).delete()
+
+
+def create_default_thumbnails(apps, schema_editor):
+    Stream = apps.get_model('live', 'Stream')
+    StreamThumbnail = apps.get_model('live', 'StreamThumbnail')
+    streams = Stream.objects.filter(thumbnail__isnull=True).values_list('pk', flat=True)
+    StreamThumbnail.objects.bulk_create(
+        (StreamThumbnail(stream_id=pk, thumbnail=DEFAULT_THUMBNAIL) for pk in streams),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0006_streamthumbnail_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_default_thumbnails, create_default_thumbnails),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:39
+
+import django.db.models.deletion
+import live.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0007_drop_default_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamSearch',
+            fields=[
+                ('stream', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='live.stream')),
+                ('document', live.search.SearchDocumentField(db_column='live_stream_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'live_stream_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(live.search.create_index, live.search.drop_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0008_stream_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('live_stream_id', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('idle', 'Idle'), ('active', 'Active'), ('disabled', 'Disabled')], max_length=10)),
+                ('occurred_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('applied_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['applied_at', 'received_at'], name='live_webhook_pending_idx'), models.Index(fields=['live_stream_id', 'occurred_at'], name='live_webhook_stream_idx')],
+            },
+        ),
+    ]
@@ -1,11 +1,18 @@
 from pathlib import Path
 
-from django.db import models
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .search import SearchDocumentField
 
 THUMBNAILS_UPLOAD_PATH = Path("lives/thumbnails/")
+# Shared by every stream without an uploaded thumbnail (and StreamThumbnail row)
+DEFAULT_THUMBNAIL = (THUMBNAILS_UPLOAD_PATH / "default.png").as_posix()
 
 
 class Profile(models.Model):
@@ -45,14 +52,58 @@ class StreamThumbnail(models.Model):
     thumbnail = models.ImageField(
         upload_to=f"{THUMBNAILS_UPLOAD_PATH}/",
         null=False,
-        default=(THUMBNAILS_UPLOAD_PATH / "default.png").as_posix(),
+        default=DEFAULT_THUMBNAIL,
     )
+    # {format: [[width, name], ...]}, written by live.thumbnails
+    renditions = models.JSONField(default=dict, blank=True)
+
+
+class ThumbnailURL(str):
+    """Thumbnail URL that also carries ``srcset`` strings for its renditions."""
+
+    def __new__(cls, url, srcset="", webp_srcset=""):
+        self = super().__new__(cls, url)
+        self.srcset = srcset
+        self.webp_srcset = webp_srcset
+        return self
+
+    @classmethod
+    def from_renditions(cls, url, renditions: dict):
+        srcsets = {
+            format: ", ".join(
+                f"{default_storage.url(name)} {width}w" for width, name in sizes
+            )
+            for format, sizes in renditions.items()
+        }
+        jpeg = renditions.get("jpeg")
+        if jpeg:
+            url = default_storage.url(jpeg[0][1])
+        return cls(url, srcsets.get("jpeg", ""), srcsets.get("webp", ""))
+
+    @classmethod
+    def animated(cls, playback_id):
+        """Animated preview Mux serves for live streams."""
+        url = f"https://image.mux.com/{playback_id}/animated.webp"
+        webp_srcset = ", ".join(
+            f"{url}?width={width} {width}w"
+            for width in settings.THUMBNAIL_RENDITION_WIDTHS
+        )
+        return cls(url, webp_srcset=webp_srcset)
 
 
 class Stream(models.Model):
-    stream_id = models.CharField(max_length=80, null=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="live_stream_created_idx"),
+            models.Index(
+                fields=["status", "created_at"], name="live_stream_status_idx"
+            ),
+            models.Index(fields=["updated_at"], name="live_stream_updated_idx"),
+        ]
+
+    stream_id = models.CharField(max_length=80, null=True, unique=True)
     stream_key = models.CharField(max_length=64, null=True)
-    playback_id = models.CharField(max_length=100, null=True)
+    playback_id = models.CharField(max_length=100, null=True, db_index=True)
     title = models.CharField(max_length=250, null=False)
     description = models.TextField(null=True)
     status = models.CharField(
@@ -74,12 +125,37 @@ class Stream(models.Model):
         Profile, on_delete=models.CASCADE, related_name="streams", null=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
-    def thumbnail_url(self):
+    def thumbnail_url(self) -> ThumbnailURL:
         if self.status != StreamStatus.ACTIVE:
-            return self.thumbnail.thumbnail.url
-        return f"https://image.mux.com/{self.playback_id}/animated.webp"
+            try:
+                thumbnail = self.thumbnail
+            except StreamThumbnail.DoesNotExist:
+                return ThumbnailURL(default_storage.url(DEFAULT_THUMBNAIL))
+            return ThumbnailURL.from_renditions(
+                thumbnail.thumbnail.url, thumbnail.renditions
+            )
+        return ThumbnailURL.animated(self.playback_id)
+
+
+class StreamSearch(models.Model):
+    """Row of the SQLite FTS5 index of streams, see ``live.search``."""
+
+    class Meta:
+        managed = False
+        db_table = "live_stream_fts"
+
+    stream = models.OneToOneField(
+        Stream,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        related_name="search",
+    )
+    document = SearchDocumentField(db_column="live_stream_fts")
+    rank = models.FloatField()
 
 
 class SimulcastService(models.Model):
@@ -97,11 +173,133 @@ class Simulcast(models.Model):
     stream = models.ForeignKey(Stream, on_delete=models.CASCADE)
     stream_key = models.CharField(max_length=128, unique=True)
     url = models.CharField(max_length=512)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class MuxOperation(models.TextChoices):
+    CREATE_STREAM = "create_stream", _("Create stream")
+    DELETE_STREAM = "delete_stream", _("Delete stream")
+    FINISH_STREAM = "finish_stream", _("Finish stream")
+    RESET_STREAM_KEY = "reset_stream_key", _("Reset stream key")
+    CREATE_SIMULCAST = "create_simulcast", _("Create simulcast")
+    REMOVE_SIMULCAST = "remove_simulcast", _("Remove simulcast")
+
+
+class MuxJobStatus(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    RUNNING = "running", _("Running")
+    SUCCEEDED = "succeeded", _("Succeeded")
+    FAILED = "failed", _("Failed")
+
+
+class MuxJob(models.Model):
+    """A Mux operation requested by a view, executed by `manage.py run_mux_jobs`."""
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="live_muxjob_status_idx")
+        ]
+
+    operation = models.CharField(max_length=32, choices=MuxOperation.choices)
+    status = models.CharField(
+        max_length=10, choices=MuxJobStatus.choices, default=MuxJobStatus.PENDING
+    )
+    stream = models.ForeignKey(
+        Stream, on_delete=models.SET_NULL, related_name="mux_jobs", null=True
+    )
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True)
+    error = models.TextField(null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-# Create thumbnail when new stream is created
+
+class WebhookEvent(models.Model):
+    """
+    A Mux status event, stored before the webhook is acknowledged and applied
+    to its stream in batches by ``live.webhooks.StatusUpdateBatcher``.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["applied_at", "received_at"], name="live_webhook_pending_idx"
+            ),
+            models.Index(
+                fields=["live_stream_id", "occurred_at"], name="live_webhook_stream_idx"
+            ),
+        ]
+
+    # The unique Mux event id dedupes redeliveries across workers
+    event_id = models.CharField(max_length=255, unique=True)
+    live_stream_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=StreamStatus.choices)
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField(default=timezone.now)
+    applied_at = models.DateTimeField(null=True)
+
+
+# Drop cached status tokens so status changes reach StreamStatusView. Like
+# the receivers below, runs once the write commits: before that, a reader
+# could cache the old row again
+@receiver(models.signals.post_save, sender=Stream)
+@receiver(models.signals.post_delete, sender=Stream)
+def invalidate_status_token(sender, instance: Stream, **kwargs):
+    from .tokens import status_tokens
+
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: status_tokens.invalidate(pk), using=kwargs.get("using")
+    )
+
+
+# Drop the cached row read by RetrieveStream and WatchStream and retire the
+# pages rendered from it
+@receiver(models.signals.post_save, sender=Stream)
+@receiver(models.signals.post_delete, sender=Stream)
+def invalidate_stream_cache(sender, instance: Stream, **kwargs):
+    from .cache import stream_cache, stream_versions
+
+    # Deleting clears instance.pk before the commit
+    stream = Stream(pk=instance.pk, stream_id=instance.stream_id)
+
+    def invalidate():
+        stream_cache.invalidate(stream)
+        stream_versions.bump(stream.pk)
+
+    transaction.on_commit(invalidate, using=kwargs.get("using"))
+
+
+# Keep the live-now feed in step with status transitions
 @receiver(models.signals.post_save, sender=Stream)
-def create_thumbnail(sender, instance: Stream, created: bool, **kwargs):
-    if created:
-        stream_thumbnail = StreamThumbnail(stream=instance)
-        stream_thumbnail.save()
+def update_live_now(sender, instance: Stream, **kwargs):
+    from .feed import live_now
+
+    transaction.on_commit(
+        lambda: live_now.update([instance]), using=kwargs.get("using")
+    )
+
+
+@receiver(models.signals.post_delete, sender=Stream)
+def remove_live_now(sender, instance: Stream, **kwargs):
+    from .feed import live_now
+
+    pk = instance.pk
+    transaction.on_commit(lambda: live_now.remove([pk]), using=kwargs.get("using"))
+
+
+# Thumbnails are part of the stream pages, simulcasts of its simulcast list
+@receiver(models.signals.post_save, sender=StreamThumbnail)
+@receiver(models.signals.post_delete, sender=StreamThumbnail)
+@receiver(models.signals.post_save, sender=Simulcast)
+@receiver(models.signals.post_delete, sender=Simulcast)
+def bump_stream_version(sender, instance, **kwargs):
+    from .cache import stream_versions
+
+    stream_id = instance.stream_id
+    transaction.on_commit(
+        lambda: stream_versions.bump(stream_id), using=kwargs.get("using")
+    )
@@ -0,0 +1,147 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+import mux_python
+from django.conf import settings
+from mux_python import rest
+from mux_python.exceptions import NotFoundException
+
+from .resilience import CircuitBreaker, ResilientCaller
+
+# Operations that can be sent again after a failure without side effects.
+# Creations and stream key resets are never retried.
+IDEMPOTENT_PREFIXES = ("get_", "list_", "delete_", "signal_", "disable_", "enable_")
+
+
+class MuxApi:
+    """
+    Thin proxy over a generated Mux API that runs every call through the
+    manager's deadline, retry and circuit breaker policy.
+    """
+
+    def __init__(self, api, caller, timeout):
+        self._api = api
+        self._caller = caller
+        self._timeout = timeout
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        idempotent = name.startswith(IDEMPOTENT_PREFIXES)
+
+        def call(*args, **kwargs):
+            timeout = kwargs.pop("_request_timeout", self._timeout)
+            retried = False
+
+            def attempt(timeout):
+                nonlocal retried
+                try:
+                    return attr(*args, _request_timeout=timeout, **kwargs)
+                except NotFoundException:
+                    # The first attempt went through before its answer was lost
+                    if retried and name.startswith("delete_"):
+                        return None
+                    raise
+                finally:
+                    retried = True
+
+            return self._caller(name, attempt, timeout, idempotent)
+
+        return call
+
+
+class MuxClientManager:
+    """
+    Process-wide holder of a single Mux ``ApiClient``.
+
+    The underlying urllib3 ``PoolManager`` is thread safe and keeps connections
+    alive between calls, so every view shares the same pool instead of paying a
+    new TLS handshake per request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._api_client = None
+        self._callers = {}
+        # Called with (operation, duration in seconds, exception or None)
+        self.hooks = []
+
+    def get_configuration(self):
+        # TODO: Get mux settings from Database Settings App
+        configuration = mux_python.Configuration(host=settings.MUX_API_HOST)
+        configuration.username = settings.MUX_TOKEN_ID
+        configuration.password = settings.MUX_TOKEN_SECRET
+        configuration.connection_pool_maxsize = settings.MUX_API_POOL_MAXSIZE
+        # Retries are done by ResilientCaller, within the operation deadline
+        configuration.retries = False
+        return configuration
+
+    @property
+    def api_client(self) -> mux_python.ApiClient:
+        if self._api_client is None:
+            with self._lock:
+                if self._api_client is None:
+                    configuration = self.get_configuration()
+                    api_client = mux_python.ApiClient(configuration)
+                    api_client.rest_client = rest.RESTClientObject(
+                        configuration, pools_size=settings.MUX_API_POOL_SIZE
+                    )
+                    self._api_client = api_client
+        return self._api_client
+
+    @property
+    def timeout(self):
+        return (settings.MUX_API_CONNECT_TIMEOUT, settings.MUX_API_READ_TIMEOUT)
+
+    @property
+    def live_streams(self) -> mux_python.LiveStreamsApi:
+        return MuxApi(
+            mux_python.LiveStreamsApi(self.api_client), self.caller("api"), self.timeout
+        )
+
+    def caller(self, service) -> ResilientCaller:
+        """Call policy of a Mux service ("api" or "stats"), one breaker each."""
+        caller = self._callers.get(service)
+        if caller is None:
+            with self._lock:
+                caller = self._callers.setdefault(
+                    service,
+                    ResilientCaller(
+                        CircuitBreaker.from_settings(service), self.observe
+                    ),
+                )
+        return caller
+
+    @property
+    def callers(self) -> dict:
+        return dict(self._callers)
+
+    @contextmanager
+    def observe(self, operation):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            for hook in self.hooks:
+                hook(operation, duration, error)
+
+    def close(self):
+        with self._lock:
+            if self._api_client is not None:
+                self._api_client.rest_client.pool_manager.clear()
+                self._api_client.close()
+                self._api_client = None
+            self._callers = {}
+
+
+mux = MuxClientManager()
+atexit.register(mux.close)
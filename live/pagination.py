@@ -0,0 +1,149 @@
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Max
+from rest_framework.pagination import BasePagination, CursorPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StreamCursorPagination(CursorPagination):
+    """
+    Keyset pagination, newest first.
+
+    Pages are fetched with an indexed ``WHERE`` on the ordering instead of
+    ``OFFSET``, and no ``COUNT(*)`` is run unless ``?total=1`` asks for an
+    approximate total.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    total_query_param = "total"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total = None
+        if request.query_params.get(self.total_query_param):
+            self.total = self.get_approximate_total(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_approximate_total(self, queryset) -> int:
+        if queryset.query.where:
+            return queryset.count()
+
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+
+        # Rows are never renumbered, so the highest id bounds the table size
+        return queryset.aggregate(total=Max("pk"))["total"] or 0
+
+    def get_paginated_response(self, data):
+        content = [
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+        ]
+        if self.total is not None:
+            content.append(("total", self.total))
+        content.append(("results", data))
+        return Response(OrderedDict(content))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["total"] = {
+            "type": "integer",
+            "nullable": True,
+        }
+        return response_schema
+
+
+class SimulcastCursorPagination(StreamCursorPagination):
+    ordering = "-id"
+
+
+class StreamSearchPagination(BasePagination):
+    """
+    Numbered pages of ranked search results.
+
+    Pages are read with ``OFFSET``, which is cheap over the few pages people
+    look at, and one extra row tells whether a next page exists, so no
+    ``COUNT(*)`` runs.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    page_query_param = "page"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = _positive_int(
+                request.query_params.get(self.page_query_param, 1), strict=True
+            )
+        except ValueError:
+            self.page = 1
+        size = self.get_page_size(request)
+        offset = (self.page - 1) * size
+        rows = list(queryset[offset : offset + size + 1])
+        self.has_next = len(rows) > size
+        return rows[:size]
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page + 1)
+
+    def get_previous_link(self):
+        if self.page == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page - 1)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class LiveNowPagination(StreamSearchPagination):
+    """Numbered pages of the live-now feed, sliced from its cached index."""
+
+    page_size = 24
@@ -0,0 +1,242 @@
+"""
+Bring the local ``Stream`` and ``Simulcast`` rows back in line with Mux.
+
+A full run pages through every Mux live stream, a few pages in flight at a
+time, and compares each page with the matching local rows in one query on the
+``stream_id`` index. Corrections are written per page with ``bulk_update``, so
+memory and transaction size stay bounded by the page size.
+
+An incremental run only looks at streams that can have drifted recently: the
+ones Mux reports active, the ones marked active locally, and the ones changed
+locally since a given time (``updated_at`` index), fetched one by one.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from mux_python.exceptions import NotFoundException
+
+from .cache import stream_cache, stream_versions
+from .feed import live_now
+from .models import Simulcast, Stream, StreamStatus
+from .mux import mux
+from .tokens import status_tokens
+
+logger = logging.getLogger(__name__)
+
+STREAM_FIELDS = ["status", "stream_key", "playback_id", "updated_at"]
+
+
+@dataclass
+class ReconcileReport:
+    checked: int = 0
+    updated: int = 0
+    simulcasts_added: int = 0
+    simulcasts_removed: int = 0
+    # Mux streams without a local row, local rows without a Mux stream
+    unknown: list = field(default_factory=list)
+    missing: list = field(default_factory=list)
+
+    def __str__(self):
+        return (
+            f"{self.checked} streams checked, {self.updated} updated, "
+            f"{self.simulcasts_added} simulcasts added, "
+            f"{self.simulcasts_removed} simulcasts removed, "
+            f"{len(self.unknown)} unknown on Mux, {len(self.missing)} missing on Mux"
+        )
+
+
+class Reconciler:
+    def __init__(self, page_size=100, concurrency=4, dry_run=False):
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.report = ReconcileReport()
+
+    def iter_mux_pages(self, status=None) -> Iterator[list]:
+        """Mux live streams page by page, keeping ``concurrency`` pages in flight."""
+
+        def fetch(page):
+            response = mux.live_streams.list_live_streams(
+                limit=self.page_size, page=page, status=status
+            )
+            return response.data or []
+
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="reconcile"
+        ) as executor:
+            pending = deque(
+                executor.submit(fetch, page) for page in range(1, self.concurrency + 1)
+            )
+            next_page = self.concurrency + 1
+            while pending:
+                live_streams = pending.popleft().result()
+                if live_streams:
+                    yield live_streams
+                if len(live_streams) < self.page_size:
+                    for future in pending:
+                        future.cancel()
+                    return
+                pending.append(executor.submit(fetch, next_page))
+                next_page += 1
+
+    def fetch_live_streams(self, stream_ids: Iterable[str]) -> dict:
+        """Mux live streams by id, ``None`` for the ones Mux does not know."""
+
+        def fetch(stream_id):
+            try:
+                return mux.live_streams.get_live_stream(stream_id).data
+            except NotFoundException:
+                return None
+
+        stream_ids = list(stream_ids)
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="reconcile"
+        ) as executor:
+            return dict(zip(stream_ids, executor.map(fetch, stream_ids)))
+
+    def run_full(self, delete_missing=False) -> ReconcileReport:
+        started = timezone.now()
+        seen = set()
+        for live_streams in self.iter_mux_pages():
+            seen.update(live_stream.id for live_stream in live_streams)
+            self.apply(live_streams)
+
+        # Local rows created during the run cannot be in the listing yet
+        candidates = (
+            Stream.objects.filter(stream_id__isnull=False, created_at__lte=started)
+            .values_list("stream_id", flat=True)
+            .iterator(chunk_size=2000)
+        )
+        self.check_missing(
+            [stream_id for stream_id in candidates if stream_id not in seen],
+            delete_missing,
+        )
+        return self.report
+
+    def run_incremental(self, since: datetime, delete_missing=False) -> ReconcileReport:
+        seen = set()
+        for live_streams in self.iter_mux_pages(status=StreamStatus.ACTIVE):
+            seen.update(live_stream.id for live_stream in live_streams)
+            self.apply(live_streams)
+
+        recent = Stream.objects.filter(
+            Q(status=StreamStatus.ACTIVE) | Q(updated_at__gte=since),
+            stream_id__isnull=False,
+        ).values_list("stream_id", flat=True)
+        stream_ids = [stream_id for stream_id in recent if stream_id not in seen]
+        for start in range(0, len(stream_ids), self.page_size):
+            live_streams = self.fetch_live_streams(
+                stream_ids[start : start + self.page_size]
+            )
+            self.apply([s for s in live_streams.values() if s is not None])
+            self.check_missing(
+                [i for i, s in live_streams.items() if s is None],
+                delete_missing,
+                confirmed=True,
+            )
+        return self.report
+
+    def apply(self, live_streams: list):
+        by_id = {live_stream.id: live_stream for live_stream in live_streams}
+        streams = list(
+            Stream.objects.filter(stream_id__in=by_id).only(
+                "id", "stream_id", *STREAM_FIELDS
+            )
+        )
+        self.report.checked += len(live_streams)
+        self.report.unknown += sorted(set(by_id) - {s.stream_id for s in streams})
+
+        changed = [
+            stream
+            for stream in streams
+            if self.diff_stream(stream, by_id[stream.stream_id])
+        ]
+        added, removed = self.diff_simulcasts(streams, by_id)
+        self.report.updated += len(changed)
+        self.report.simulcasts_added += len(added)
+        self.report.simulcasts_removed += len(removed)
+        if self.dry_run:
+            return
+
+        with transaction.atomic():
+            Stream.objects.bulk_update(changed, STREAM_FIELDS)
+            Simulcast.objects.bulk_create(added, ignore_conflicts=True)
+            Simulcast.objects.filter(pk__in=removed).delete()
+        # bulk_update skips post_save, so drop the cached rows and tokens here
+        for stream in changed:
+            status_tokens.invalidate(stream.pk)
+            stream_cache.invalidate(stream)
+            stream_versions.bump(stream.pk)
+        for stream_id in {simulcast.stream_id for simulcast in added}:
+            stream_versions.bump(stream_id)
+        live_now.update(changed)
+
+    def diff_stream(self, stream: Stream, live_stream) -> bool:
+        playback_ids = live_stream.playback_ids or []
+        expected = {
+            "status": live_stream.status,
+            "stream_key": live_stream.stream_key,
+            "playback_id": playback_ids[0].id if playback_ids else stream.playback_id,
+        }
+        changed = False
+        for name, value in expected.items():
+            if value is not None and getattr(stream, name) != value:
+                setattr(stream, name, value)
+                changed = True
+        if changed:
+            stream.updated_at = timezone.now()
+        return changed
+
+    def diff_simulcasts(self, streams: list, by_id: dict) -> tuple[list, list]:
+        local = {}
+        for simulcast in Simulcast.objects.filter(stream__in=streams).only(
+            "id", "simulcast_id", "stream_id"
+        ):
+            local.setdefault(simulcast.stream_id, {})[
+                simulcast.simulcast_id
+            ] = simulcast
+
+        added, removed = [], []
+        for stream in streams:
+            targets = {
+                target.id: target
+                for target in by_id[stream.stream_id].simulcast_targets or []
+            }
+            simulcasts = local.get(stream.pk, {})
+            removed += [s.pk for i, s in simulcasts.items() if i not in targets]
+            added += [
+                Simulcast(
+                    stream=stream,
+                    simulcast_id=target.id,
+                    stream_key=target.stream_key,
+                    url=target.url,
+                )
+                for target_id, target in targets.items()
+                if target_id not in simulcasts
+            ]
+        return added, removed
+
+    def check_missing(self, stream_ids: list, delete=False, confirmed=False):
+        """
+        Local streams Mux did not list. Pages shift while they are read, so
+        each one is looked up again before it counts as missing.
+        """
+        for start in range(0, len(stream_ids), self.page_size):
+            batch = stream_ids[start : start + self.page_size]
+            if not confirmed:
+                live_streams = self.fetch_live_streams(batch)
+                self.apply([s for s in live_streams.values() if s is not None])
+                batch = [i for i, s in live_streams.items() if s is None]
+            self.report.missing += batch
+            if delete and batch and not self.dry_run:
+                logger.warning("Deleting %d streams missing on Mux", len(batch))
+                for stream in Stream.objects.filter(stream_id__in=batch):
+                    stream.delete()
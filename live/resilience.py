@@ -0,0 +1,180 @@
+"""
+Deadlines, retries and circuit breaking for the calls made to Mux.
+
+Every call gets an overall deadline. Transient failures (connection errors,
+timeouts, 429 and 5xx answers) of idempotent calls are retried with jittered
+exponential backoff while the deadline allows it. Each Mux service has a
+circuit breaker that opens when too many recent calls failed transiently;
+while it is open calls fail at once with ``MuxUnavailable`` (503) instead of
+holding a worker until the timeouts expire.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+import urllib3
+from django.conf import settings
+from mux_python.exceptions import ApiException
+
+from .exceptions import MuxUnavailable
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, ApiException):
+        return exc.status in (0, 429) or (exc.status or 0) >= 500
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else 0
+        return status == 429 or status >= 500
+    return isinstance(
+        exc,
+        (
+            urllib3.exceptions.HTTPError,
+            requests.ConnectionError,
+            requests.Timeout,
+            ConnectionError,
+            TimeoutError,
+        ),
+    )
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, window, min_calls, error_rate, cooldown):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial = False
+        self.opened = 0
+
+    @classmethod
+    def from_settings(cls, name):
+        return cls(
+            name,
+            window=settings.MUX_BREAKER_WINDOW,
+            min_calls=settings.MUX_BREAKER_MIN_CALLS,
+            error_rate=settings.MUX_BREAKER_ERROR_RATE,
+            cooldown=settings.MUX_BREAKER_COOLDOWN,
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (
+                self._state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.cooldown
+            ):
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; half open lets a single trial through."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial = True
+            return True
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._state != self.CLOSED:
+                self._trial = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, ok))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            if ok:
+                return
+            failures = sum(1 for _, call_ok in self._calls if not call_ok)
+            if (
+                len(self._calls) >= self.min_calls
+                and failures / len(self._calls) >= self.error_rate
+            ):
+                self._open(now)
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.opened += 1
+
+
+class ResilientCaller:
+    """
+    Runs ``call(timeout)`` under the deadline, retry policy and breaker of a
+    service. ``timeout`` is the ``(connect, read)`` pair left for the attempt.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, observe):
+        self.breaker = breaker
+        self.observe = observe
+        self._lock = threading.Lock()
+        # operation -> number of retried attempts
+        self.retries: dict[str, int] = {}
+
+    def deadline(self, operation) -> float:
+        return settings.MUX_API_DEADLINES.get(operation, settings.MUX_API_DEADLINE)
+
+    def backoff(self, attempt) -> float:
+        base = min(
+            settings.MUX_API_RETRY_BACKOFF_MAX,
+            settings.MUX_API_RETRY_BACKOFF * 2 ** (attempt - 1),
+        )
+        return random.uniform(0, base)
+
+    def __call__(self, operation, call, timeout, idempotent=False):
+        connect_timeout, read_timeout = timeout
+        deadline = time.monotonic() + self.deadline(operation)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise MuxUnavailable()
+
+            remaining = deadline - time.monotonic()
+            try:
+                with self.observe(operation):
+                    result = call(
+                        (min(connect_timeout, remaining), min(read_timeout, remaining))
+                    )
+            except Exception as exc:
+                transient = is_transient(exc)
+                # Answers like 404 or 400 still mean Mux is up
+                self.breaker.record(not transient)
+                if not transient:
+                    raise
+
+                attempt += 1
+                delay = self.backoff(attempt)
+                if (
+                    not idempotent
+                    or attempt > settings.MUX_API_RETRIES
+                    or time.monotonic() + delay >= deadline
+                ):
+                    raise MuxUnavailable() from exc
+                with self._lock:
+                    self.retries[operation] = self.retries.get(operation, 0) + 1
+                time.sleep(delay)
+            else:
+                self.breaker.record(True)
+                return result
@@ -0,0 +1,145 @@
+"""
+Full-text search over ``Stream.title`` and ``Stream.description``.
+
+SQLite keeps an FTS5 index (``live_stream_fts``, an external-content table over
+``live_stream``) that triggers update on every insert, update and delete, bulk
+writes included. Postgres keeps a weighted ``tsvector`` generated column with a
+GIN index. Other backends fall back to an unranked ``icontains`` scan.
+
+SQLite drops the triggers when Django remakes ``live_stream`` to alter it, so
+such migrations have to run ``drop_index`` before and ``create_index`` after.
+"""
+
+import re
+
+from django.db import connections, models
+from django.db.models import Lookup, Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_INDEX = [
+    # Title matches weigh more than description matches in bm25
+    """
+    CREATE VIRTUAL TABLE live_stream_fts USING fts5(
+        title, description, content='live_stream', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO live_stream_fts(live_stream_fts, rank)
+    VALUES ('rank', 'bm25(10.0, 1.0)')
+    """,
+    """
+    CREATE TRIGGER live_stream_fts_insert AFTER INSERT ON live_stream BEGIN
+        INSERT INTO live_stream_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER live_stream_fts_delete AFTER DELETE ON live_stream BEGIN
+        INSERT INTO live_stream_fts(live_stream_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER live_stream_fts_update AFTER UPDATE OF title, description
+    ON live_stream BEGIN
+        INSERT INTO live_stream_fts(live_stream_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO live_stream_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO live_stream_fts(live_stream_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_INDEX = [
+    "DROP TRIGGER live_stream_fts_insert",
+    "DROP TRIGGER live_stream_fts_delete",
+    "DROP TRIGGER live_stream_fts_update",
+    "DROP TABLE live_stream_fts",
+]
+
+POSTGRES_INDEX = [
+    """
+    ALTER TABLE live_stream ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX live_stream_search_idx ON live_stream USING GIN (search_vector)",
+]
+POSTGRES_DROP_INDEX = [
+    "DROP INDEX live_stream_search_idx",
+    "ALTER TABLE live_stream DROP COLUMN search_vector",
+]
+
+
+class Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class SearchDocumentField(models.TextField):
+    """The hidden column of an FTS5 table named after the table, for ``MATCH``."""
+
+
+SearchDocumentField.register_lookup(Match)
+
+
+def create_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_INDEX, "postgresql": POSTGRES_INDEX}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_DROP_INDEX, "postgresql": POSTGRES_DROP_INDEX}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def search_terms(query: str) -> list:
+    return re.findall(r"\w+", query)
+
+
+def fts5_query(terms: list) -> str:
+    """Every term must match; the last one as a prefix, for search-as-you-type."""
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def search_streams(queryset, query: str):
+    """``queryset`` restricted to the streams matching ``query``, best first."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        # bm25 scores are negative, the best match has the lowest rank
+        return queryset.filter(search__document__match=fts5_query(terms)).order_by(
+            "search__rank", "-id"
+        )
+
+    if vendor == "postgresql":
+        tsquery = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        return queryset.filter(
+            RawSQL(
+                "live_stream.search_vector @@ to_tsquery('simple', %s)",
+                [tsquery],
+                output_field=models.BooleanField(),
+            )
+        ).order_by(
+            RawSQL(
+                "ts_rank(live_stream.search_vector, to_tsquery('simple', %s))",
+                [tsquery],
+            ).desc(),
+            "-id",
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition).order_by("-created_at", "-id")
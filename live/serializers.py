@@ -1,5 +1,12 @@
-from rest_framework import serializers
-from .models import Simulcast, Stream
+import functools
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import MuxJob, Simulcast, Stream, StreamThumbnail, ThumbnailURL
 
 
 class StreamSerializer(serializers.ModelSerializer):
@@ -24,3 +31,133 @@ class SimulcastSerializer(serializers.ModelSerializer):
     class Meta:
         model = Simulcast
         fields = "__all__"
+
+
+class SimulcastTargetSerializer(serializers.Serializer):
+    stream = serializers.IntegerField()
+    stream_key = serializers.CharField(max_length=128)
+    url = serializers.CharField(max_length=512)
+
+
+class StreamThumbnailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StreamThumbnail
+        fields = ["thumbnail", "renditions"]
+        read_only_fields = ["renditions"]
+        extra_kwargs = {"thumbnail": {"required": True}}
+
+
+class LiveNowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    stream_id = serializers.CharField()
+    title = serializers.CharField()
+    description = serializers.CharField(allow_null=True)
+    playback_id = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    viewers = serializers.IntegerField()
+    thumbnail_url = serializers.SerializerMethodField()
+
+    def get_thumbnail_url(self, entry) -> str:
+        return ThumbnailURL.animated(entry["playback_id"])
+
+
+class MuxJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MuxJob
+        fields = [
+            "id",
+            "operation",
+            "status",
+            "stream",
+            "result",
+            "error",
+            "attempts",
+            "created_at",
+            "updated_at",
+        ]
+
+
+class CompiledRepresentation:
+    """
+    Read-only ``to_representation`` of a ``ModelSerializer`` working on
+    ``.values()`` rows instead of model instances.
+
+    Fields whose output is the database value itself are copied as they are
+    and ISO 8601 datetimes are formatted with the timezone looked up once per
+    call; any other field goes through the serializer field. Only serializers
+    made of plain model columns can be compiled.
+    """
+
+    passthrough = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.IntegerField,
+    )
+
+    def __init__(self, serializer_class):
+        opts = serializer_class.Meta.model._meta
+        self.fields = []
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if field.source == "*" or "." in field.source:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{field.field_name} does not map "
+                    "to a single column."
+                )
+            self.fields.append(
+                (field.field_name, opts.get_field(field.source).attname, field)
+            )
+        self.columns = [column for _, column, _ in self.fields]
+
+    def get_converter(self, field):
+        if isinstance(field, self.passthrough) or (
+            isinstance(field, serializers.PrimaryKeyRelatedField)
+            and field.pk_field is None
+        ):
+            return None
+        if (
+            isinstance(field, serializers.DateTimeField)
+            and settings.USE_TZ
+            and getattr(field, "format", api_settings.DATETIME_FORMAT).lower()
+            == ISO_8601
+        ):
+            return self.iso_datetime(field.default_timezone(), field.to_representation)
+        return field.to_representation
+
+    def iso_datetime(self, tz, fallback):
+        def convert(value):
+            if not isinstance(value, datetime) or timezone.is_naive(value):
+                return fallback(value)
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+        return convert
+
+    def represent(self, rows) -> list:
+        fields = [
+            (name, column, self.get_converter(field))
+            for name, column, field in self.fields
+        ]
+        data = []
+        for row in rows:
+            ret = {}
+            for name, column, convert in fields:
+                value = row[column]
+                ret[name] = (
+                    value if convert is None or value is None else convert(value)
+                )
+            data.append(ret)
+        return data
+
+    def to_representation(self, row: dict) -> dict:
+        return self.represent([row])[0]
+
+    def row(self, instance) -> dict:
+        return {column: getattr(instance, column) for column in self.columns}
+
+
+@functools.cache
+def compile_representation(serializer_class) -> CompiledRepresentation:
+    return CompiledRepresentation(serializer_class)
@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+from .mux import mux
+
+VIEWER_COUNTS_KEY = "live:viewer-counts:{}"
+
+
+class ViewerCountCache:
+    """
+    Viewer counts per stream, kept in the shared cache.
+
+    Entries are fresh for ``MUX_VIEWER_COUNTS_TTL`` seconds. After that they are
+    still served (stale-while-revalidate) for up to ``MUX_VIEWER_COUNTS_STALE_TTL``
+    seconds while a single background fetch refreshes them. Concurrent misses for
+    the same stream share one upstream request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: dict[int, Future] = {}
+        self._session = None
+        self._executor = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_maxsize=settings.MUX_STATS_POOL_MAXSIZE)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.MUX_STATS_REFRESH_WORKERS,
+                        thread_name_prefix="viewer-counts",
+                    )
+        return self._executor
+
+    def get(self, stream_id, token) -> dict:
+        entry = cache.get(VIEWER_COUNTS_KEY.format(stream_id))
+
+        # The poll_viewer_counts command keeps the cache filled for live streams
+        if settings.MUX_VIEWER_COUNTS_POLLING:
+            return entry or {"views": 0, "viewers": 0}
+
+        if entry is None:
+            future, leader = self._claim(stream_id)
+            if leader:
+                self._refresh(stream_id, token, future)
+            deadline = mux.caller("stats").deadline("get_viewer_counts")
+            return future.result(timeout=deadline)
+
+        if time.time() - entry["fetched_at"] >= settings.MUX_VIEWER_COUNTS_TTL:
+            future, leader = self._claim(stream_id)
+            if leader:
+                self.executor.submit(self._refresh, stream_id, token, future)
+
+        return entry
+
+    def set(self, stream_id, counts: dict) -> dict:
+        entry = {
+            "views": counts.get("views", 0),
+            "viewers": counts.get("viewers", 0),
+            "fetched_at": time.time(),
+        }
+        cache.set(
+            VIEWER_COUNTS_KEY.format(stream_id),
+            entry,
+            settings.MUX_VIEWER_COUNTS_STALE_TTL,
+        )
+        return entry
+
+    def fetch(self, token) -> dict:
+        def attempt(timeout):
+            response = self.session.get(
+                settings.MUX_STATS_URL, params={"token": token}, timeout=timeout
+            )
+            response.raise_for_status()
+            return response
+
+        response = mux.caller("stats")(
+            "get_viewer_counts",
+            attempt,
+            (settings.MUX_STATS_TIMEOUT, settings.MUX_STATS_TIMEOUT),
+            idempotent=True,
+        )
+        data = response.json().get("data") or [{}]
+        return data[0]
+
+    def _claim(self, stream_id):
+        with self._lock:
+            future = self._in_flight.get(stream_id)
+            if future is not None:
+                return future, False
+            future = self._in_flight[stream_id] = Future()
+            return future, True
+
+    def _refresh(self, stream_id, token, future: Future):
+        try:
+            future.set_result(self.set(stream_id, self.fetch(token)))
+        except Exception as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._in_flight.pop(stream_id, None)
+
+
+viewer_counts = ViewerCountCache()
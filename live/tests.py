@@ -1,3 +1,2024 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import json
+import re
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models import Max, QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    LiveServerTestCase,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.views import View
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from watch.views import ListStreams, WatchStream
+
+from . import views
+from .checks import shared_cache_check, shared_cache_deploy_check
+from .events import HEARTBEAT, StreamEventHub
+from .exceptions import MuxUnavailable
+from .benchmark import HEADER, LoadResult, run_load
+from .cache import LocalBackend, stream_cache, stream_versions
+from .db import PRIMARY_COOKIE, ReplicaMiddleware, ReplicaRouter
+from .fakemux import FakeMux, FakeMuxHandler, FakeMuxServer
+from .jobs import claim_jobs, retry_delay, run_job
+from .feed import CHUNK_KEY, ORDER_KEY, REBUILD_KEY, live_now
+from .models import (
+    MuxJob,
+    MuxJobStatus,
+    MuxOperation,
+    Profile,
+    Simulcast,
+    Stream,
+    StreamStatus,
+    StreamStatusJWT,
+    StreamThumbnail,
+    WebhookEvent,
+)
+from .metrics import (
+    MetricsMiddleware,
+    registry,
+    request_db_duration,
+    request_db_queries,
+)
+from .mux import mux
+from .pagination import StreamCursorPagination
+from .reconcile import Reconciler
+from .resilience import CircuitBreaker
+from .renderers import FastJSONRenderer
+from .stats import VIEWER_COUNTS_KEY, ViewerCountCache, viewer_counts
+from .tokens import StatusTokenProvider, status_tokens
+from .thumbnails import rendition_name, thumbnails
+from .webhooks import status_updates
+from .serializers import (
+    SimpleStreamSerializer,
+    SimulcastSerializer,
+    StreamSerializer,
+    compile_representation,
+)
+
+
+def create_streams(count, **kwargs):
+    return [
+        Stream.objects.create(
+            title=f"Stream {i}",
+            stream_id=f"stream-{i}",
+            playback_id=f"play-{i}",
+            **kwargs,
+        )
+        for i in range(count)
+    ]
+
+
+def status_event(event_id, live_stream_id, type="active", created_at=None):
+    return {
+        "id": event_id,
+        "type": f"video.live_stream.{type}",
+        "object": {"id": live_stream_id},
+        "created_at": (created_at or timezone.now()).isoformat(),
+    }
+
+
+class ListStreamQueriesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertConstantQueries(self, num, url, user=None):
+        self.client.force_authenticate(user)
+        for total in (1, 5, 25):
+            Stream.objects.all().delete()
+            create_streams(total)
+            with self.subTest(streams=total), self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    # One query for the page, the ETag validator comes from the cache
+    def test_list_stream_queries(self):
+        self.assertConstantQueries(1, reverse("list-stream"))
+
+    def test_list_stream_queries_staff(self):
+        staff = User.objects.create(username="staff", is_staff=True)
+        self.assertConstantQueries(1, reverse("list-stream"), staff)
+
+    def test_list_stream_loads_serializer_fields(self):
+        create_streams(1)
+        response = self.client.get(reverse("list-stream"))
+        self.assertEqual(
+            response.json()["results"][0],
+            {
+                "stream_id": "stream-0",
+                "title": "Stream 0",
+                "description": None,
+                "playback_id": "play-0",
+            },
+        )
+
+
+class ListStreamPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.streams = create_streams(5)
+
+    def test_pages_follow_cursor(self):
+        url = reverse("list-stream") + "?page_size=2"
+        seen = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            body = response.json()
+            seen += [stream["stream_id"] for stream in body["results"]]
+            url = body["next"]
+        self.assertEqual(seen, [stream.stream_id for stream in reversed(self.streams)])
+
+    def test_approximate_total(self):
+        response = self.client.get(reverse("list-stream"), {"total": 1})
+        self.assertEqual(response.json()["total"], 5)
+        self.assertNotIn("total", self.client.get(reverse("list-stream")).json())
+
+
+class StreamCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Retire the rows cached by earlier tests under the same pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stream = create_streams(1)[0]
+
+    def test_retrieve_reads_through_cache(self):
+        url = reverse("view-stream", args=[self.stream.stream_id])
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["title"], "Stream 0")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stream.title = "Renamed"
+            self.stream.save()
+            # Still cached until the commit
+            self.assertEqual(self.client.get(url).json()["title"], "Stream 0")
+        self.assertEqual(self.client.get(url).json()["title"], "Renamed")
+
+    @override_settings(LIVE_STREAM_CACHE_BACKEND="shared")
+    @mock.patch.object(stream_cache, "_backend", None)
+    def test_watch_shares_cached_row(self):
+        cache.clear()
+        self.client.get(reverse("view-stream", args=[self.stream.stream_id]))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("view", args=[self.stream.pk]))
+        self.assertContains(response, "Stream 0")
+
+        pk = self.stream.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stream.delete()
+        self.assertIsNone(stream_cache.get("pk", pk))
+        response = self.client.get(reverse("view", args=[pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_watch_page_skips_local_row(self):
+        cache.clear()
+        self.client.get(reverse("view-stream", args=[self.stream.stream_id]))
+        # Another worker renames the stream; this one keeps its local row
+        Stream.objects.filter(pk=self.stream.pk).update(title="Renamed")
+        stream_versions.bump(self.stream.pk)
+
+        response = self.client.get(reverse("view", args=[self.stream.pk]))
+        self.assertContains(response, "Renamed")
+        self.assertEqual(stream_cache.get("pk", self.stream.pk).title, "Stream 0")
+
+    def test_local_backend_evicts_least_recently_used(self):
+        backend = LocalBackend(max_entries=2)
+        backend.set_many({"a": 1, "b": 2}, 60)
+        backend.get("a")
+        backend.set_many({"c": 3}, 60)
+        self.assertEqual(backend.get("b"), None)
+        self.assertEqual((backend.get("a"), backend.get("c")), (1, 3))
+        backend.set_many({"d": 4}, 0)
+        self.assertEqual(backend.get("d"), None)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.stream = create_streams(1)[0]
+
+    def assertNotModified(self, url, num_queries):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(num_queries):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        if response.has_header("Last-Modified"):
+            cached = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(cached.status_code, 304)
+        return response["ETag"]
+
+    def test_retrieve_stream(self):
+        url = reverse("view-stream", args=[self.stream.stream_id])
+        etag = self.assertNotModified(url, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stream.title = "Renamed"
+            self.stream.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Renamed")
+
+    def test_list_stream(self):
+        url = reverse("list-stream")
+        etag = self.assertNotModified(url, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Stream.objects.create(title="New")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_stream_after_delete(self):
+        url = reverse("list-stream")
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("Last-Modified"))
+        since = http_date(time.time() + 60)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stream.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_simulcasts(self):
+        simulcast = Simulcast.objects.create(
+            stream=self.stream, simulcast_id="sim-0", stream_key="key-0", url="rtmp://"
+        )
+        list_url = reverse("list-simulcast", args=["stream-0"])
+        list_etag = self.assertNotModified(list_url, 0)
+        url = reverse("view-simulcast", args=[self.stream.pk, "sim-0"])
+        etag = self.assertNotModified(url, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            simulcast.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_versions_bumped_on_commit(self):
+        version = stream_versions.get(self.stream.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            StreamThumbnail.objects.create(stream=self.stream)
+            Simulcast.objects.create(
+                stream=self.stream, simulcast_id="sim-0", stream_key="k", url="x"
+            )
+            # Pages rendered before the commit must not get the new version
+            self.assertEqual(stream_versions.get(self.stream.pk), version)
+        self.assertNotEqual(stream_versions.get(self.stream.pk), version)
+
+
+class FastReadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username="creator")
+        creator = Profile.objects.create(first_name="Creator", user=user)
+        streams = create_streams(3, creator=creator)
+        streams[0].title = 'Ünïcode "quoted" \u2028 line\nbreak \x00 😀'
+        streams[0].description = "</script>"
+        streams[0].save()
+        Simulcast.objects.create(
+            stream=streams[0], simulcast_id="sim-0", stream_key="key-0", url="rtmp://"
+        )
+
+    def test_matches_serializers(self):
+        for serializer_class in (
+            StreamSerializer,
+            SimpleStreamSerializer,
+            SimulcastSerializer,
+        ):
+            queryset = serializer_class.Meta.model.objects.order_by("pk")
+            representation = compile_representation(serializer_class)
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assertEqual(
+                    FastJSONRenderer().render(
+                        representation.represent(
+                            queryset.values(*representation.columns)
+                        )
+                    ),
+                    JSONRenderer().render(serializer_class(queryset, many=True).data),
+                )
+
+    def test_renderer_matches_parent(self):
+        now = timezone.now()
+        data = {
+            "utc": now,
+            "offset": now.astimezone(timezone.get_fixed_timezone(-180)),
+            "date": now.date(),
+            "text": "\u2028 😀",
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertIn(b'Z","offset"', FastJSONRenderer().render(data))
+
+        # The documented difference: the parent refuses non-finite floats
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({"viewers": float("nan")})
+        self.assertEqual(
+            FastJSONRenderer().render({"viewers": float("nan")}), b'{"viewers":null}'
+        )
+
+    def test_list_stream_matches_serializer(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="staff", is_staff=True))
+        response = client.get(reverse("list-stream"))
+        queryset = Stream.objects.order_by("-created_at", "-id")
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(
+                {
+                    "next": None,
+                    "previous": None,
+                    "results": StreamSerializer(queryset, many=True).data,
+                }
+            ),
+        )
+
+
+class FakeMuxTestCase(TestCase):
+    """Points the Mux client at an in-process `FakeMux` server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake = FakeMux()
+        cls.server = FakeMuxServer(("127.0.0.1", 0), cls.fake)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings = override_settings(
+            MUX_API_HOST=f"http://127.0.0.1:{cls.server.server_port}"
+        )
+        cls.settings.enable()
+        mux.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        mux.close()
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.fake.live_streams.clear()
+        self.client = APIClient()
+
+
+@override_settings(
+    MUX_API_POOL_SIZE=3,
+    MUX_API_POOL_MAXSIZE=7,
+    MUX_API_CONNECT_TIMEOUT=1.5,
+    MUX_API_READ_TIMEOUT=4,
+)
+class MuxClientTest(FakeMuxTestCase):
+    def setUp(self):
+        super().setUp()
+        # Built again with the settings above, and again after the test
+        mux.close()
+        self.addCleanup(mux.close)
+
+    def test_client_shared_across_threads(self):
+        clients = []
+        threads = [
+            threading.Thread(target=lambda: clients.append(mux.api_client))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(clients), 8)
+        self.assertTrue(all(client is mux.api_client for client in clients))
+
+        pool_manager = mux.api_client.rest_client.pool_manager
+        self.assertEqual(pool_manager.pools._maxsize, 3)
+        self.assertEqual(pool_manager.connection_pool_kw["maxsize"], 7)
+        self.assertIs(pool_manager.connection_pool_kw["retries"].total, False)
+
+    def test_calls_reuse_connection(self):
+        live_stream = self.fake.create_live_stream({})
+        for _ in range(3):
+            mux.live_streams.get_live_stream(live_stream["id"])
+        pool_manager = mux.api_client.rest_client.pool_manager
+        self.assertEqual(len(pool_manager.pools), 1)
+        pool = pool_manager.connection_from_url(mux.get_configuration().host)
+        self.assertEqual(pool.num_connections, 1)
+        self.assertEqual(pool.num_requests, 3)
+
+    def test_timeouts_applied(self):
+        live_stream = self.fake.create_live_stream({})
+        pool_manager = mux.api_client.rest_client.pool_manager
+        with mock.patch.object(
+            pool_manager, "request", wraps=pool_manager.request
+        ) as request:
+            mux.live_streams.get_live_stream(live_stream["id"])
+        timeout = request.call_args.kwargs["timeout"]
+        self.assertEqual((timeout.connect_timeout, timeout.read_timeout), (1.5, 4))
+
+
+class BulkCreateStreamsTest(FakeMuxTestCase):
+    url = reverse("bulk-create-stream")
+
+    def test_creates_streams_without_thumbnails(self):
+        items = [{"title": f"Event {i}"} for i in range(5)]
+        # One insert, inside a savepoint; no thumbnail rows for new streams
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, 201)
+
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["created"] * 5)
+        self.assertEqual(
+            {result["stream"]["stream_id"] for result in results},
+            set(self.fake.live_streams),
+        )
+        self.assertFalse(StreamThumbnail.objects.exists())
+
+    def test_reports_each_item(self):
+        create_mux_stream = views.CreateStream.create_mux_stream
+
+        def create(view, visibility, latency_mode, test_mode):
+            if latency_mode == "low":
+                raise views.ValidationError("Mux is down.")
+            return create_mux_stream(view, visibility, latency_mode, test_mode)
+
+        items = [
+            {"title": "Valid"},
+            {"title": ""},
+            {"title": "Unlucky", "latency_mode": "low"},
+        ]
+        with mock.patch.object(views.CreateStream, "create_mux_stream", create):
+            response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, 207)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(result["index"], result["status"]) for result in results],
+            [(0, "created"), (1, "invalid"), (2, "failed")],
+        )
+        self.assertEqual(results[2]["errors"], ["Mux is down."])
+        self.assertEqual(
+            list(Stream.objects.values_list("title", flat=True)), ["Valid"]
+        )
+        self.assertEqual(len(self.fake.live_streams), 1)
+
+    def test_deletes_mux_streams_when_write_fails(self):
+        with mock.patch.object(Stream.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.url, [{"title": "Lost"}] * 3, format="json")
+        self.assertEqual(self.fake.live_streams, {})
+        self.assertFalse(Stream.objects.exists())
+
+    def test_deletes_mux_streams_when_build_fails(self):
+        with mock.patch.object(
+            views.BulkCreateStreams, "build_stream", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.url, [{"title": "Lost"}] * 3, format="json")
+        self.assertEqual(self.fake.live_streams, {})
+        self.assertFalse(Stream.objects.exists())
+
+    @override_settings(MUX_ASYNC_JOBS=True)
+    def test_async_mode_queues_jobs(self):
+        response = self.client.post(self.url, [{"title": "Later"}] * 2, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(MuxJob.objects.filter(stream__title="Later").count(), 2)
+        self.assertEqual(self.fake.live_streams, {})
+
+
+class CreateStreamTest(FakeMuxTestCase):
+    url = reverse("create-stream")
+
+    @override_settings(MUX_ASYNC_JOBS=True)
+    def test_async_mode_ignores_mux_fields(self):
+        response = self.client.post(
+            self.url,
+            {
+                "title": "Queued",
+                "stream_id": "bogus-id",
+                "playback_id": "bogus-playback",
+                "stream_key": "bogus-key",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        stream = Stream.objects.get(title="Queued")
+        self.assertEqual(
+            (stream.stream_id, stream.playback_id, stream.stream_key),
+            (None, None, None),
+        )
+
+        (job,) = [run_job(job) for job in claim_jobs(10)]
+        self.assertEqual(job.status, MuxJobStatus.SUCCEEDED)
+        stream.refresh_from_db()
+        self.assertEqual(list(self.fake.live_streams), [stream.stream_id])
+        self.assertEqual(
+            self.fake.live_streams[stream.stream_id]["stream_key"], stream.stream_key
+        )
+
+
+@override_settings(MUX_JOB_MAX_ATTEMPTS=2, MUX_JOB_LEASE=60)
+class MuxJobTest(FakeMuxTestCase):
+    def setUp(self):
+        super().setUp()
+        live_stream = self.fake.create_live_stream({})
+        self.stream = Stream.objects.create(
+            title="Queued",
+            stream_id=live_stream["id"],
+            playback_id=live_stream["playback_ids"][0]["id"],
+        )
+
+    def run_jobs(self):
+        return [run_job(job) for job in claim_jobs(10)]
+
+    def test_claim_jobs(self):
+        now = timezone.now()
+        runnable = MuxJob.objects.create(operation=MuxOperation.FINISH_STREAM)
+        MuxJob.objects.create(
+            operation=MuxOperation.FINISH_STREAM, run_after=now + timedelta(hours=1)
+        )
+        MuxJob.objects.create(
+            operation=MuxOperation.FINISH_STREAM,
+            status=MuxJobStatus.RUNNING,
+            locked_at=now,
+        )
+        # Its worker died past the lease
+        abandoned = MuxJob.objects.create(
+            operation=MuxOperation.FINISH_STREAM,
+            status=MuxJobStatus.RUNNING,
+            locked_at=now - timedelta(minutes=5),
+            attempts=1,
+        )
+
+        claimed = {job.pk: job for job in claim_jobs(10)}
+        self.assertEqual(set(claimed), {runnable.pk, abandoned.pk})
+        self.assertEqual(claimed[abandoned.pk].attempts, 2)
+        self.assertEqual(claimed[runnable.pk].status, MuxJobStatus.RUNNING)
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_claim_skips_jobs_taken_meanwhile(self):
+        job = MuxJob.objects.create(operation=MuxOperation.FINISH_STREAM)
+        values_list = QuerySet.values_list
+
+        def select_then_lose(queryset, *fields, **kwargs):
+            pks = list(values_list(queryset, *fields, **kwargs))
+            # Another worker claims the job between the select and the update
+            MuxJob.objects.filter(pk=job.pk).update(
+                status=MuxJobStatus.RUNNING, locked_at=timezone.now()
+            )
+            return pks
+
+        with mock.patch.object(QuerySet, "values_list", select_then_lose):
+            self.assertEqual(claim_jobs(10), [])
+        self.assertEqual(MuxJob.objects.get(pk=job.pk).attempts, 0)
+
+    @override_settings(MUX_JOB_RETRY_BACKOFF=2, MUX_JOB_RETRY_BACKOFF_MAX=10)
+    def test_retry_delay(self):
+        with mock.patch("live.jobs.random.uniform", lambda low, high: high):
+            self.assertEqual(
+                [retry_delay(attempts) for attempts in (1, 2, 3, 10)], [2, 4, 8, 10]
+            )
+
+    def test_run_job_retries_then_fails(self):
+        self.fake.live_streams.clear()
+        MuxJob.objects.create(operation=MuxOperation.FINISH_STREAM, stream=self.stream)
+
+        with mock.patch("live.jobs.retry_delay", return_value=60) as retry_delay:
+            (job,) = self.run_jobs()
+        retry_delay.assert_called_once_with(1)
+        self.assertEqual(job.status, MuxJobStatus.PENDING)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=30))
+        self.assertTrue(job.error)
+        self.assertIsNone(job.locked_at)
+
+        MuxJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        (job,) = self.run_jobs()
+        self.assertEqual((job.status, job.attempts), (MuxJobStatus.FAILED, 2))
+        self.assertEqual(self.run_jobs(), [])
+
+    def test_create_retry_reuses_mux_stream(self):
+        stream = Stream.objects.create(title="Pending")
+        MuxJob.objects.create(operation=MuxOperation.CREATE_STREAM, stream=stream)
+        with mock.patch.object(Stream, "save", side_effect=DatabaseError):
+            (job,) = self.run_jobs()
+        self.assertEqual(job.status, MuxJobStatus.PENDING)
+        self.assertEqual(len(self.fake.live_streams), 2)
+
+        MuxJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        (job,) = self.run_jobs()
+        self.assertEqual(job.status, MuxJobStatus.SUCCEEDED)
+        self.assertEqual(len(self.fake.live_streams), 2)
+        stream.refresh_from_db()
+        self.assertEqual(stream.stream_id, job.payload["mux_stream_id"])
+
+    def test_delete_cancels_pending_create(self):
+        stream = Stream.objects.create(title="Pending")
+        create = MuxJob.objects.create(
+            operation=MuxOperation.CREATE_STREAM,
+            stream=stream,
+            run_after=timezone.now() + timedelta(hours=1),
+        )
+        MuxJob.objects.create(
+            operation=MuxOperation.DELETE_STREAM,
+            stream=stream,
+            payload={"stream_id": None},
+        )
+
+        (job,) = self.run_jobs()
+        self.assertEqual(job.status, MuxJobStatus.SUCCEEDED)
+        self.assertEqual(MuxJob.objects.get(pk=create.pk).status, MuxJobStatus.FAILED)
+        self.assertFalse(Stream.objects.filter(pk=stream.pk).exists())
+        self.assertEqual(len(self.fake.live_streams), 1)
+
+    def test_delete_waits_for_running_create(self):
+        stream = Stream.objects.create(title="Pending")
+        MuxJob.objects.create(
+            operation=MuxOperation.CREATE_STREAM,
+            stream=stream,
+            status=MuxJobStatus.RUNNING,
+            locked_at=timezone.now(),
+        )
+        MuxJob.objects.create(
+            operation=MuxOperation.DELETE_STREAM,
+            stream=stream,
+            payload={"stream_id": None},
+        )
+
+        (job,) = self.run_jobs()
+        self.assertEqual(job.status, MuxJobStatus.PENDING)
+        self.assertTrue(Stream.objects.filter(pk=stream.pk).exists())
+
+    def test_simulcast_removed_from_mux_when_key_taken(self):
+        other = Stream.objects.create(title="Other", stream_id="other")
+        Simulcast.objects.create(
+            stream=other, simulcast_id="taken", stream_key="key", url="rtmp://"
+        )
+        MuxJob.objects.create(
+            operation=MuxOperation.CREATE_SIMULCAST,
+            stream=self.stream,
+            payload={"stream_key": "key", "url": "rtmp://"},
+        )
+
+        (job,) = self.run_jobs()
+        self.assertEqual(job.status, MuxJobStatus.PENDING)
+        self.assertEqual(
+            self.fake.live_streams[self.stream.stream_id]["simulcast_targets"], []
+        )
+
+
+class BulkSimulcastsTest(FakeMuxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.streams = []
+        for i in range(2):
+            live_stream = self.fake.create_live_stream({})
+            self.streams.append(
+                Stream.objects.create(title=f"Stream {i}", stream_id=live_stream["id"])
+            )
+
+    def add_targets(self, items):
+        return self.client.post(reverse("bulk-create-simulcast"), items, format="json")
+
+    def test_add_and_remove_across_streams(self):
+        items = [
+            {"stream": stream.pk, "stream_key": f"{service}-{stream.pk}", "url": url}
+            for stream in self.streams
+            for service, url in [("youtube", "rtmp://yt"), ("twitch", "rtmp://tw")]
+        ]
+        response = self.add_targets(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Simulcast.objects.count(), 4)
+        for stream in self.streams:
+            live_stream = self.fake.live_streams[stream.stream_id]
+            self.assertEqual(len(live_stream["simulcast_targets"]), 2)
+
+        simulcast_ids = list(Simulcast.objects.values_list("simulcast_id", flat=True))
+        # Load the targets, collect them for the post_delete receivers, delete
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                reverse("bulk-delete-simulcast"),
+                simulcast_ids + ["unknown"],
+                format="json",
+            )
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result["status"] for result in response.json()["results"]],
+            ["removed"] * 4 + ["not_found"],
+        )
+        self.assertFalse(Simulcast.objects.exists())
+        for live_stream in self.fake.live_streams.values():
+            self.assertEqual(live_stream["simulcast_targets"], [])
+
+    def test_reports_invalid_targets(self):
+        self.streams[1].status = StreamStatus.ACTIVE
+        self.streams[1].save()
+        response = self.add_targets(
+            [
+                {"stream": self.streams[0].pk, "stream_key": "key", "url": "rtmp://"},
+                {"stream": self.streams[0].pk, "stream_key": "key", "url": "rtmp://"},
+                {"stream": self.streams[1].pk, "stream_key": "other", "url": "rtmp://"},
+                {"stream": 0, "stream_key": "missing", "url": "rtmp://"},
+                {"stream": self.streams[0].pk},
+            ]
+        )
+        self.assertEqual(response.status_code, 207)
+        results = response.json()["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "invalid", "invalid", "invalid", "invalid"],
+        )
+        self.assertEqual(list(results[4]["errors"]), ["stream_key", "url"])
+        self.assertEqual(Simulcast.objects.get().stream_key, "key")
+
+
+class ReconcileTest(FakeMuxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.live_streams = [self.fake.create_live_stream({}) for _ in range(5)]
+        self.streams = [
+            Stream.objects.create(
+                title=f"Stream {i}",
+                stream_id=live_stream["id"],
+                stream_key=live_stream["stream_key"],
+                playback_id=live_stream["playback_ids"][0]["id"],
+            )
+            for i, live_stream in enumerate(self.live_streams[:4])
+        ]
+        # A missed webhook and a lost stream key reset
+        self.live_streams[0]["status"] = StreamStatus.ACTIVE
+        self.live_streams[1]["stream_key"] = "new-key"
+        # A simulcast target only on Mux and one only local
+        self.live_streams[2]["simulcast_targets"].append(
+            {"id": "mux-only", "stream_key": "k1", "url": "rtmp://", "status": "idle"}
+        )
+        Simulcast.objects.create(
+            stream=self.streams[3], simulcast_id="local-only", stream_key="k2", url="x"
+        )
+        # Deleted on Mux after the local write
+        self.gone = Stream.objects.create(title="Gone", stream_id="gone")
+
+    def test_full_run(self):
+        report = Reconciler(page_size=2, concurrency=2).run_full(delete_missing=True)
+
+        self.assertEqual(report.checked, 5)
+        self.assertEqual(report.updated, 2)
+        self.assertEqual(report.unknown, [self.live_streams[4]["id"]])
+        self.assertEqual(report.missing, ["gone"])
+        self.assertEqual(
+            Stream.objects.get(pk=self.streams[0].pk).status, StreamStatus.ACTIVE
+        )
+        self.assertEqual(
+            Stream.objects.get(pk=self.streams[1].pk).stream_key, "new-key"
+        )
+        self.assertEqual(
+            list(Simulcast.objects.values_list("simulcast_id", flat=True)), ["mux-only"]
+        )
+        self.assertFalse(Stream.objects.filter(pk=self.gone.pk).exists())
+
+    def test_run_outside_requests_updates_cached_pages(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                }
+            }
+            with override_settings(CACHES=shared):
+                playback_id = self.streams[0].playback_id
+                self.assertNotContains(
+                    self.client.get(reverse("list")), f"image.mux.com/{playback_id}"
+                )
+                # As the reconcile_mux process does, the versions it bumps are
+                # read by the web workers through the shared cache
+                Reconciler().run_full()
+                self.assertContains(
+                    self.client.get(reverse("list")), f"image.mux.com/{playback_id}"
+                )
+
+    def test_dry_run_writes_nothing(self):
+        report = Reconciler(dry_run=True).run_full(delete_missing=True)
+        self.assertEqual((report.updated, report.missing), (2, ["gone"]))
+        self.assertEqual(Stream.objects.get(pk=self.streams[0].pk).status, "idle")
+        self.assertTrue(Stream.objects.filter(pk=self.gone.pk).exists())
+
+    def test_incremental_run(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Stream.objects.filter(pk=self.streams[1].pk).update(updated_at=an_hour_ago)
+        since = timezone.now() - timedelta(minutes=5)
+
+        report = Reconciler().run_incremental(since)
+
+        # Stream 0 is active on Mux, stream 1 only changed an hour ago
+        self.assertEqual(
+            Stream.objects.get(pk=self.streams[0].pk).status, StreamStatus.ACTIVE
+        )
+        self.assertNotEqual(
+            Stream.objects.get(pk=self.streams[1].pk).stream_key, "new-key"
+        )
+        self.assertEqual(report.missing, ["gone"])
+        self.assertTrue(Stream.objects.filter(pk=self.gone.pk).exists())
+
+
+@override_settings(
+    MUX_API_RETRIES=2,
+    MUX_API_RETRY_BACKOFF=0,
+    MUX_BREAKER_MIN_CALLS=3,
+    MUX_BREAKER_ERROR_RATE=0.5,
+    MUX_BREAKER_COOLDOWN=60,
+)
+class MuxResilienceTest(FakeMuxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake.fail_next = 0
+        # Fresh breakers and retry counts built from the settings above
+        mux.close()
+        self.client.force_authenticate(User.objects.create_user("admin"))
+
+    def test_idempotent_call_is_retried(self):
+        live_stream = self.fake.create_live_stream({})
+        self.fake.fail_next = 2
+
+        response = mux.live_streams.get_live_stream(live_stream["id"])
+
+        self.assertEqual(response.data.id, live_stream["id"])
+        self.assertEqual(mux.caller("api").retries, {"get_live_stream": 2})
+
+    def test_retried_delete_of_a_deleted_stream_succeeds(self):
+        live_stream = self.fake.create_live_stream({})
+        api = mux.live_streams._api
+        delete = api.delete_live_stream
+
+        def delete_and_lose_answer(*args, **kwargs):
+            delete(*args, **kwargs)
+            if not mux.caller("api").retries:
+                raise TimeoutError()
+
+        with mock.patch.object(api, "delete_live_stream", delete_and_lose_answer):
+            mux.live_streams.delete_live_stream(live_stream["id"])
+        self.assertNotIn(live_stream["id"], self.fake.live_streams)
+
+    def test_create_is_not_retried(self):
+        self.fake.fail_next = 2
+
+        response = self.client.post(reverse("create-stream"), {"title": "Event"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.fake.fail_next, 1)
+        self.assertEqual(self.fake.live_streams, {})
+        self.assertFalse(Stream.objects.exists())
+
+    def test_circuit_opens_and_fails_fast(self):
+        stream = Stream.objects.create(title="Event", stream_id="missing")
+        self.fake.fail_next = 100
+
+        # Retries of the first call fill the window and open the circuit
+        with self.assertRaises(MuxUnavailable):
+            mux.live_streams.get_live_stream("missing")
+        self.assertEqual(mux.caller("api").breaker.state, CircuitBreaker.OPEN)
+
+        remaining = self.fake.fail_next
+        response = self.client.delete(reverse("delete-stream", args=["missing"]))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["detail"], MuxUnavailable.default_detail)
+        # Rejected without reaching Mux
+        self.assertEqual(self.fake.fail_next, remaining)
+        self.assertTrue(Stream.objects.filter(pk=stream.pk).exists())
+
+        metrics = registry.render()
+        self.assertIn('mux_circuit_state{service="api"} 2', metrics)
+        self.assertIn('mux_call_retries_total{operation="get_live_stream"} 2', metrics)
+
+    def test_half_open_circuit_closes_after_a_successful_trial(self):
+        breaker = CircuitBreaker(
+            "test", window=60, min_calls=2, error_rate=0.5, cooldown=0
+        )
+        breaker.record(False)
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+        self.assertTrue(breaker.allow())
+        # A single trial call at a time
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class LoadResultTest(SimpleTestCase):
+    def test_percentiles(self):
+        result = LoadResult("test", latencies=[float(i) for i in range(101)])
+
+        self.assertEqual(result.percentile(50), 50)
+        self.assertEqual(result.percentile(95), 95)
+        self.assertEqual(result.percentile(99), 99)
+        self.assertEqual(LoadResult("test", latencies=[0.2]).percentile(99), 0.2)
+        self.assertEqual(LoadResult("test").percentile(50), 0)
+
+    def test_summary(self):
+        result = LoadResult("list", latencies=[0.01, 0.02, 0.03], errors=1)
+        result.elapsed = 2
+
+        self.assertEqual(result.requests, 4)
+        self.assertEqual(result.throughput, 2)
+        self.assertEqual(LoadResult("idle").throughput, 0)
+        self.assertEqual(len(result.row()), len(HEADER))
+        self.assertEqual(
+            result.row().split(), ["list", "4", "1", "2.0", "20.0", "29.0", "29.8"]
+        )
+
+    def test_run_load_counts_errors(self):
+        threads = set()
+
+        def call(i):
+            threads.add(threading.get_ident())
+            time.sleep(0.01)
+            if i % 3 == 0:
+                raise ConnectionError()
+            return i % 3 == 1
+
+        result = run_load("test", call, 9, 3)
+
+        self.assertEqual(result.requests, 9)
+        self.assertEqual(result.errors, 6)
+        self.assertEqual(len(result.latencies), 3)
+        self.assertTrue(all(latency >= 0.01 for latency in result.latencies))
+        self.assertEqual(len(threads), 3)
+        self.assertGreater(result.elapsed, 0)
+
+
+class FakeMuxServerTest(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeMux()
+        server = FakeMuxServer(("127.0.0.1", 0), self.fake)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_port}"
+
+    def get(self, path):
+        started = time.perf_counter()
+        response = requests.get(self.url + path)
+        return response, time.perf_counter() - started
+
+    def test_latency(self):
+        self.fake.latency = 0.1
+        self.fake.jitter = 0.05
+
+        response, elapsed = self.get("/video/v1/live-streams")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(elapsed, 0.05)
+
+    def test_fail_next(self):
+        self.fake.fail_next = 2
+
+        statuses = [self.get("/counts?token=t")[0].status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [503, 503, 200])
+        self.assertEqual(self.fake.fail_next, 0)
+
+    def test_error_rate(self):
+        self.fake.error_rate = 1
+        response, _ = self.get("/counts?token=t")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json(),
+            {"error": {"type": "error", "messages": ["Injected failure."]}},
+        )
+
+        self.fake.error_rate = 0
+        response, _ = self.get("/counts?token=t")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()["data"][0]), {"viewers", "views"})
+
+
+class BenchmarkCommandTest(LiveServerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fake = FakeMux()
+        cls.mux_server = FakeMuxServer(("127.0.0.1", 0), cls.fake)
+        threading.Thread(target=cls.mux_server.serve_forever, daemon=True).start()
+        cls.settings = override_settings(
+            MUX_API_HOST=f"http://127.0.0.1:{cls.mux_server.server_port}"
+        )
+        cls.settings.enable()
+        mux.close()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        mux.close()
+        cls.settings.disable()
+        cls.mux_server.shutdown()
+        cls.mux_server.server_close()
+
+    def benchmark(self, *scenarios, base_url=None):
+        out = StringIO()
+        call_command(
+            "benchmark_live",
+            base_url=base_url or self.live_server_url,
+            requests=6,
+            concurrency=3,
+            scenario=list(scenarios),
+            stdout=out,
+        )
+        header, *rows = out.getvalue().splitlines()
+        self.assertEqual(header, HEADER)
+        return {row.split()[0]: row.split()[1:3] for row in rows}
+
+    def test_scenarios(self):
+        rows = self.benchmark("create", "list", "simulcast-create")
+
+        self.assertEqual(
+            rows,
+            {
+                "create": ["6", "0"],
+                "list": ["6", "0"],
+                "simulcast-create": ["6", "0"],
+            },
+        )
+        self.assertEqual(Stream.objects.count(), 6)
+        self.assertEqual(Simulcast.objects.count(), 6)
+
+    def test_seeds_streams(self):
+        rows = self.benchmark("retrieve", "simulcast-list")
+
+        self.assertEqual(rows, {"retrieve": ["6", "0"], "simulcast-list": ["6", "0"]})
+        self.assertEqual(Stream.objects.count(), 6)
+
+    def test_seed_failure(self):
+        self.fake.error_rate = 1
+        self.addCleanup(setattr, self.fake, "error_rate", 0)
+
+        with self.assertRaisesMessage(CommandError, "Could not create any stream"):
+            self.benchmark("list")
+
+
+def image_file(width, height, format="PNG"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "navy").save(buffer, format)
+    return buffer.getvalue()
+
+
+class ThumbnailTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, THUMBNAIL_WORKERS=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Pool processes are forked with the settings above
+        self.addCleanup(thumbnails.close)
+        self.stream = Stream.objects.create(title="Event", stream_id="stream")
+
+    def test_upload_renders_renditions(self):
+        upload = SimpleUploadedFile("event.png", image_file(1280, 720))
+        response = APIClient().put(
+            reverse("upload-thumbnail", args=["stream"]),
+            {"thumbnail": upload},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        thumbnail = StreamThumbnail.objects.get(stream=self.stream)
+        self.assertEqual(
+            [width for width, _ in thumbnail.renditions["webp"]], [320, 640]
+        )
+        name = thumbnail.renditions["jpeg"][0][1]
+        with thumbnail.thumbnail.storage.open(name) as file:
+            self.assertEqual(Image.open(file).size, (320, 180))
+
+        url = Stream.objects.get(pk=self.stream.pk).thumbnail_url
+        self.assertTrue(url.endswith("event_320w.jpg"))
+        self.assertRegex(
+            url.webp_srcset, r"event_320w\.webp 320w, .*event_640w\.webp 640w"
+        )
+
+    def test_uploads_share_one_row(self):
+        self.assertTrue(views.UploadStreamThumbnail.queryset.query.select_for_update)
+        url = reverse("upload-thumbnail", args=["stream"])
+        names = []
+        for name in ("first.png", "second.png"):
+            upload = SimpleUploadedFile(name, image_file(640, 360))
+            response = APIClient().put(url, {"thumbnail": upload}, format="multipart")
+            self.assertEqual(response.status_code, 200)
+            names.append(StreamThumbnail.objects.get(stream=self.stream).thumbnail.name)
+
+        # The first upload's original and renditions were replaced
+        storage = StreamThumbnail._meta.get_field("thumbnail").storage
+        self.assertFalse(storage.exists(names[0]))
+        self.assertFalse(storage.exists(rendition_name(names[0], 320, "webp")))
+        self.assertTrue(storage.exists(names[1]))
+
+    def test_backfill_skips_default_and_rendered_thumbnails(self):
+        thumbnail = StreamThumbnail(stream=self.stream)
+        thumbnail.thumbnail.save("small.png", ContentFile(image_file(200, 200)))
+        StreamThumbnail.objects.create(
+            stream=Stream.objects.create(title="Default", stream_id="default")
+        )
+
+        out = StringIO()
+        call_command("render_thumbnails", stdout=out)
+        self.assertIn("Rendered 1 thumbnails, 0 failed.", out.getvalue())
+
+        thumbnail.refresh_from_db()
+        # No upscaling, only the smallest size
+        self.assertEqual(list(thumbnail.renditions), ["webp", "jpeg"])
+        self.assertEqual(thumbnail.renditions["jpeg"][0][0], 320)
+        self.assertEqual(StreamThumbnail.objects.exclude(renditions={}).count(), 1)
+
+    def test_default_thumbnail_without_row(self):
+        with self.assertNumQueries(1):
+            stream = Stream.objects.select_related("thumbnail").get(pk=self.stream.pk)
+            self.assertTrue(stream.thumbnail_url.endswith("/default.png"))
+        self.assertFalse(StreamThumbnail.objects.exists())
+
+    def test_active_stream_thumbnail(self):
+        self.stream.status = StreamStatus.ACTIVE
+        url = self.stream.thumbnail_url
+        self.assertIn("animated.webp?width=640 640w", url.webp_srcset)
+        self.assertEqual(url.srcset, "")
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("list-stream")
+        self.title = Stream.objects.create(title="Final do campeonato de xadrez")
+        self.description = Stream.objects.create(
+            title="Resumo da semana", description="Esportes, xadrez e música"
+        )
+        Stream.objects.create(title="Aula de violão", description=None)
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {"search": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_results(self):
+        results = self.search("xadrez")["results"]
+        # Title matches weigh more than description matches
+        self.assertEqual(
+            [result["title"] for result in results],
+            [self.title.title, self.description.title],
+        )
+        # Prefix of the last word, without accents
+        self.assertEqual(len(self.search("MUSI")["results"]), 1)
+        self.assertEqual(self.search("xadrez violão")["results"], [])
+        self.assertEqual(self.search("!!")["results"], [])
+
+    def test_index_follows_writes(self):
+        self.title.title = "Final do campeonato"
+        self.title.save()
+        Stream.objects.filter(pk=self.description.pk).update(description="Piano")
+        Stream.objects.bulk_create([Stream(title="Torneio de xadrez")])
+
+        results = self.search("xadrez")["results"]
+        self.assertEqual([result["title"] for result in results], ["Torneio de xadrez"])
+
+        Stream.objects.filter(title="Torneio de xadrez").delete()
+        self.assertEqual(self.search("xadrez")["results"], [])
+        self.assertEqual(len(self.search("piano")["results"]), 1)
+
+    def test_pagination(self):
+        first = self.search("xadrez", page_size=1)
+        self.assertEqual(first["results"][0]["title"], self.title.title)
+        self.assertIsNone(first["previous"])
+
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(second["results"][0]["title"], self.description.title)
+        self.assertIsNone(second["next"])
+        self.assertNotIn("page=", second["previous"])
+
+
+@override_settings(MUX_VIEWER_COUNTS_TTL=5, MUX_VIEWER_COUNTS_POLLING=False)
+class ViewerCountCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.counts = ViewerCountCache()
+        self.release = threading.Event()
+
+    def fetch(self, token):
+        self.release.wait(5)
+        return {"views": 7, "viewers": 3}
+
+    def test_concurrent_misses_share_one_fetch(self):
+        claims = []
+        claim = self.counts._claim
+
+        def counted_claim(stream_id):
+            claims.append(stream_id)
+            if len(claims) == 8:
+                # Every reader is in before the fetch returns
+                self.release.set()
+            return claim(stream_id)
+
+        results = []
+        with mock.patch.object(self.counts, "fetch", side_effect=self.fetch) as fetch:
+            with mock.patch.object(self.counts, "_claim", counted_claim):
+                threads = [
+                    threading.Thread(
+                        target=lambda: results.append(self.counts.get(1, "token"))
+                    )
+                    for _ in range(8)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join(5)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual([result["viewers"] for result in results], [3] * 8)
+        self.assertEqual(self.counts._in_flight, {})
+
+    def test_stale_entry_served_while_refreshed(self):
+        stale = {"views": 1, "viewers": 1, "fetched_at": time.time() - 10}
+        cache.set(VIEWER_COUNTS_KEY.format(1), stale, 60)
+
+        with mock.patch.object(self.counts, "fetch", side_effect=self.fetch) as fetch:
+            # Served at once, twice, while one refresh runs in the background
+            self.assertEqual(self.counts.get(1, "token")["viewers"], 1)
+            self.assertEqual(self.counts.get(1, "token")["viewers"], 1)
+            future = self.counts._in_flight[1]
+            self.release.set()
+            self.assertEqual(future.result(5)["viewers"], 3)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(self.counts.get(1, "token")["viewers"], 3)
+
+    def test_followers_time_out(self):
+        leader = threading.Thread(target=lambda: self.counts.get(1, "token"))
+        with mock.patch.object(self.counts, "fetch", side_effect=self.fetch):
+            with mock.patch("live.stats.mux") as mux:
+                mux.caller.return_value.deadline.return_value = 0.05
+                leader.start()
+                while 1 not in self.counts._in_flight:
+                    time.sleep(0.01)
+                with self.assertRaises(TimeoutError):
+                    self.counts.get(1, "token")
+                self.release.set()
+                leader.join(5)
+        self.assertEqual(self.counts._in_flight, {})
+
+
+class PollViewerCountsTest(FakeMuxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.streams = create_streams(4, status=StreamStatus.ACTIVE)
+        Stream.objects.create(title="Idle", stream_id="idle")
+        for stream in self.streams:
+            StreamStatusJWT.objects.create(
+                stream=stream,
+                token=f"token-{stream.pk}",
+                expires_at=timezone.now() + timedelta(hours=1),
+            )
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        shared = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location.name,
+                }
+            },
+            MUX_STATS_URL=f"http://127.0.0.1:{self.server.server_port}/counts",
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        status_tokens._tokens.clear()
+
+    def test_round(self):
+        # Only answers once every stream is being fetched at the same time
+        barrier = threading.Barrier(len(self.streams), timeout=5)
+
+        def counts(handler, query, **kwargs):
+            barrier.wait()
+            viewers = int(query["token"].removeprefix("token-")) * 10
+            handler.respond(200, [{"viewers": viewers, "views": viewers * 3}])
+
+        # Builds the live now index in the shared cache
+        self.client.get(reverse("live-now"))
+        set_viewers = mock.patch.object(
+            live_now, "set_viewers", wraps=live_now.set_viewers
+        )
+        with mock.patch.object(FakeMuxHandler, "counts", counts), set_viewers as spy:
+            call_command("poll_viewer_counts", once=True, concurrency=4)
+
+        expected = {stream.pk: stream.pk * 10 for stream in self.streams}
+        spy.assert_called_once_with(expected)
+        for pk, viewers in expected.items():
+            entry = cache.get(VIEWER_COUNTS_KEY.format(pk))
+            self.assertEqual((entry["viewers"], entry["views"]), (viewers, viewers * 3))
+
+        results = self.client.get(reverse("live-now"), {"order": "viewers"}).json()
+        self.assertEqual(
+            [(entry["title"], entry["viewers"]) for entry in results["results"]],
+            [(stream.title, stream.pk * 10) for stream in reversed(self.streams)],
+        )
+
+    def test_failed_fetch_is_reported(self):
+        self.fake.fail_next = 100
+        self.addCleanup(setattr, self.fake, "fail_next", 0)
+        # Drops the stats circuit opened by the failures
+        self.addCleanup(mux.close)
+        stderr = StringIO()
+
+        with mock.patch.object(live_now, "set_viewers") as set_viewers:
+            call_command(
+                "poll_viewer_counts", once=True, stdout=StringIO(), stderr=stderr
+            )
+
+        set_viewers.assert_called_once_with({})
+        self.assertIn("Could not poll stream", stderr.getvalue())
+        self.assertIsNone(cache.get(VIEWER_COUNTS_KEY.format(self.streams[0].pk)))
+
+
+@override_settings(MUX_STATUS_TOKEN_LIFETIME=3600, MUX_STATUS_TOKEN_REFRESH_BEFORE=60)
+class StatusTokenProviderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stream = create_streams(1)[0]
+        self.tokens = StatusTokenProvider()
+        # Refreshes run inline instead of on the background thread
+        self.tokens._executor = mock.Mock(submit=lambda fn, *args: fn(*args))
+        patcher = mock.patch.object(
+            self.tokens,
+            "generate_jwt",
+            side_effect=lambda stream_id, expires_at: f"jwt-{expires_at.timestamp()}",
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_jwt(self, expires_in):
+        return StreamStatusJWT.objects.create(
+            stream=self.stream,
+            token="stored",
+            expires_at=timezone.now() + timedelta(seconds=expires_in),
+        )
+
+    def test_hot_path_skips_database(self):
+        self.create_jwt(600)
+        self.assertEqual(self.tokens.get(self.stream.pk).token, "stored")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tokens.get(self.stream.pk).token, "stored")
+            # Another process: only the shared cache
+            self.tokens._tokens.clear()
+            self.assertEqual(self.tokens.get(self.stream.pk).token, "stored")
+
+    def test_refreshed_before_expiry(self):
+        self.create_jwt(30)
+        with mock.patch("live.tokens.close_old_connections"):
+            status_token = self.tokens.get(self.stream.pk)
+        # The current token is served while its successor is issued
+        self.assertEqual(status_token.token, "stored")
+        refreshed = StreamStatusJWT.objects.get(stream=self.stream)
+        self.assertNotEqual(refreshed.token, "stored")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tokens.get(self.stream.pk).token, refreshed.token)
+
+    def test_reissued_on_expiry(self):
+        self.create_jwt(-1)
+        status_token = self.tokens.get(self.stream.pk)
+        self.assertNotEqual(status_token.token, "stored")
+        self.assertEqual(
+            list(StreamStatusJWT.objects.values_list("token", flat=True)),
+            [status_token.token],
+        )
+        self.assertGreater(status_token.remaining, timedelta(minutes=59))
+
+    @override_settings(MUX_STATUS_TOKEN_LOCAL_TTL=60)
+    def test_local_tokens_pruned(self):
+        self.create_jwt(600)
+        self.tokens.get(self.stream.pk)
+        status_token, loaded_at = self.tokens._tokens[self.stream.pk]
+        self.tokens._tokens[self.stream.pk] = (status_token, loaded_at - 61)
+
+        # A stale entry is dropped when read, not only skipped
+        self.assertIsNone(self.tokens._get_local(self.stream.pk))
+        self.assertEqual(self.tokens._tokens, {})
+
+    @override_settings(MUX_STATUS_TOKEN_LOCAL_MAX_ENTRIES=2)
+    def test_local_tokens_bounded(self):
+        first = self.stream
+        second, third = [
+            Stream.objects.create(title="Other", stream_id=f"other-{i}")
+            for i in range(2)
+        ]
+        for stream in (first, second):
+            self.tokens.get(stream.pk)
+        self.tokens.get(first.pk)
+        self.tokens.get(third.pk)
+
+        # The least recently used token is evicted
+        self.assertEqual(list(self.tokens._tokens), [first.pk, third.pk])
+
+
+@override_settings(LIVE_EVENTS_INTERVAL=0.01, LIVE_EVENTS_HEARTBEAT=5)
+class StreamEventHubTest(SimpleTestCase):
+    def setUp(self):
+        self.hub = StreamEventHub()
+        self.payload = {"status": "active", "views": 1, "viewers": 1}
+        patcher = mock.patch(
+            "live.events.snapshot",
+            side_effect=lambda stream_id: self.payload and dict(self.payload),
+        )
+        self.snapshot = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_fan_out_from_one_poll(self):
+        listeners = [self.hub.listen(1) for _ in range(3)]
+        for listener in listeners:
+            self.assertEqual((await anext(listener))["viewers"], 1)
+        self.assertEqual(list(self.hub._topics), [1])
+        self.assertEqual(self.hub._topics[1].subscribers, 3)
+
+        self.payload["viewers"] = 2
+        for listener in listeners:
+            self.assertEqual((await anext(listener))["viewers"], 2)
+        # One task polls for every listener
+        polls = [
+            task
+            for task in asyncio.all_tasks()
+            if task.get_coro().__qualname__ == "StreamEventHub._poll"
+        ]
+        self.assertEqual(polls, [self.hub._topics[1].task])
+        for listener in listeners:
+            await listener.aclose()
+
+    async def test_poll_stops_with_last_listener(self):
+        first, second = self.hub.listen(1), self.hub.listen(1)
+        await anext(first)
+        await anext(second)
+        task = self.hub._topics[1].task
+
+        await first.aclose()
+        self.assertFalse(task.done())
+        await second.aclose()
+        self.assertEqual(self.hub._topics, {})
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        calls = self.snapshot.call_count
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.snapshot.call_count, calls)
+
+    @override_settings(LIVE_EVENTS_HEARTBEAT=0.02)
+    async def test_heartbeat_while_unchanged(self):
+        listener = self.hub.listen(1)
+        self.assertEqual(await anext(listener), self.payload)
+        self.assertIs(await anext(listener), HEARTBEAT)
+        await listener.aclose()
+
+    async def test_listeners_end_with_stream(self):
+        self.payload = None
+        listener = self.hub.listen(1)
+        self.assertIsNone(await anext(listener))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(listener)
+        self.assertEqual(self.hub._topics, {})
+
+
+class StreamEventsTest(TestCase):
+    def test_wsgi_not_served(self):
+        stream = create_streams(1)[0]
+        response = self.client.get(reverse("stream-events", args=[stream.pk]))
+        self.assertEqual(response.status_code, 501)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+    @override_settings(LIVE_EVENTS_INTERVAL=0.01)
+    async def test_asgi_streams_events(self):
+        payload = {"status": "active", "views": 2, "viewers": 1}
+        with mock.patch("live.events.snapshot", return_value=payload):
+            response = await self.async_client.get(reverse("stream-events", args=[1]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            chunks = aiter(response.streaming_content)
+            self.assertEqual(
+                await anext(chunks),
+                b'event: status\ndata: {"status": "active", "views": 2, '
+                b'"viewers": 1}\n\n',
+            )
+            await chunks.aclose()
+
+
+class LiveNowTest(TestCase):
+    url = reverse("live-now")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.streams = create_streams(4, status=StreamStatus.ACTIVE)
+        Stream.objects.create(title="Idle", stream_id="idle")
+
+    def titles(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [entry["title"] for entry in response.json()["results"]]
+
+    def test_feed_read_from_index(self):
+        # Built once from the database, then served from the cache only
+        with self.assertNumQueries(1):
+            self.titles()
+        with self.assertNumQueries(0):
+            titles = self.titles(page_size=3)
+        self.assertEqual(titles, ["Stream 3", "Stream 2", "Stream 1"])
+        self.assertEqual(self.titles(page_size=3, page=2), ["Stream 0"])
+
+    def test_transitions_update_index(self):
+        self.titles()
+        self.streams[3].status = StreamStatus.IDLE
+        with self.captureOnCommitCallbacks(execute=True):
+            self.streams[3].save()
+        status_updates.record(status_event("evt-idle", "idle"))
+        status_updates.flush()
+
+        with self.assertNumQueries(0):
+            titles = self.titles()
+        self.assertEqual(titles, ["Idle", "Stream 2", "Stream 1", "Stream 0"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.streams[2].delete()
+        self.assertNotIn("Stream 2", self.titles())
+
+    def test_ranked_by_viewers(self):
+        viewer_counts.set(self.streams[1].pk, {"viewers": 30})
+        viewer_counts.set(self.streams[2].pk, {"viewers": 10})
+        results = self.client.get(self.url, {"order": "viewers"}).json()["results"]
+        self.assertEqual(
+            [(entry["title"], entry["viewers"]) for entry in results[:3]],
+            [("Stream 1", 30), ("Stream 2", 10), ("Stream 0", 0)],
+        )
+
+        viewer_counts.set(self.streams[0].pk, {"viewers": 50})
+        live_now.set_viewers({self.streams[0].pk: 50})
+        self.assertEqual(self.titles(order="viewers")[0], "Stream 0")
+
+    @mock.patch("live.feed.CHUNK_SIZE", 2)
+    def test_pages_read_their_chunks_only(self):
+        self.titles()
+        first = cache.get(ORDER_KEY.format("recent"))["chunks"][0][2]
+        cache.delete(CHUNK_KEY.format("recent", first))
+
+        with self.assertNumQueries(0):
+            titles = self.titles(page_size=2, page=2)
+        self.assertEqual(titles, ["Stream 1", "Stream 0"])
+
+        # The evicted chunk rebuilds the orderings
+        self.assertEqual(self.titles(page_size=1), ["Stream 3"])
+
+    @mock.patch("live.feed.CHUNK_SIZE", 2)
+    def test_edits_keep_chunked_order(self):
+        self.titles()
+        with self.captureOnCommitCallbacks(execute=True):
+            streams = [
+                Stream.objects.create(
+                    title=f"New {i}", stream_id=f"new-{i}", status=StreamStatus.ACTIVE
+                )
+                for i in range(5)
+            ]
+        streams[1].status = StreamStatus.IDLE
+        with self.captureOnCommitCallbacks(execute=True):
+            streams[1].save()
+            self.streams[0].delete()
+
+        expected = list(
+            Stream.objects.filter(status=StreamStatus.ACTIVE)
+            .order_by("-created_at", "-id")
+            .values_list("title", flat=True)
+        )
+        with self.assertNumQueries(0):
+            titles = self.titles(page_size=3) + self.titles(page_size=3, page=2)
+        self.assertEqual(titles + self.titles(page_size=3, page=3), expected)
+
+        counts = [row[1] for row in cache.get(ORDER_KEY.format("recent"))["chunks"]]
+        self.assertEqual(sum(counts), len(expected))
+        self.assertLessEqual(max(counts), 4)
+
+    def test_concurrent_rebuilds_coalesce(self):
+        def other_rebuild(seconds):
+            # Another process finishes its rebuild while this one waits
+            cache.delete(REBUILD_KEY)
+            live_now.rebuild()
+
+        cache.add(REBUILD_KEY, 1)
+        with mock.patch("live.feed.time.sleep", side_effect=other_rebuild):
+            # Only the other process queries the database
+            with self.assertNumQueries(1):
+                titles = self.titles()
+        self.assertEqual(titles, ["Stream 3", "Stream 2", "Stream 1", "Stream 0"])
+
+
+class ReadView(View):
+    replica_reads = True
+
+    def get(self, request):
+        return HttpResponse(ReplicaRouter().db_for_read(Stream))
+
+    def post(self, request):
+        return HttpResponse(ReplicaRouter().db_for_read(Stream))
+
+
+class WriteThenReadView(ReadView):
+    def get(self, request):
+        ReplicaRouter().db_for_write(Stream)
+        return HttpResponse(ReplicaRouter().db_for_read(Stream))
+
+
+class StreamingReadView(View):
+    replica_reads = True
+
+    async def get(self, request):
+        async def body():
+            # Sent after the middleware returned
+            yield ReplicaRouter().db_for_read(Stream)
+
+        database = ReplicaRouter().db_for_read(Stream)
+        return StreamingHttpResponse(body(), headers={"X-DB": database})
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.stream = create_streams(1)[0]
+        Simulcast.objects.create(
+            stream=self.stream, simulcast_id="sim-0", stream_key="key-0", url="x"
+        )
+
+    def request(self, view_class, method="get", **cookies):
+        view = view_class.as_view()
+        request = getattr(self.factory, method)("/")
+        request.COOKIES.update(cookies)
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        return middleware(request)
+
+    def test_read_only_views_use_replicas(self):
+        self.assertEqual(self.request(ReadView).content, b"replica")
+        self.assertEqual(ReplicaRouter().db_for_read(Stream), "default")
+
+        class PrimaryView(ReadView):
+            replica_reads = False
+
+        self.assertEqual(self.request(PrimaryView).content, b"default")
+
+    def test_reads_follow_writes(self):
+        self.assertEqual(self.request(WriteThenReadView).content, b"default")
+
+        response = self.request(ReadView, "post")
+        self.assertEqual(response.content, b"default")
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        response = self.request(ReadView, **{PRIMARY_COOKIE: "1"})
+        self.assertEqual(response.content, b"default")
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    async def async_request(self, view_class, method="get"):
+        view = view_class.as_view()
+
+        async def get_response(request):
+            await middleware.process_view(request, view, (), {})
+            if view_class.view_is_async:
+                return await view(request)
+            return await sync_to_async(view)(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        return await middleware(getattr(self.factory, method)("/"))
+
+    async def test_async_requests(self):
+        response = await self.async_request(ReadView)
+        self.assertEqual(response.content, b"replica")
+        self.assertEqual(ReplicaRouter().db_for_read(Stream), "default")
+
+        response = await self.async_request(ReadView, "post")
+        self.assertEqual(response.content, b"default")
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+    async def test_asgi_view_reads_replica(self):
+        url = reverse("view-simulcast", args=[self.stream.pk, "sim-0"])
+        with mock.patch("live.db.random.choice", return_value="default") as choice:
+            response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(choice.called)
+        self.assertEqual(ReplicaRouter().db_for_read(Stream), "default")
+
+    async def test_streaming_body_reads_primary(self):
+        response = await self.async_request(StreamingReadView)
+        self.assertEqual(response["X-DB"], "replica")
+        self.assertEqual([chunk async for chunk in response], [b"default"])
+
+    def test_view_reads_replica(self):
+        url = reverse("view-simulcast", args=[self.stream.pk, "sim-0"])
+        with mock.patch("live.db.random.choice", return_value="default") as choice:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(choice.called)
+
+            choice.reset_mock()
+            client = APIClient()
+            client.cookies[PRIMARY_COOKIE] = "1"
+            client.get(url)
+            self.assertFalse(choice.called)
+
+    def test_etag_lists_read_primary(self):
+        # Their ETags come from the shared versions, not from the rows read
+        with mock.patch("live.db.random.choice", return_value="default") as choice:
+            for url in (
+                reverse("list-stream"),
+                reverse("list-simulcast", args=[self.stream.stream_id]),
+            ):
+                with self.subTest(url=url):
+                    self.assertEqual(APIClient().get(url).status_code, 200)
+                    self.assertFalse(choice.called)
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+
+@override_settings(MUX_WEBHOOK_SECRET="secret")
+@mock.patch.object(status_updates, "_start")
+class WebhookTest(TestCase):
+    url = reverse("mux-webhook")
+
+    def setUp(self):
+        self.streams = create_streams(2)
+
+    def post(self, event, secret="secret"):
+        body = json.dumps(event).encode()
+        timestamp = str(int(time.time()))
+        signature = hmac.new(
+            secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256
+        ).hexdigest()
+        return self.client.post(
+            self.url,
+            body,
+            content_type="application/json",
+            HTTP_MUX_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def test_rejects_bad_signature(self, start):
+        response = self.post(status_event("evt-1", "stream-0"), secret="wrong")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_rejects_invalid_payload(self, start):
+        for event in [[], "event", {"type": "video.live_stream.active"}, {"id": 1}]:
+            with self.subTest(event=event):
+                self.assertEqual(self.post(event).status_code, 400)
+
+    def test_duplicate_event_is_stored_once(self, start):
+        event = status_event("evt-1", "stream-0")
+        self.assertEqual(self.post(event).status_code, 202)
+        self.assertEqual(self.post(event).status_code, 202)
+        # Stored before the answer, applied later
+        self.assertEqual(WebhookEvent.objects.filter(applied_at=None).count(), 1)
+        self.assertEqual(self.streams[0].status, StreamStatus.IDLE)
+
+        self.assertEqual(status_updates.flush(), 1)
+        self.streams[0].refresh_from_db()
+        self.assertEqual(self.streams[0].status, StreamStatus.ACTIVE)
+        self.post(event)
+        self.assertEqual(status_updates.flush(), 0)
+
+    def test_batched_apply_keeps_newest_event(self, start):
+        started = timezone.now()
+        events = [
+            status_event("evt-1", "stream-0", "active", started),
+            status_event("evt-2", "stream-0", "idle", started + timedelta(seconds=2)),
+            status_event("evt-3", "stream-1", "active", started),
+            status_event("evt-4", "stream-0", "active", started + timedelta(seconds=1)),
+        ]
+        for event in events:
+            status_updates.record(event)
+        self.assertEqual(status_updates.flush(), 1)
+        statuses = dict(Stream.objects.values_list("stream_id", "status"))
+        self.assertEqual(statuses, {"stream-0": "idle", "stream-1": "active"})
+
+        # Delivered late, older than what was applied
+        late = status_event("evt-5", "stream-0", "active", started)
+        status_updates.record(late)
+        self.assertEqual(status_updates.flush(), 0)
+        self.assertFalse(WebhookEvent.objects.filter(applied_at=None).exists())
+
+
+class MetricsTest(TestCase):
+    def test_endpoint_needs_token(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", response.text)
+
+    route = "live/list/"
+
+    def db_totals(self):
+        """Requests, queries and database seconds recorded for ``route``."""
+        key = (("route", self.route),)
+        queries = request_db_queries._values.get(key, [0, 0])
+        duration = request_db_duration._values.get(key, [0, 0])
+        return sum(queries[:-1]), queries[-1], duration[-1]
+
+    def setUp(self):
+        cache.clear()
+        create_streams(2)
+
+    def assertRecorded(self, before, queries):
+        requests, total, duration = self.db_totals()
+        self.assertEqual(requests - before[0], 1)
+        self.assertEqual(total - before[1], queries)
+        self.assertGreater(duration - before[2], 0)
+
+    def test_queries_recorded_under_wsgi(self):
+        before = self.db_totals()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse("list-stream")).status_code, 200)
+        self.assertGreater(len(queries), 0)
+        self.assertRecorded(before, len(queries))
+
+    async def test_queries_recorded_under_asgi(self):
+        before = self.db_totals()
+        # The sync view runs its queries in a sync_to_async thread
+        response = await self.async_client.get(reverse("list-stream"))
+        self.assertEqual(response.status_code, 200)
+        self.assertRecorded(before, 1)
+
+    def test_middleware_runs_async(self):
+        async def get_response(request):
+            return HttpResponse(status=204)
+
+        # Async views and the event streams are not bounced through a thread
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().post("/async"))
+        self.assertEqual(response.status_code, 204)
+        self.assertIn('method="POST",route="unmatched",status="204"', registry.render())
+
+
+class SharedCacheTest(TestCase):
+    def test_polling_needs_shared_cache(self):
+        with override_settings(MUX_VIEWER_COUNTS_POLLING=True):
+            self.assertEqual(
+                [error.id for error in shared_cache_check(None)], ["live.E001"]
+            )
+        with self.assertRaises(CommandError):
+            call_command("poll_viewer_counts", once=True)
+        with override_settings(MUX_ASYNC_JOBS=True):
+            self.assertEqual(
+                [error.id for error in shared_cache_check(None)], ["live.E002"]
+            )
+        for command in ("run_mux_jobs", "reconcile_mux"):
+            with self.subTest(command=command), self.assertRaises(CommandError):
+                call_command(command)
+
+        with tempfile.TemporaryDirectory() as location:
+            shared = {
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                }
+            }
+            with override_settings(
+                CACHES=shared, MUX_VIEWER_COUNTS_POLLING=True, MUX_ASYNC_JOBS=True
+            ):
+                self.assertEqual(shared_cache_check(None), [])
+                self.assertEqual(shared_cache_deploy_check(None), [])
+        self.assertEqual(
+            [warning.id for warning in shared_cache_deploy_check(None)], ["live.W001"]
+        )
+
+
+class QueryPlanTest(TestCase):
+    """Every lookup a view makes must be served by an index."""
+
+    lookup_views = [
+        (views.RetrieveStream, {"pk": "stream-0"}),
+        (views.DeleteStream, {"stream_id": "stream-0"}),
+        (views.UpdateStream, {"stream_id": "stream-0"}),
+        (views.ResetStreamKey, {"stream_id": "stream-0"}),
+        (views.FinishStream, {"stream_id": "stream-0"}),
+        (views.DisableStream, {"stream_id": "stream-0"}),
+        (views.EnableStream, {"stream_id": "stream-0"}),
+        (views.RemoveStreamSimulcast, {"simulcast_id": "simulcast-0"}),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        create_streams(5)
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Tiny test tables would otherwise always be read sequentially
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            full_scans = [
+                line for line in plan.splitlines() if re.search(r"SCAN \w+$", line)
+            ]
+        else:
+            full_scans = [line for line in plan.splitlines() if "Seq Scan" in line]
+        self.assertEqual(full_scans, [], f"Full table scan in:\n{plan}")
+
+    def get_view(self, view_class, kwargs):
+        request = APIRequestFactory().get("/")
+        view = view_class(kwargs=kwargs, format_kwarg=None)
+        view.request = view.initialize_request(request)
+        return view
+
+    def test_lookup_views(self):
+        for view_class, kwargs in self.lookup_views:
+            view = self.get_view(view_class, kwargs)
+            lookup = kwargs[view.lookup_url_kwarg or view.lookup_field]
+            queryset = view.get_queryset().filter(**{view.lookup_field: lookup})
+            with self.subTest(view=view_class.__name__):
+                self.assertNoFullScan(queryset)
+
+    def test_list_stream(self):
+        queryset = self.get_view(views.ListStream, {}).get_queryset()
+        ordering = StreamCursorPagination.ordering
+        latest = Stream.objects.latest("created_at").created_at
+        self.assertNoFullScan(queryset.order_by(*ordering)[:50])
+        self.assertNoFullScan(
+            queryset.filter(created_at__lt=latest).order_by(*ordering)[:50]
+        )
+
+    def test_simulcast_views(self):
+        view = self.get_view(views.ListStreamSimulcasts, {"stream_id": "stream-0"})
+        self.assertNoFullScan(view.get_queryset().order_by("-id")[:50])
+
+        view = self.get_view(
+            views.RetrieveStreamSimulcast,
+            {"stream_id": "1", "simulcast_id": "simulcast-0"},
+        )
+        self.assertNoFullScan(view.get_queryset())
+
+    def test_status_lookups(self):
+        self.assertNoFullScan(Stream.objects.filter(status=StreamStatus.ACTIVE))
+        self.assertNoFullScan(Stream.objects.select_related("status_jwt").filter(pk=1))
+        self.assertNoFullScan(
+            Stream.objects.filter(stream_id__in=["stream-0", "stream-1"])
+        )
+        self.assertNoFullScan(Stream.objects.filter(updated_at__gte=timezone.now()))
+
+    def test_webhook_events(self):
+        pending = WebhookEvent.objects.filter(applied_at=None).order_by("received_at")
+        self.assertNoFullScan(pending[:500])
+        self.assertNoFullScan(
+            WebhookEvent.objects.filter(
+                applied_at__isnull=False, live_stream_id__in=["stream-0"]
+            )
+            .values("live_stream_id")
+            .annotate(last=Max("occurred_at"))
+        )
+        self.assertNoFullScan(
+            WebhookEvent.objects.filter(applied_at__lt=timezone.now())
+        )
+
+    def test_watch_views(self):
+        self.assertNoFullScan(WatchStream.queryset.filter(pk=1))
+        self.assertNoFullScan(
+            ListStreams.queryset.order_by(*StreamCursorPagination.ordering)[:50]
+        )
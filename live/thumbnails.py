@@ -0,0 +1,127 @@
+"""
+Pre-sized WebP and JPEG renditions of uploaded stream thumbnails.
+
+Resizing and encoding are CPU bound, so they run in a process pool instead of
+the request threads. Renditions are stored next to the original under
+``THUMBNAILS_UPLOAD_PATH`` and recorded on ``StreamThumbnail.renditions``, from
+which ``Stream.thumbnail_url`` builds its ``srcset`` strings.
+"""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .cache import stream_versions
+from .models import StreamThumbnail
+
+# Pillow format and file extension of each rendition format
+FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+# Stream cards are 16:9
+ASPECT_RATIO = 9 / 16
+
+
+def rendition_name(name, width, format) -> str:
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}_{width}w.{FORMATS[format][1]}"))
+
+
+def rendition_names(renditions: dict) -> list:
+    return [name for sizes in renditions.values() for _, name in sizes]
+
+
+def render_renditions(name, widths, quality) -> dict:
+    """
+    Write the renditions of the image stored as ``name``. Runs in a pool
+    process and returns ``{format: [[width, name], ...]}``.
+    """
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file)).convert("RGB")
+
+    # Never upscale, but always keep the smallest size
+    widths = sorted(widths)
+    widths = [width for width in widths if width <= image.width] or widths[:1]
+
+    renditions = {format: [] for format in FORMATS}
+    for width in widths:
+        size = (width, round(width * ASPECT_RATIO))
+        resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        for format, (pillow_format, _) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pillow_format, quality=quality, optimize=True)
+            path = rendition_name(name, width, format)
+            default_storage.delete(path)
+            path = default_storage.save(path, ContentFile(buffer.getvalue()))
+            renditions[format].append([width, path])
+    return renditions
+
+
+class ThumbnailRenderer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Spawned workers need the app registry for the storage
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=settings.THUMBNAIL_WORKERS,
+                        initializer=django.setup,
+                    )
+        return self._executor
+
+    def submit(self, name):
+        return self.executor.submit(
+            render_renditions,
+            name,
+            settings.THUMBNAIL_RENDITION_WIDTHS,
+            settings.THUMBNAIL_QUALITY,
+        )
+
+    def render(self, thumbnail: StreamThumbnail):
+        future = self.submit(thumbnail.thumbnail.name)
+        thumbnail.renditions = future.result(timeout=settings.THUMBNAIL_RENDER_TIMEOUT)
+        thumbnail.save(update_fields=["renditions"])
+
+    def render_many(self, thumbnails: list) -> list:
+        """
+        Render a batch in parallel and save the ones that succeeded with a
+        single query. Returns ``(thumbnail, exception)`` pairs for the others.
+        """
+        futures = [
+            (thumbnail, self.submit(thumbnail.thumbnail.name))
+            for thumbnail in thumbnails
+        ]
+        rendered, failed = [], []
+        for thumbnail, future in futures:
+            try:
+                thumbnail.renditions = future.result(
+                    timeout=settings.THUMBNAIL_RENDER_TIMEOUT
+                )
+                rendered.append(thumbnail)
+            except Exception as exc:
+                failed.append((thumbnail, exc))
+
+        StreamThumbnail.objects.bulk_update(rendered, ["renditions"])
+        # bulk_update skips post_save, so retire the cached cards here
+        for thumbnail in rendered:
+            stream_versions.bump(thumbnail.stream_id)
+        return failed
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+thumbnails = ThumbnailRenderer()
@@ -0,0 +1,193 @@
+import base64
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from jose import jwk, jwt
+
+from .models import Stream, StreamStatusJWT
+
+STATUS_TOKEN_KEY = "live:status-token:{}"
+ALGORITHM = "RS256"
+
+
+@dataclass(frozen=True)
+class StatusToken:
+    stream_id: int
+    status: str
+    token: str
+    expires_at: datetime
+
+    @property
+    def remaining(self) -> timedelta:
+        return self.expires_at - timezone.now()
+
+
+class StatusTokenProvider:
+    """
+    Hands out the viewer-count JWT of a stream without touching the database.
+
+    Tokens are kept in process for ``MUX_STATUS_TOKEN_LOCAL_TTL`` seconds (the
+    ``MUX_STATUS_TOKEN_LOCAL_MAX_ENTRIES`` most recently used ones) and in the
+    shared cache until they expire; ``StreamStatusJWT`` is only read on a
+    cold cache. Tokens closer than ``MUX_STATUS_TOKEN_REFRESH_BEFORE`` seconds to
+    ``expires_at`` are re-issued in the background while the current one is
+    still served.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: OrderedDict[int, tuple[StatusToken, float]] = OrderedDict()
+        self._refreshing: set[int] = set()
+        self._signing_key = None
+        self._executor = None
+
+    @property
+    def signing_key(self):
+        if self._signing_key is None:
+            # TODO: Get keys from Database Settings App
+            private_key = base64.b64decode(settings.MUX_PRIVATE_KEY).decode("utf-8")
+            self._signing_key = jwk.construct(private_key, ALGORITHM)
+        return self._signing_key
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="status-tokens"
+                    )
+        return self._executor
+
+    def get(self, stream_id) -> Optional[StatusToken]:
+        stream_id = int(stream_id)
+        status_token = self._get_local(stream_id)
+
+        if status_token is None:
+            status_token = cache.get(STATUS_TOKEN_KEY.format(stream_id))
+            if status_token is None or status_token.remaining <= timedelta(0):
+                status_token = self.load(stream_id)
+                if status_token is None:
+                    return None
+            self._set_local(status_token)
+
+        refresh_before = timedelta(seconds=settings.MUX_STATUS_TOKEN_REFRESH_BEFORE)
+        if status_token.remaining < refresh_before:
+            self._schedule_refresh(stream_id)
+
+        return status_token
+
+    def load(self, stream_id) -> Optional[StatusToken]:
+        stream = (
+            Stream.objects.select_related("status_jwt").filter(pk=stream_id).first()
+        )
+        if stream is None:
+            return None
+
+        try:
+            instance: StreamStatusJWT = stream.status_jwt
+        except StreamStatusJWT.DoesNotExist:
+            return self.issue(stream)
+
+        if instance.expires_at <= timezone.now():
+            return self.issue(stream)
+
+        status_token = StatusToken(
+            stream_id=stream.pk,
+            status=stream.status,
+            token=instance.token,
+            expires_at=instance.expires_at,
+        )
+        self.store(status_token)
+        return status_token
+
+    def issue(self, stream: Stream) -> StatusToken:
+        expires_at = timezone.now() + timedelta(
+            seconds=settings.MUX_STATUS_TOKEN_LIFETIME
+        )
+        token = self.generate_jwt(stream.stream_id, expires_at)
+        StreamStatusJWT.objects.update_or_create(
+            stream=stream, defaults={"token": token, "expires_at": expires_at}
+        )
+
+        status_token = StatusToken(
+            stream_id=stream.pk,
+            status=stream.status,
+            token=token,
+            expires_at=expires_at,
+        )
+        self.store(status_token)
+        return status_token
+
+    def generate_jwt(self, live_stream_id, expires_at) -> str:
+        token = {
+            "sub": live_stream_id,
+            "exp": expires_at,
+            "aud": "live_stream_id",
+        }
+        headers = {"kid": settings.MUX_SIGNING_KEY}
+        return jwt.encode(token, self.signing_key, algorithm=ALGORITHM, headers=headers)
+
+    def store(self, status_token: StatusToken):
+        timeout = status_token.remaining.total_seconds()
+        if timeout > 0:
+            cache.set(
+                STATUS_TOKEN_KEY.format(status_token.stream_id), status_token, timeout
+            )
+        self._set_local(status_token)
+
+    def invalidate(self, stream_id):
+        cache.delete(STATUS_TOKEN_KEY.format(stream_id))
+        with self._lock:
+            self._tokens.pop(stream_id, None)
+
+    def _get_local(self, stream_id) -> Optional[StatusToken]:
+        with self._lock:
+            entry = self._tokens.get(stream_id)
+            if entry is None:
+                return None
+            status_token, loaded_at = entry
+            if (
+                time.monotonic() - loaded_at > settings.MUX_STATUS_TOKEN_LOCAL_TTL
+                or status_token.remaining <= timedelta(0)
+            ):
+                del self._tokens[stream_id]
+                return None
+            self._tokens.move_to_end(stream_id)
+            return status_token
+
+    def _set_local(self, status_token: StatusToken):
+        with self._lock:
+            self._tokens[status_token.stream_id] = (status_token, time.monotonic())
+            self._tokens.move_to_end(status_token.stream_id)
+            while len(self._tokens) > settings.MUX_STATUS_TOKEN_LOCAL_MAX_ENTRIES:
+                self._tokens.popitem(last=False)
+
+    def _schedule_refresh(self, stream_id):
+        with self._lock:
+            if stream_id in self._refreshing:
+                return
+            self._refreshing.add(stream_id)
+        self.executor.submit(self._refresh, stream_id)
+
+    def _refresh(self, stream_id):
+        try:
+            stream = Stream.objects.filter(pk=stream_id).first()
+            if stream is not None:
+                self.issue(stream)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._refreshing.discard(stream_id)
+
+
+status_tokens = StatusTokenProvider()
@@ -1,22 +1,32 @@
 from django.urls import path
 from .views import (
+    BulkCreateSimulcasts,
+    BulkCreateStreams,
+    BulkRemoveSimulcasts,
     CreateStream,
     FinishStream,
+    ListLiveNow,
     ListStream,
     ListStreamSimulcasts,
     RemoveStreamSimulcast,
     ResetStreamKey,
+    StreamEvents,
     StreamStatusView,
     UpdateStream,
     RetrieveStream,
     DeleteStream,
     CreateStreamSimulcast,
+    RetrieveMuxJob,
     RetrieveStreamSimulcast,
+    UpdateStreamStatus,
+    UploadStreamThumbnail,
 )
 
 urlpatterns = [
     path("list/", ListStream.as_view(), name="list-stream"),
+    path("now/", ListLiveNow.as_view(), name="live-now"),
     path("create/", CreateStream.as_view(), name="create-stream"),
+    path("bulk/create/", BulkCreateStreams.as_view(), name="bulk-create-stream"),
     path("delete/<str:stream_id>", DeleteStream.as_view(), name="delete-stream"),
     path("finish/<str:stream_id>", FinishStream.as_view(), name="delete-stream"),
     path(
@@ -25,13 +35,24 @@ urlpatterns = [
         name="reset-stream-key",
     ),
     path("edit/<str:stream_id>", UpdateStream.as_view(), name="update-stream"),
-    path("status/<int:stream_id>", StreamStatusView.as_view(), name="view-status"),
     path(
-        "simulcast/<str:stream_id>/<str:simulcast_id>",
-        RetrieveStreamSimulcast.as_view(),
-        name="view-simulcast",
+        "thumbnail/<str:stream_id>",
+        UploadStreamThumbnail.as_view(),
+        name="upload-thumbnail",
     ),
+    path("status/<int:stream_id>", StreamStatusView.as_view(), name="view-status"),
+    path("events/<int:stream_id>", StreamEvents.as_view(), name="stream-events"),
     path("simulcast/create", CreateStreamSimulcast.as_view(), name="create-simulcast"),
+    path(
+        "simulcast/bulk/create",
+        BulkCreateSimulcasts.as_view(),
+        name="bulk-create-simulcast",
+    ),
+    path(
+        "simulcast/bulk/delete",
+        BulkRemoveSimulcasts.as_view(),
+        name="bulk-delete-simulcast",
+    ),
     path(
         "simulcast/list/<str:stream_id>",
         ListStreamSimulcasts.as_view(),
@@ -42,5 +63,12 @@ urlpatterns = [
         RemoveStreamSimulcast.as_view(),
         name="delete-simulcast",
     ),
+    path(
+        "simulcast/<str:stream_id>/<str:simulcast_id>",
+        RetrieveStreamSimulcast.as_view(),
+        name="view-simulcast",
+    ),
+    path("jobs/<int:pk>", RetrieveMuxJob.as_view(), name="view-job"),
+    path("webhooks/mux", UpdateStreamStatus.as_view(), name="mux-webhook"),
     path("<str:pk>/", RetrieveStream.as_view(), name="view-stream"),
 ]
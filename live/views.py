@@ -1,32 +1,64 @@
-import base64
+import hashlib
+import json
+import logging
 import mux_python
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
-from datetime import timedelta
-from django.views.generic import CreateView, DetailView
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.generic import CreateView, DetailView, View
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import gettext_lazy as _
 
-from jose import jwt
 from mux_python.exceptions import NotFoundException
 
+from .cache import stream_cache, stream_versions
+from .events import HEARTBEAT, stream_events
+from .exceptions import MuxUnavailable
+from .feed import LiveNowFeed
+from .filters import StreamSearchFilter
 from .models import *
+from .mux import mux
+from .pagination import (
+    LiveNowPagination,
+    SimulcastCursorPagination,
+    StreamCursorPagination,
+    StreamSearchPagination,
+)
 from .permissions import *
+from .stats import viewer_counts
+from .tokens import StatusToken, status_tokens
+from .webhooks import status_updates, verify_signature
 from .serializers import (
+    LiveNowSerializer,
+    MuxJobSerializer,
+    SimulcastTargetSerializer,
+    compile_representation,
     SimpleStreamSerializer,
     SimulcastSerializer,
     StreamSerializer,
+    StreamThumbnailSerializer,
     ViewsCounterSerializer,
 )
+from .thumbnails import rendition_names, thumbnails
 
 from rest_framework import status
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
-from rest_framework.exceptions import APIException
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.exceptions import (
+    APIException,
+    NotFound,
+    ParseError,
+    PermissionDenied,
+)
+from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
 from rest_framework.generics import (
     GenericAPIView,
     RetrieveAPIView,
@@ -36,21 +68,172 @@ from rest_framework.generics import (
     UpdateAPIView,
 )
 
-# TODO: Get mux settings from Database Settings App
-configuration = mux_python.Configuration()
-configuration.username = settings.MUX_TOKEN_ID
-configuration.password = settings.MUX_TOKEN_SECRET
+logger = logging.getLogger(__name__)
+
+# Stream fields only ever set from a Mux response
+MUX_FIELDS = ("stream_id", "playback_id", "stream_key")
 
 
 def epoch_to_datetime(epoch):
     return time.strftime("%Y-%m-%d %H:%M:%S", epoch)
 
 
-class CreateStream(CreateAPIView):
+class MuxJobMixin:
+    """Queues the Mux operation of a view as a `MuxJob` when MUX_ASYNC_JOBS is on."""
+
+    def enqueue_job(self, operation, stream, **payload):
+        job = MuxJob.objects.create(operation=operation, stream=stream, payload=payload)
+        return Response(MuxJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ConditionalGetMixin:
+    """
+    Answers ``If-None-Match``/``If-Modified-Since`` with 304 before serializing.
+
+    ``get_version`` returns a cheap validator and the ``Last-Modified`` time of
+    the response, or ``None`` when there is no such time. The ETag hashes the
+    validator with the URL, renderer and serializer, so it is strong for the
+    exact representation sent.
+    """
+
+    def get_version(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        version, last_modified = self.get_version()
+        representation = ":".join(
+            [
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                self.get_serializer_class().__name__,
+                version,
+            ]
+        )
+        etag = quote_etag(hashlib.md5(representation.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response.headers["ETag"] = etag
+        if timestamp is not None:
+            response.headers["Last-Modified"] = http_date(timestamp)
+        return response
+
+
+class FastReadMixin:
+    """
+    Builds JSON list and retrieve responses from ``.values()`` rows through
+    ``CompiledRepresentation`` instead of the serializer fields. The output is
+    the same; other renderers, like the browsable API, use the serializer.
+    """
+
+    def use_fast_path(self) -> bool:
+        return isinstance(self.request.accepted_renderer, JSONRenderer)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+
+        representation = compile_representation(self.get_serializer_class())
+        columns = list(representation.columns)
+        ordering = getattr(self.paginator, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        # The paginator reads its cursor position from the ordering columns
+        columns += [field.lstrip("-") for field in ordering]
+
+        rows = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(rows)
+        data = representation.represent(rows if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().retrieve(request, *args, **kwargs)
+
+        representation = compile_representation(self.get_serializer_class())
+        instance = self.get_object()
+        return Response(representation.to_representation(representation.row(instance)))
+
+
+class BulkMuxMixin:
+    """
+    Plumbing of the bulk endpoints: a JSON list of at most MUX_BULK_MAX items
+    in, one result per item out, Mux calls on MUX_BULK_CONCURRENCY threads.
+    Answers ``succeeded_status_code`` when every item succeeded, 207 otherwise.
+    """
+
+    succeeded_status_code = status.HTTP_200_OK
+
+    def get_items(self, request) -> list:
+        items = request.data
+        if not isinstance(items, list):
+            raise ParseError(_("Expected a list."))
+        if len(items) > settings.MUX_BULK_MAX:
+            raise ValidationError(
+                _("At most %(max)d items are accepted at once.")
+                % {"max": settings.MUX_BULK_MAX}
+            )
+        return items
+
+    def fan_out(self, call, items: dict) -> dict:
+        """Run ``call`` on every value, keeping the result or exception per key."""
+        with ThreadPoolExecutor(
+            max_workers=settings.MUX_BULK_CONCURRENCY, thread_name_prefix="mux-bulk"
+        ) as executor:
+            futures = {key: executor.submit(call, item) for key, item in items.items()}
+        outcomes = {}
+        for key, future in futures.items():
+            try:
+                outcomes[key] = future.result()
+            except Exception as exc:
+                outcomes[key] = exc
+        return outcomes
+
+    def failure(self, exc, operation) -> dict:
+        detail = getattr(exc, "detail", None)
+        if detail is None:
+            logger.warning("Bulk %s failed: %r", operation, exc)
+            detail = [_("Error while performing operation: %s") % operation]
+        return {"status": "failed", "errors": detail}
+
+    def queued(self, objects: dict, jobs, results):
+        for index, job in zip(objects, MuxJobSerializer(jobs, many=True).data):
+            results[index] = {"status": "queued", "job": job}
+
+    def bulk_response(self, results):
+        for index, result in enumerate(results):
+            result["index"] = index
+        failed = any(
+            result["status"] in ("invalid", "failed", "not_found") for result in results
+        )
+        return Response(
+            {"results": results},
+            status=(
+                status.HTTP_207_MULTI_STATUS if failed else self.succeeded_status_code
+            ),
+        )
+
+
+class CreateStream(MuxJobMixin, CreateAPIView):
     model = Stream
     serializer_class = StreamSerializer
     queryset = Stream.objects
 
+    def create(self, request, *args, **kwargs):
+        if not settings.MUX_ASYNC_JOBS:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            # The create job fills the Mux identifiers, never the client
+            stream = serializer.save(**dict.fromkeys(MUX_FIELDS))
+            return self.enqueue_job(MuxOperation.CREATE_STREAM, stream)
+
     def perform_create(self, serializer):
         initial_data = serializer.validated_data
 
@@ -78,7 +261,7 @@ class CreateStream(CreateAPIView):
         latency_mode=StreamLatencyMode.STANDARD,
         test_mode=False,
     ):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
 
         if visibility not in PlaybackPolicy.choices:
             visibility = PlaybackPolicy.PUBLIC
@@ -104,16 +287,144 @@ class CreateStream(CreateAPIView):
                 create_live_stream_request
             )
             return create_live_stream_response
-        except:
+        except mux_python.exceptions.ApiException:
             raise ValidationError(
                 _("Error while performing operation: create-mux_stream")
             )
 
 
-class ListStream(ListAPIView):
+class BulkCreateStreams(BulkMuxMixin, GenericAPIView):
+    """
+    Creates many streams from a JSON list in one call.
+
+    Mux streams are created concurrently and the local rows are written with
+    ``bulk_create``; if that write fails the Mux streams are deleted again.
+    """
+
     model = Stream
+    serializer_class = StreamSerializer
     queryset = Stream.objects
-    pagination_class = PageNumberPagination
+    succeeded_status_code = status.HTTP_201_CREATED
+
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        results = [None] * len(items)
+        valid = {}
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                results[index] = {"status": "invalid", "errors": serializer.errors}
+
+        if settings.MUX_ASYNC_JOBS:
+            self.enqueue_streams(valid, results)
+        else:
+            self.create_streams(valid, results)
+        return self.bulk_response(results)
+
+    def build_stream(self, data, mux_data=None) -> Stream:
+        # The Mux identifiers only ever come from Mux
+        stream = Stream(
+            **{name: value for name, value in data.items() if name not in MUX_FIELDS}
+        )
+        if mux_data is not None:
+            stream.stream_id = mux_data.data.id
+            stream.playback_id = mux_data.data.playback_ids[0].id
+            stream.stream_key = mux_data.data.stream_key
+        return stream
+
+    def save_streams(self, streams):
+        Stream.objects.bulk_create(streams)
+        # bulk_create skips the post_save receivers
+        for stream in streams:
+            stream_versions.bump(stream.pk)
+
+    def create_streams(self, valid, results):
+        def create(data):
+            return CreateStream().create_mux_stream(
+                data.get("visibility", PlaybackPolicy.PUBLIC),
+                data.get("latency_mode", StreamLatencyMode.STANDARD),
+                data.get("test_mode", True),
+            )
+
+        mux_streams = {}
+        for index, outcome in self.fan_out(create, valid).items():
+            if isinstance(outcome, Exception):
+                results[index] = self.failure(outcome, "create_mux_stream")
+            else:
+                mux_streams[index] = outcome
+
+        try:
+            created = {
+                index: self.build_stream(valid[index], mux_data)
+                for index, mux_data in mux_streams.items()
+            }
+            with transaction.atomic():
+                self.save_streams(list(created.values()))
+        except Exception:
+            self.fan_out(
+                self.delete_orphan,
+                {index: mux_data.data.id for index, mux_data in mux_streams.items()},
+            )
+            raise
+
+        data = self.get_serializer(list(created.values()), many=True).data
+        for index, stream_data in zip(created, data):
+            results[index] = {"status": "created", "stream": stream_data}
+
+    def delete_orphan(self, stream_id):
+        try:
+            DeleteStream().delete_mux_stream(stream_id)
+        except NotFoundException:
+            pass
+        except Exception:
+            logger.exception("Could not delete orphaned Mux stream %s", stream_id)
+
+    def enqueue_streams(self, valid, results):
+        # The job runner creates the Mux streams, nothing can be orphaned here
+        with transaction.atomic():
+            streams = {index: self.build_stream(data) for index, data in valid.items()}
+            self.save_streams(list(streams.values()))
+            jobs = MuxJob.objects.bulk_create(
+                [
+                    MuxJob(operation=MuxOperation.CREATE_STREAM, stream=stream)
+                    for stream in streams.values()
+                ]
+            )
+        self.queued(streams, jobs, results)
+
+
+class ListStream(ConditionalGetMixin, FastReadMixin, ListAPIView):
+    # No replica_reads: the ETag comes from the shared stream versions, and a
+    # lagging replica's rows would be tagged with it until the next write
+    model = Stream
+    queryset = Stream.objects
+    pagination_class = StreamCursorPagination
+    filter_backends = [StreamSearchFilter]
+
+    @property
+    def paginator(self):
+        # Search results are ranked, not in the created_at order of the cursors
+        if not hasattr(self, "_paginator"):
+            searching = StreamSearchFilter().is_searching(self.request)
+            self._paginator = (
+                StreamSearchPagination() if searching else self.pagination_class()
+            )
+        return self._paginator
+
+    def get_version(self):
+        # Bumped on every stream write, deletes included, so the list has no
+        # Last-Modified: the newest updated_at would not move on a delete
+        return stream_versions.get_list(), None
+
+    def get_queryset(self):
+        queryset = super().get_queryset().all()
+        serializer_class = self.get_serializer_class()
+        if serializer_class is SimpleStreamSerializer:
+            # created_at is read by the paginator to build the cursors
+            queryset = queryset.only(*serializer_class.Meta.fields, "created_at")
+        return queryset
 
     def get_serializer_class(self):
         return (
@@ -121,21 +432,44 @@ class ListStream(ListAPIView):
         )
 
 
-class DeleteStream(DestroyAPIView):
+class ListLiveNow(ListAPIView):
+    """
+    Streams live now, newest first or with ``?order=viewers`` most watched
+    first. Pages come from the cached index in ``live.feed``, not the table.
+    """
+
+    serializer_class = LiveNowSerializer
+    pagination_class = LiveNowPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        return LiveNowFeed(self.request.query_params.get("order", "recent"))
+
+
+class DeleteStream(MuxJobMixin, DestroyAPIView):
     model = Stream
     queryset = Stream.objects
     permission_classes = [StreamNotActive]
     lookup_field = "stream_id"
 
+    def destroy(self, request, *args, **kwargs):
+        if not settings.MUX_ASYNC_JOBS:
+            return super().destroy(request, *args, **kwargs)
+
+        instance: Stream = self.get_object()
+        return self.enqueue_job(
+            MuxOperation.DELETE_STREAM, instance, stream_id=instance.stream_id
+        )
+
     def perform_destroy(self, instance: Stream):
         try:
             self.delete_mux_stream(instance.stream_id)
-        except:
+        except mux_python.exceptions.ApiException:
             raise APIException("Error while performing operation: delete_mux_stream.")
         return super().perform_destroy(instance)
 
     def delete_mux_stream(self, stream_id):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         live_api.delete_live_stream(stream_id)
 
 
@@ -163,7 +497,7 @@ class UpdateStream(UpdateAPIView):
         return super().perform_update(serializer)
 
     def update_mux_stream(self, stream_id, update_data):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         stream_update_request = mux_python.UpdateLiveStreamRequest(
             latency_mode=update_data["latency_mode"], max_continuous_duration=None
         )
@@ -172,16 +506,71 @@ class UpdateStream(UpdateAPIView):
         )
 
 
+class UploadStreamThumbnail(UpdateAPIView):
+    """
+    Replaces the thumbnail of a stream and renders its WebP and JPEG
+    renditions in the thumbnail process pool before answering. The request
+    thread waits for the pool for up to ``THUMBNAIL_RENDER_TIMEOUT`` seconds,
+    after the stream row lock is released.
+    """
+
+    # The stream row lock serializes concurrent first uploads
+    queryset = Stream.objects.select_for_update(of=("self",))
+    serializer_class = StreamThumbnailSerializer
+    parser_classes = [MultiPartParser, FormParser]
+    http_method_names = ["put"]
+    lookup_field = "stream_id"
+
+    def get_object(self):
+        # Streams showing the default thumbnail have no row until the first upload
+        stream: Stream = super().get_object()
+        thumbnail, created = StreamThumbnail.objects.get_or_create(stream=stream)
+        return thumbnail
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            serializer = self.get_serializer(self.get_object(), data=request.data)
+            serializer.is_valid(raise_exception=True)
+            previous = serializer.instance
+            stale = rendition_names(previous.renditions)
+            if previous.thumbnail.name != DEFAULT_THUMBNAIL:
+                stale.append(previous.thumbnail.name)
+            thumbnail = serializer.save(renditions={})
+
+        try:
+            thumbnails.render(thumbnail)
+        except Exception:
+            # The original is served until `manage.py render_thumbnails` runs
+            logger.exception("Could not render thumbnail %s", thumbnail.thumbnail)
+
+        for name in stale:
+            thumbnail.thumbnail.storage.delete(name)
+        return Response(serializer.data)
+
+
 # TODO: Change the serializer used based on user permission level
-class RetrieveStream(RetrieveAPIView):
+class RetrieveStream(ConditionalGetMixin, FastReadMixin, RetrieveAPIView):
     model = Stream
+    replica_reads = True
     queryset = Stream.objects
     lookup_field = "stream_id"
     lookup_url_kwarg = "pk"
     serializer_class = SimpleStreamSerializer
 
+    def get_version(self):
+        # Served from the stream cache, so a 304 needs no query at all
+        stream = self.get_object()
+        return f"{stream.pk}:{stream.updated_at.isoformat()}", stream.updated_at
 
-class ResetStreamKey(UpdateAPIView):
+    def get_object(self):
+        stream = stream_cache.get(self.lookup_field, self.kwargs[self.lookup_url_kwarg])
+        if stream is None:
+            raise NotFound(_("Stream not found."))
+        self.check_object_permissions(self.request, stream)
+        return stream
+
+
+class ResetStreamKey(MuxJobMixin, UpdateAPIView):
     model = Stream
     queryset = Stream.objects
     serializer_class = StreamSerializer
@@ -189,6 +578,13 @@ class ResetStreamKey(UpdateAPIView):
     http_method_names = ["patch"]
     lookup_field = "stream_id"
 
+    def update(self, request, *args, **kwargs):
+        if not settings.MUX_ASYNC_JOBS:
+            return super().update(request, *args, **kwargs)
+
+        instance: Stream = self.get_object()
+        return self.enqueue_job(MuxOperation.RESET_STREAM_KEY, instance)
+
     def perform_update(self, serializer):
         update_data = serializer.validated_data
 
@@ -197,7 +593,7 @@ class ResetStreamKey(UpdateAPIView):
         try:
             new_stream_key = self.regenerate_mux_stream_key(instance.stream_id)
             update_data["stream_key"] = new_stream_key
-        except:
+        except mux_python.exceptions.ApiException:
             raise APIException(
                 "Error while performing operation: reset_mux_stream_key."
             )
@@ -205,27 +601,34 @@ class ResetStreamKey(UpdateAPIView):
         return super().perform_update(serializer)
 
     def regenerate_mux_stream_key(self, stream_id):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         key_update = live_api.reset_stream_key(live_stream_id=stream_id)
         return key_update.data.stream_key
 
 
-class FinishStream(DestroyAPIView):
+class FinishStream(MuxJobMixin, DestroyAPIView):
     model = Stream
     queryset = Stream.objects
     serializer_class = StreamSerializer
     lookup_field = "stream_id"
 
+    def destroy(self, request, *args, **kwargs):
+        if not settings.MUX_ASYNC_JOBS:
+            return super().destroy(request, *args, **kwargs)
+
+        instance: Stream = self.get_object()
+        return self.enqueue_job(MuxOperation.FINISH_STREAM, instance)
+
     def perform_destroy(self, instance: Stream):
         try:
             self.finish_mux_stream(instance.stream_id)
-        except:
+        except mux_python.exceptions.ApiException:
             raise APIException("Error while performing operation: finish_mux_stream.")
         instance.status = StreamStatus.IDLE
         instance.save()
 
     def finish_mux_stream(self, stream_id):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         live_api.signal_live_stream_complete(live_stream_id=stream_id)
 
 
@@ -241,13 +644,13 @@ class DisableStream(UpdateAPIView):
         instance: Stream = self.get_object()
         try:
             self.disable_mux_stream(instance.stream_id)
-        except:
+        except mux_python.exceptions.ApiException:
             raise APIException("Error while performing operation: disable_mux_stream.")
         instance.status = StreamStatus.DISABLED
         instance.save()
 
     def disable_mux_stream(self, stream_id):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         live_api.disable_live_stream(live_stream_id=stream_id)
 
 
@@ -263,14 +666,14 @@ class EnableStream(UpdateAPIView):
         instance: Stream = self.get_object()
         try:
             self.enable_mux_stream(instance.stream_id)
-        except:
+        except mux_python.exceptions.ApiException:
             raise APIException("Error while performing operation: enable_mux_stream.")
 
         instance.status = StreamStatus.IDLE
         instance.save()
 
     def enable_mux_stream(self, stream_id):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         live_api.enable_live_stream(live_stream_id=stream_id)
 
 
@@ -281,98 +684,82 @@ class StreamStatusView(RetrieveAPIView):
     lookup_field = "stream_id"
 
     def get_object(self):
-        queryset = self.filter_queryset(self.get_queryset())
-
-        # Perform the lookup filtering.
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
-
-        assert lookup_url_kwarg in self.kwargs, (
-            "Expected view %s to be called with a URL keyword argument "
-            'named "%s". Fix your URL conf, or set the `.lookup_field` '
-            "attribute on the view correctly."
-            % (self.__class__.__name__, lookup_url_kwarg)
-        )
-
-        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
-        obj = queryset.filter(**filter_kwargs)
-
-        # Making sure the stream exists
-        stream = Stream.objects.filter(id=filter_kwargs["stream_id"])
-        if not stream.exists():
-            raise APIException(_("Stream not found."), status.HTTP_404_NOT_FOUND)
-
-        stream_instance = stream.first()
-
-        # Create JWT if doesn't exist
-        if not obj.exists():
-            status_token = self.create_status_token(stream_instance)
-        else:
-            instance: StreamStatusJWT = obj.first()
-            expired = instance.expires_at < timezone.now()
-            status_token = instance
-
-            # If the JWT is expired, delete the old and create a new one.
-            if expired:
-                instance.delete()
-                status_token = self.create_status_token(stream_instance)
+        status_token = status_tokens.get(self.kwargs[lookup_url_kwarg])
+        if status_token is None:
+            raise NotFound(_("Stream not found."))
 
         # May raise a permission denied
-        self.check_object_permissions(self.request, status_token.stream)
-
-        return status_token
+        self.check_object_permissions(self.request, status_token)
 
-    def create_status_token(self, stream: Stream):
-        expiration_time = timezone.now() + timedelta(hours=5)
-        key = self.generate_jwt(stream_id=stream.id, expires_at=expiration_time)
-        status_token = StreamStatusJWT.objects.create(
-            token=key, stream=stream, expires_at=expiration_time
-        )
         return status_token
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer_class = self.get_serializer_class()
-        kwargs.setdefault("context", self.get_serializer_context())
+        instance: StatusToken = self.get_object()
+        counts = self.get_stream_status(instance)
+        serializer = self.get_serializer(counts)
+        return Response(serializer.data)
 
-        stream_id = instance.stream.id
+    def get_stream_status(self, status_token: StatusToken):
         try:
-            status = self.get_stream_status(stream_id)
-            serializer = serializer_class(instance)
+            return viewer_counts.get(status_token.stream_id, status_token.token)
+        except (requests.RequestException, TimeoutError):
+            raise MuxUnavailable()
 
-            return Response(serializer.data)
-        except NotFoundException:
-            raise APIException(_("Stream not found"), status.HTTP_404_NOT_FOUND)
-
-    def generate_jwt(self, stream_id, expires_at):
-        # TODO: Get keys from Database Settings App
-        signing_key_id = settings.MUX_SIGNING_KEY
-        private_key_base64 = settings.MUX_PRIVATE_KEY
-        private_key = base64.b64decode(private_key_base64).decode("utf-8")
-
-        token = {
-            "sub": stream_id,
-            "exp": expires_at,  # 5 hours
-            "aud": "live_stream_id",
-        }
-        headers = {"kid": signing_key_id}
 
-        json_web_token = jwt.encode(
-            token, private_key, algorithm="RS256", headers=headers
+class StreamEvents(View):
+    """
+    Server-sent events with the status and viewer counts of a stream.
+
+    Only served by the ASGI application: connections are held by the event
+    loop and share one upstream poll per stream. Under WSGI Django would
+    drain the endless stream before sending anything, so it answers 501.
+    """
+
+    async def get(self, request, stream_id):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": _("Stream events need the ASGI server.")},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        response = StreamingHttpResponse(
+            self.event_stream(stream_id), content_type="text/event-stream"
         )
-        return json_web_token
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
 
-    def get_stream_status(self, token):
-        r = requests.get(f"https://stats.mux.com/counts?token={token}")
-        return r.json()
+    async def event_stream(self, stream_id):
+        async for payload in stream_events.listen(stream_id):
+            if payload is HEARTBEAT:
+                yield b": keep-alive\n\n"
+            elif payload is None:
+                yield b"event: end\ndata: {}\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(payload)}\n\n".encode()
 
 
 # Simulcasts
-class CreateStreamSimulcast(CreateAPIView):
+class CreateStreamSimulcast(MuxJobMixin, CreateAPIView):
     models = Simulcast
     queryset = Simulcast.objects
     permission_classes = [StreamEnabled, StreamNotActive]
     serializer_class = SimulcastSerializer
 
+    def create(self, request, *args, **kwargs):
+        if not settings.MUX_ASYNC_JOBS:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        initial_data = serializer.validated_data
+        return self.enqueue_job(
+            MuxOperation.CREATE_SIMULCAST,
+            initial_data["stream"],
+            stream_key=initial_data["stream_key"],
+            url=initial_data["url"],
+        )
+
     def perform_create(self, serializer):
         initial_data = serializer.validated_data
 
@@ -388,7 +775,7 @@ class CreateStreamSimulcast(CreateAPIView):
     def create_mux_simulcast(
         self, stream_id, stream_key, url
     ) -> mux_python.SimulcastTarget:
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         request = mux_python.CreateSimulcastTargetRequest(
             stream_key=stream_key, url=url
         )
@@ -397,17 +784,218 @@ class CreateStreamSimulcast(CreateAPIView):
         )
 
 
-class ListStreamSimulcasts(ListAPIView):
+class BulkCreateSimulcasts(BulkMuxMixin, GenericAPIView):
+    """
+    Adds simulcast targets to one or more streams from a JSON list of
+    ``{stream, stream_key, url}``. Targets are created on Mux concurrently and
+    saved with one ``bulk_create``; if that write fails they are removed again.
+    """
+
+    models = Simulcast
+    queryset = Simulcast.objects
+    serializer_class = SimulcastTargetSerializer
+    succeeded_status_code = status.HTTP_201_CREATED
+
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        results = [None] * len(items)
+        valid = {}
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                results[index] = {"status": "invalid", "errors": serializer.errors}
+
+        targets = self.check_targets(valid, results)
+        if settings.MUX_ASYNC_JOBS:
+            self.enqueue_targets(targets, results)
+        else:
+            self.create_targets(targets, results)
+        return self.bulk_response(results)
+
+    def check_targets(self, valid, results) -> dict:
+        streams = Stream.objects.only("id", "stream_id", "status").in_bulk(
+            {data["stream"] for data in valid.values()}
+        )
+        taken = set(
+            Simulcast.objects.filter(
+                stream_key__in=[data["stream_key"] for data in valid.values()]
+            ).values_list("stream_key", flat=True)
+        )
+
+        targets = {}
+        for index, data in valid.items():
+            stream = streams.get(data["stream"])
+            if stream is None or not stream.stream_id:
+                errors = {"stream": [_("Stream not found.")]}
+            elif stream.status != StreamStatus.IDLE:
+                errors = {"stream": [_("Stream must be idle to change simulcasts.")]}
+            elif data["stream_key"] in taken:
+                errors = {"stream_key": [_("Stream key already in use.")]}
+            else:
+                taken.add(data["stream_key"])
+                targets[index] = Simulcast(
+                    stream=stream, stream_key=data["stream_key"], url=data["url"]
+                )
+                continue
+            results[index] = {"status": "invalid", "errors": errors}
+        return targets
+
+    def create_targets(self, targets, results):
+        def create(simulcast):
+            return CreateStreamSimulcast().create_mux_simulcast(
+                simulcast.stream.stream_id, simulcast.stream_key, simulcast.url
+            )
+
+        created = {}
+        for index, outcome in self.fan_out(create, targets).items():
+            if isinstance(outcome, Exception):
+                results[index] = self.failure(outcome, "create_mux_simulcast")
+            else:
+                targets[index].simulcast_id = outcome.data.id
+                created[index] = targets[index]
+
+        try:
+            with transaction.atomic():
+                Simulcast.objects.bulk_create(list(created.values()))
+        except Exception:
+            self.fan_out(self.remove_orphan, created)
+            raise
+        # bulk_create skips the post_save receivers
+        for stream_id in {simulcast.stream_id for simulcast in created.values()}:
+            stream_versions.bump(stream_id)
+
+        data = SimulcastSerializer(list(created.values()), many=True).data
+        for index, simulcast_data in zip(created, data):
+            results[index] = {"status": "created", "simulcast": simulcast_data}
+
+    def remove_orphan(self, simulcast):
+        try:
+            RemoveStreamSimulcast().remove_mux_simulcast(
+                simulcast.stream.stream_id, simulcast.simulcast_id
+            )
+        except NotFoundException:
+            pass
+        except Exception:
+            logger.exception(
+                "Could not remove orphaned Mux simulcast target %s",
+                simulcast.simulcast_id,
+            )
+
+    def enqueue_targets(self, targets, results):
+        jobs = MuxJob.objects.bulk_create(
+            [
+                MuxJob(
+                    operation=MuxOperation.CREATE_SIMULCAST,
+                    stream=simulcast.stream,
+                    payload={"stream_key": simulcast.stream_key, "url": simulcast.url},
+                )
+                for simulcast in targets.values()
+            ]
+        )
+        self.queued(targets, jobs, results)
+
+
+class BulkRemoveSimulcasts(BulkMuxMixin, GenericAPIView):
+    """
+    Removes the simulcast targets of a JSON list of ``simulcast_id`` strings,
+    across any number of streams, with one ``DELETE`` for the local rows.
+    """
+
+    models = Simulcast
+    queryset = Simulcast.objects
+
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        results = [None] * len(items)
+        simulcasts = Simulcast.objects.select_related("stream").in_bulk(
+            [item for item in items if isinstance(item, str)], field_name="simulcast_id"
+        )
+
+        targets = {}
+        for index, simulcast_id in enumerate(items):
+            simulcast = (
+                simulcasts.get(simulcast_id) if isinstance(simulcast_id, str) else None
+            )
+            if simulcast is None:
+                results[index] = {"status": "not_found"}
+            elif simulcast in targets.values():
+                results[index] = {
+                    "status": "invalid",
+                    "errors": [_("Simulcast target listed more than once.")],
+                }
+            elif simulcast.stream.status != StreamStatus.IDLE:
+                results[index] = {
+                    "status": "invalid",
+                    "errors": [_("Stream must be idle to change simulcasts.")],
+                }
+            else:
+                targets[index] = simulcast
+
+        if settings.MUX_ASYNC_JOBS:
+            self.enqueue_removals(targets, results)
+        else:
+            self.remove_targets(targets, results)
+        return self.bulk_response(results)
+
+    def remove_targets(self, targets, results):
+        def remove(simulcast):
+            try:
+                RemoveStreamSimulcast().remove_mux_simulcast(
+                    simulcast.stream.stream_id, simulcast.simulcast_id
+                )
+            except NotFoundException:
+                pass  # Already gone on Mux, drop the local row as well
+
+        removed = {}
+        for index, outcome in self.fan_out(remove, targets).items():
+            if isinstance(outcome, Exception):
+                results[index] = self.failure(outcome, "remove_mux_simulcast")
+            else:
+                removed[index] = targets[index]
+
+        Simulcast.objects.filter(
+            pk__in=[simulcast.pk for simulcast in removed.values()]
+        ).delete()
+        for index, simulcast in removed.items():
+            results[index] = {
+                "status": "removed",
+                "simulcast_id": simulcast.simulcast_id,
+            }
+
+    def enqueue_removals(self, targets, results):
+        jobs = MuxJob.objects.bulk_create(
+            [
+                MuxJob(
+                    operation=MuxOperation.REMOVE_SIMULCAST,
+                    stream=simulcast.stream,
+                    payload={"simulcast_id": simulcast.simulcast_id},
+                )
+                for simulcast in targets.values()
+            ]
+        )
+        self.queued(targets, jobs, results)
+
+
+class ListStreamSimulcasts(ConditionalGetMixin, FastReadMixin, ListAPIView):
+    # No replica_reads, like ListStream
     models = Simulcast
     serializer_class = SimulcastSerializer
+    pagination_class = SimulcastCursorPagination
     lookup_url_kwarg = "stream_id"
 
     def get_queryset(self):
         stream_id = self.kwargs[self.lookup_url_kwarg]
         return Simulcast.objects.filter(stream__stream_id=stream_id)
 
+    def get_version(self):
+        # Simulcast writes bump the version of their stream
+        stream = stream_cache.get("stream_id", self.kwargs[self.lookup_url_kwarg])
+        return (stream_versions.get(stream.pk) if stream else "missing"), None
+
 
-class RemoveStreamSimulcast(DestroyAPIView):
+class RemoveStreamSimulcast(MuxJobMixin, DestroyAPIView):
     models = Simulcast
     queryset = Simulcast.objects
     serializer_class = SimulcastSerializer
@@ -415,6 +1003,17 @@ class RemoveStreamSimulcast(DestroyAPIView):
     lookup_field = "simulcast_id"
     lookup_url_kwarg = "simulcast_id"
 
+    def destroy(self, request, *args, **kwargs):
+        if not settings.MUX_ASYNC_JOBS:
+            return super().destroy(request, *args, **kwargs)
+
+        instance: Simulcast = self.get_object()
+        return self.enqueue_job(
+            MuxOperation.REMOVE_SIMULCAST,
+            instance.stream,
+            simulcast_id=instance.simulcast_id,
+        )
+
     def perform_destroy(self, instance: Simulcast):
         try:
             self.remove_mux_simulcast(instance.stream.stream_id, instance.simulcast_id)
@@ -425,21 +1024,57 @@ class RemoveStreamSimulcast(DestroyAPIView):
         return super().perform_destroy(instance)
 
     def remove_mux_simulcast(self, stream_id, simulcast_id):
-        live_api = mux_python.LiveStreamsApi(mux_python.ApiClient(configuration))
+        live_api = mux.live_streams
         live_api.delete_live_stream_simulcast_target(
             live_stream_id=stream_id, simulcast_target_id=simulcast_id
         )
 
 
-class RetrieveStreamSimulcast(RetrieveAPIView):
+class RetrieveStreamSimulcast(ConditionalGetMixin, FastReadMixin, RetrieveAPIView):
     models = Simulcast
+    replica_reads = True
+    serializer_class = SimulcastSerializer
+    lookup_field = "simulcast_id"
 
     def get_queryset(self):
         stream_id = self.kwargs.get("stream_id", "")
         simulcast_id = self.kwargs.get("simulcast_id", "")
         return Simulcast.objects.filter(stream_id=stream_id, simulcast_id=simulcast_id)
 
+    def get_version(self):
+        # Only the validator columns, the full row is loaded on a 200
+        row = self.get_queryset().values("pk", "updated_at").first()
+        if row is None:
+            raise NotFound(_("Simulcast not found."))
+        return f"{row['pk']}:{row['updated_at'].isoformat()}", row["updated_at"]
+
+
+# Jobs
+class RetrieveMuxJob(RetrieveAPIView):
+    model = MuxJob
+    queryset = MuxJob.objects
+    serializer_class = MuxJobSerializer
+
 
 # Webhooks
 class UpdateStreamStatus(GenericAPIView):
-    pass
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request, *args, **kwargs):
+        body = request.body
+        if not verify_signature(body, request.headers.get("Mux-Signature", "")):
+            raise PermissionDenied(_("Invalid webhook signature."))
+
+        try:
+            event = json.loads(body)
+        except ValueError:
+            raise ParseError(_("Invalid webhook payload."))
+        event_id = event.get("id") if isinstance(event, dict) else None
+        if not event_id or not isinstance(event_id, str):
+            raise ParseError(_("Invalid webhook payload."))
+
+        # Stored before answering: Mux does not redeliver acknowledged events.
+        # Redeliveries of unacknowledged ones are ignored by their id.
+        status_updates.add(event)
+        return Response(status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,213 @@
+import atexit
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import stream_cache, stream_versions
+from .feed import live_now
+from .models import Stream, StreamStatus, WebhookEvent
+from .tokens import status_tokens
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two deletions of the events older than MUX_WEBHOOK_DEDUPE_TTL
+PURGE_INTERVAL = 60 * 60
+
+# Mux live stream events that move the local Stream.status
+EVENT_STATUSES = {
+    "video.live_stream.active": StreamStatus.ACTIVE,
+    "video.live_stream.idle": StreamStatus.IDLE,
+    "video.live_stream.disabled": StreamStatus.DISABLED,
+    "video.live_stream.enabled": StreamStatus.IDLE,
+}
+
+
+def verify_signature(body: bytes, header: str) -> bool:
+    """Check a ``Mux-Signature: t=<timestamp>,v1=<hmac>`` header against the body."""
+    secret = settings.MUX_WEBHOOK_SECRET
+    if not secret or not header:
+        return False
+
+    parts = dict(part.split("=", 1) for part in header.split(",") if "=" in part)
+    timestamp = parts.get("t", "")
+    signature = parts.get("v1", "")
+    if not timestamp.isdigit() or not signature:
+        return False
+    if abs(time.time() - int(timestamp)) > settings.MUX_WEBHOOK_TOLERANCE:
+        return False
+
+    payload = timestamp.encode() + b"." + body
+    expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class StatusUpdateBatcher:
+    """
+    Records status transitions from webhook events and applies them in batches.
+
+    ``record`` stores each event as a ``WebhookEvent`` row before the webhook
+    is acknowledged, so a restart loses nothing, and its unique event id
+    dedupes Mux redeliveries across workers. A background thread applies the
+    pending rows with ``bulk_update`` every ``MUX_WEBHOOK_FLUSH_INTERVAL``
+    seconds, or as soon as ``MUX_WEBHOOK_BATCH_SIZE`` events arrived, keeping
+    the newest event of each live stream. Rows left pending by a worker that
+    died are applied by the next flush of any worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._received = 0
+        self._purged_at = 0.0
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, event: dict) -> bool:
+        if not self.record(event):
+            return False
+        with self._lock:
+            self._received += 1
+            full = self._received >= settings.MUX_WEBHOOK_BATCH_SIZE
+        if full:
+            self._wakeup.set()
+        self._start()
+        return True
+
+    def record(self, event: dict) -> bool:
+        """Store ``event``; ``False`` if it moves no status or was already received."""
+        status = EVENT_STATUSES.get(event.get("type"))
+        live_stream = event.get("object")
+        live_stream_id = (
+            live_stream.get("id") if isinstance(live_stream, dict) else None
+        )
+        if status is None or not live_stream_id:
+            return False
+
+        occurred_at = event.get("created_at")
+        occurred_at = isinstance(occurred_at, str) and parse_datetime(occurred_at)
+        try:
+            with transaction.atomic():
+                WebhookEvent.objects.create(
+                    event_id=event["id"],
+                    live_stream_id=live_stream_id,
+                    status=status,
+                    occurred_at=occurred_at or timezone.now(),
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    def flush(self) -> int:
+        with self._lock:
+            self._received = 0
+
+        updated = 0
+        batch_size = settings.MUX_WEBHOOK_BATCH_SIZE
+        while True:
+            with transaction.atomic():
+                # skip_locked lets the workers flush different batches
+                events = list(
+                    WebhookEvent.objects.select_for_update(skip_locked=True)
+                    .filter(applied_at=None)
+                    .order_by("received_at")[:batch_size]
+                )
+                changed = self._apply(events)
+                WebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(
+                    applied_at=timezone.now()
+                )
+            # bulk_update skips post_save, so drop the cached tokens and rows
+            # here, once readers can see the new status
+            for stream in changed:
+                status_tokens.invalidate(stream.pk)
+                stream_cache.invalidate(stream)
+                stream_versions.bump(stream.pk)
+            live_now.update(changed)
+
+            updated += len(changed)
+            if len(events) < batch_size:
+                break
+
+        self._purge()
+        return updated
+
+    def flush_received(self):
+        """Apply the events this process received since its last flush, if any."""
+        if self._received:
+            self.flush()
+
+    def _apply(self, events: list) -> list:
+        newest = {}
+        for event in events:
+            current = newest.get(event.live_stream_id)
+            if current is None or current.occurred_at <= event.occurred_at:
+                newest[event.live_stream_id] = event
+
+        # Skip events older than the last one applied for the same stream
+        applied = dict(
+            WebhookEvent.objects.filter(
+                applied_at__isnull=False, live_stream_id__in=newest
+            )
+            .values("live_stream_id")
+            .annotate(last=Max("occurred_at"))
+            .values_list("live_stream_id", "last")
+        )
+        pending = {
+            live_stream_id: event.status
+            for live_stream_id, event in newest.items()
+            if live_stream_id not in applied
+            or applied[live_stream_id] <= event.occurred_at
+        }
+
+        changed = []
+        now = timezone.now()
+        streams = Stream.objects.filter(stream_id__in=list(pending)).only(
+            "id", "stream_id", "status", "updated_at"
+        )
+        for stream in streams:
+            if stream.status != pending[stream.stream_id]:
+                stream.status = pending[stream.stream_id]
+                stream.updated_at = now
+                changed.append(stream)
+        Stream.objects.bulk_update(changed, ["status", "updated_at"])
+        return changed
+
+    def _purge(self):
+        # Applied events are kept as long as Mux may redeliver them
+        if time.monotonic() - self._purged_at < PURGE_INTERVAL:
+            return
+        self._purged_at = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=settings.MUX_WEBHOOK_DEDUPE_TTL)
+        WebhookEvent.objects.filter(applied_at__lt=cutoff).delete()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="mux-webhooks", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.MUX_WEBHOOK_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not apply Mux webhook status updates.")
+            finally:
+                close_old_connections()
+
+
+status_updates = StatusUpdateBatcher()
+atexit.register(status_updates.flush_received)
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import django
 import dotenv
+import json
 import os
 from pathlib import Path
 
@@ -36,6 +38,129 @@ MUX_TOKEN_SECRET = os.environ["MUX_TOKEN_SECRET"]
 MUX_SIGNING_KEY = os.environ["MUX_SIGNING_KEY"]
 MUX_PRIVATE_KEY = os.environ["MUX_PRIVATE_KEY"]
 
+# Shared Mux API client: urllib3 pools kept per host and connections kept alive
+# per pool, plus (connect, read) timeouts in seconds applied to every call.
+# MUX_API_HOST and MUX_STATS_URL can point at `manage.py run_fake_mux`.
+MUX_API_HOST = os.environ.get("MUX_API_HOST", "https://api.mux.com")
+MUX_API_POOL_SIZE = int(os.environ.get("MUX_API_POOL_SIZE", 4))
+MUX_API_POOL_MAXSIZE = int(os.environ.get("MUX_API_POOL_MAXSIZE", 16))
+MUX_API_CONNECT_TIMEOUT = float(os.environ.get("MUX_API_CONNECT_TIMEOUT", 3.05))
+MUX_API_READ_TIMEOUT = float(os.environ.get("MUX_API_READ_TIMEOUT", 10))
+
+# Mux call policy: overall deadline per operation in seconds (DEADLINES is a JSON
+# object of per-operation overrides), retries of idempotent calls with jittered
+# exponential backoff, and a circuit breaker per service that opens when
+# ERROR_RATE of at least MIN_CALLS calls in the last WINDOW seconds failed and
+# fails fast for COOLDOWN seconds before letting a trial call through.
+MUX_API_DEADLINE = float(os.environ.get("MUX_API_DEADLINE", 15))
+MUX_API_DEADLINES = json.loads(
+    os.environ.get("MUX_API_DEADLINES", '{"get_viewer_counts": 5}')
+)
+MUX_API_RETRIES = int(os.environ.get("MUX_API_RETRIES", 2))
+MUX_API_RETRY_BACKOFF = float(os.environ.get("MUX_API_RETRY_BACKOFF", 0.2))
+MUX_API_RETRY_BACKOFF_MAX = float(os.environ.get("MUX_API_RETRY_BACKOFF_MAX", 2))
+MUX_BREAKER_WINDOW = float(os.environ.get("MUX_BREAKER_WINDOW", 30))
+MUX_BREAKER_MIN_CALLS = int(os.environ.get("MUX_BREAKER_MIN_CALLS", 10))
+MUX_BREAKER_ERROR_RATE = float(os.environ.get("MUX_BREAKER_ERROR_RATE", 0.5))
+MUX_BREAKER_COOLDOWN = float(os.environ.get("MUX_BREAKER_COOLDOWN", 15))
+
+# Viewer counts: fresh for TTL seconds, then served stale for up to STALE_TTL
+# seconds while a background refresh runs.
+MUX_STATS_URL = os.environ.get("MUX_STATS_URL", "https://stats.mux.com/counts")
+MUX_STATS_TIMEOUT = float(os.environ.get("MUX_STATS_TIMEOUT", 3))
+MUX_STATS_POOL_MAXSIZE = int(os.environ.get("MUX_STATS_POOL_MAXSIZE", 16))
+MUX_STATS_REFRESH_WORKERS = int(os.environ.get("MUX_STATS_REFRESH_WORKERS", 4))
+MUX_VIEWER_COUNTS_TTL = float(os.environ.get("MUX_VIEWER_COUNTS_TTL", 5))
+MUX_VIEWER_COUNTS_STALE_TTL = float(os.environ.get("MUX_VIEWER_COUNTS_STALE_TTL", 60))
+
+# Set when `manage.py poll_viewer_counts` runs: the status endpoint then only
+# reads the cache, which must be shared (see CACHES). The poller fetches every
+# INTERVAL seconds, CONCURRENCY at once.
+MUX_VIEWER_COUNTS_POLLING = os.environ.get("MUX_VIEWER_COUNTS_POLLING", "") == "1"
+MUX_VIEWER_COUNTS_POLL_INTERVAL = float(
+    os.environ.get("MUX_VIEWER_COUNTS_POLL_INTERVAL", 5)
+)
+MUX_VIEWER_COUNTS_POLL_CONCURRENCY = int(
+    os.environ.get("MUX_VIEWER_COUNTS_POLL_CONCURRENCY", 16)
+)
+
+# Viewer-count JWTs: lifetime, how early they are re-issued in the background
+# and how long a worker trusts its in-process copy (all in seconds), and how
+# many in-process copies a worker keeps.
+MUX_STATUS_TOKEN_LIFETIME = int(
+    os.environ.get("MUX_STATUS_TOKEN_LIFETIME", 5 * 60 * 60)
+)
+MUX_STATUS_TOKEN_REFRESH_BEFORE = int(
+    os.environ.get("MUX_STATUS_TOKEN_REFRESH_BEFORE", 15 * 60)
+)
+MUX_STATUS_TOKEN_LOCAL_TTL = float(os.environ.get("MUX_STATUS_TOKEN_LOCAL_TTL", 5))
+MUX_STATUS_TOKEN_LOCAL_MAX_ENTRIES = int(
+    os.environ.get("MUX_STATUS_TOKEN_LOCAL_MAX_ENTRIES", 1024)
+)
+
+# Webhooks: signing secret, accepted clock skew and dedupe window (seconds), and
+# how status transitions are batched into bulk updates.
+MUX_WEBHOOK_SECRET = os.environ.get("MUX_WEBHOOK_SECRET", "")
+MUX_WEBHOOK_TOLERANCE = int(os.environ.get("MUX_WEBHOOK_TOLERANCE", 5 * 60))
+MUX_WEBHOOK_DEDUPE_TTL = int(os.environ.get("MUX_WEBHOOK_DEDUPE_TTL", 24 * 60 * 60))
+MUX_WEBHOOK_BATCH_SIZE = int(os.environ.get("MUX_WEBHOOK_BATCH_SIZE", 500))
+MUX_WEBHOOK_FLUSH_INTERVAL = float(os.environ.get("MUX_WEBHOOK_FLUSH_INTERVAL", 1))
+
+# Mux job queue: when enabled, views that call Mux only queue a MuxJob and
+# answer 202; `manage.py run_mux_jobs` executes them with retries. Backoff and
+# lease (how long a running job stays claimed) are in seconds. The worker
+# needs the shared cache, so the web workers see the streams it changes.
+MUX_ASYNC_JOBS = os.environ.get("MUX_ASYNC_JOBS", "") == "1"
+MUX_JOB_WORKERS = int(os.environ.get("MUX_JOB_WORKERS", 4))
+MUX_JOB_POLL_INTERVAL = float(os.environ.get("MUX_JOB_POLL_INTERVAL", 1))
+MUX_JOB_MAX_ATTEMPTS = int(os.environ.get("MUX_JOB_MAX_ATTEMPTS", 5))
+MUX_JOB_RETRY_BACKOFF = float(os.environ.get("MUX_JOB_RETRY_BACKOFF", 2))
+MUX_JOB_RETRY_BACKOFF_MAX = float(os.environ.get("MUX_JOB_RETRY_BACKOFF_MAX", 300))
+MUX_JOB_LEASE = int(os.environ.get("MUX_JOB_LEASE", 5 * 60))
+
+# Bulk stream and simulcast endpoints: largest accepted batch and simultaneous
+# Mux calls per request.
+MUX_BULK_MAX = int(os.environ.get("MUX_BULK_MAX", 500))
+MUX_BULK_CONCURRENCY = int(os.environ.get("MUX_BULK_CONCURRENCY", 8))
+
+# Thumbnail renditions: widths in pixels (16:9, encoded as WebP and JPEG),
+# encoder quality, pool processes and seconds to wait for one image.
+THUMBNAIL_RENDITION_WIDTHS = [
+    int(width)
+    for width in os.environ.get("THUMBNAIL_RENDITION_WIDTHS", "320,640").split(",")
+]
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", 80))
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 2))
+THUMBNAIL_RENDER_TIMEOUT = float(os.environ.get("THUMBNAIL_RENDER_TIMEOUT", 30))
+
+# Server-sent events: seconds between upstream polls of a watched stream and
+# between keep-alive comments on idle connections.
+LIVE_EVENTS_INTERVAL = float(os.environ.get("LIVE_EVENTS_INTERVAL", 2))
+LIVE_EVENTS_HEARTBEAT = float(os.environ.get("LIVE_EVENTS_HEARTBEAT", 15))
+
+# Read-through cache of Stream rows for the stream and watch pages: "local"
+# (per-process LRU) or "shared" (the LIVE_STREAM_CACHE_ALIAS Django cache).
+# Watch pages cached for everyone only use the "shared" one.
+LIVE_STREAM_CACHE_BACKEND = os.environ.get("LIVE_STREAM_CACHE_BACKEND", "local")
+LIVE_STREAM_CACHE_ALIAS = os.environ.get("LIVE_STREAM_CACHE_ALIAS", "default")
+LIVE_STREAM_CACHE_TTL = int(os.environ.get("LIVE_STREAM_CACHE_TTL", 30))
+LIVE_STREAM_CACHE_MAX_ENTRIES = int(
+    os.environ.get("LIVE_STREAM_CACHE_MAX_ENTRIES", 1024)
+)
+
+# Bearer token the Prometheus scraper sends to /metrics; the endpoint answers
+# 404 while it is unset.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Live-now feed: seconds its orderings and entries live in the shared cache
+# before they are rebuilt from the database.
+LIVE_NOW_TTL = int(os.environ.get("LIVE_NOW_TTL", 60))
+
+# Anonymous watch pages are cached whole, list cards as fragments; both are
+# keyed by stream versions so edits and status changes show up immediately.
+WATCH_PAGE_CACHE_TTL = int(os.environ.get("WATCH_PAGE_CACHE_TTL", 5 * 60))
+WATCH_FRAGMENT_CACHE_TTL = int(os.environ.get("WATCH_FRAGMENT_CACHE_TTL", 60 * 60))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -53,6 +178,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "live.metrics.MetricsMiddleware",
+    "live.db.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -66,6 +193,10 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "live.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -92,13 +223,77 @@ WSGI_APPLICATION = "livestreaming.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# DATABASE_ENGINE defaults to SQLite. Connections are kept open for
+# CONN_MAX_AGE seconds and checked before they are reused.
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "django.db.backends.sqlite3")
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": DATABASE_ENGINE,
+        "NAME": os.environ.get("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+        "USER": os.environ.get("DATABASE_USER", ""),
+        "PASSWORD": os.environ.get("DATABASE_PASSWORD", ""),
+        "HOST": os.environ.get("DATABASE_HOST", ""),
+        "PORT": os.environ.get("DATABASE_PORT", ""),
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": os.environ.get("DATABASE_CONN_HEALTH_CHECKS", "1") == "1",
+        "OPTIONS": {},
     }
 }
 
+# SQLite: seconds a connection waits on a locked database, and pragmas run on
+# every new connection (JSON object). WAL lets readers run during a write.
+# Transactions take the write lock when they begin (Django 5.1+), so they wait
+# out the busy timeout instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 20))
+SQLITE_PRAGMAS = json.loads(
+    os.environ.get(
+        "SQLITE_PRAGMAS",
+        '{"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -20000, '
+        '"temp_store": "MEMORY", "mmap_size": 134217728}',
+    )
+)
+if DATABASE_ENGINE == "django.db.backends.sqlite3":
+    DATABASES["default"]["OPTIONS"]["timeout"] = SQLITE_BUSY_TIMEOUT
+    if django.VERSION >= (5, 1):
+        DATABASES["default"]["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+
+# Read replicas of the default database, one alias per host of the comma
+# separated DATABASE_REPLICA_HOSTS. See live/db.py for the views that use them;
+# clients read the primary for DATABASE_REPLICA_PIN seconds after a write.
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_HOSTS", "").split(","))
+):
+    DATABASE_REPLICAS.append(f"replica_{index}")
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICA_PIN = int(os.environ.get("DATABASE_REPLICA_PIN", 5))
+DATABASE_ROUTERS = ["live.db.ReplicaRouter"]
+
+# Cache shared by every process: the webhooks, job runner, reconciler and
+# viewer-count poller write keys that the web workers read. Set REDIS_URL or
+# MEMCACHED_LOCATION (comma separated host:port) in production; the
+# process-local fallback only suits a single development process.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+elif os.environ.get("MEMCACHED_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.environ["MEMCACHED_LOCATION"].split(","),
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -16,6 +16,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic.base import RedirectView
+from live.metrics import metrics
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularRedocView,
@@ -29,5 +30,6 @@ urlpatterns = [
     path("live/", include("live.urls")),
     path("watch/", include("watch.urls")),
     path("docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger"),
+    path("metrics", metrics, name="metrics"),
     path("redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
 ]
@@ -1,3 +1,88 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from live.cache import stream_cache
+from live.models import Stream, StreamStatus
+from live.webhooks import status_updates
+
+
+class ListStreamsQueriesTest(TestCase):
+    def test_list_queries(self):
+        for total in (1, 5, 25):
+            with self.captureOnCommitCallbacks(execute=True):
+                Stream.objects.all().delete()
+                for i in range(total):
+                    Stream.objects.create(
+                        title=f"Stream {i}",
+                        playback_id=f"play-{i}",
+                        status=StreamStatus.ACTIVE if i % 2 else StreamStatus.IDLE,
+                    )
+            with self.subTest(streams=total), self.assertNumQueries(1):
+                response = self.client.get(reverse("list"))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "Stream 0")
+            self.assertContains(response, "lives/thumbnails/default.png")
+
+
+class SearchTest(TestCase):
+    def test_search_streams(self):
+        Stream.objects.create(title="Show de rock")
+        Stream.objects.create(title="Podcast de ciência")
+
+        response = self.client.get(reverse("list"), {"search": "rock"})
+        self.assertContains(response, "Show de rock")
+        self.assertNotContains(response, "Podcast de ciência")
+        self.assertContains(response, 'value="rock"')
+
+
+class LiveNowTest(TestCase):
+    def test_live_now_page(self):
+        cache.clear()
+        Stream.objects.create(
+            title="Ao vivo", playback_id="play-live", status=StreamStatus.ACTIVE
+        )
+        Stream.objects.create(title="Parada", playback_id="play-idle")
+
+        response = self.client.get(reverse("now"))
+        self.assertContains(response, "Ao vivo")
+        self.assertContains(response, "https://image.mux.com/play-live/animated.webp")
+        self.assertNotContains(response, "Parada")
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stream = Stream.objects.create(
+            title="Cached", stream_id="cached", playback_id="play-cached"
+        )
+
+    def test_watch_page_served_from_cache(self):
+        url = reverse("view", args=[self.stream.pk])
+        self.client.get(url)
+        stream_cache.invalidate(self.stream)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Cached")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stream.title = "Renamed"
+            self.stream.save()
+        self.assertContains(self.client.get(url), "Renamed")
+
+    def test_list_page_follows_status(self):
+        self.client.get(reverse("list"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("list"))
+        self.assertContains(response, "lives/thumbnails/default.png")
+
+        status_updates.record(
+            {
+                "id": "evt-cached",
+                "type": "video.live_stream.active",
+                "object": {"id": "cached"},
+            }
+        )
+        status_updates.flush()
+        response = self.client.get(reverse("list"))
+        self.assertContains(response, "https://image.mux.com/play-cached/")
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import WatchStream, ListStreams
+from .views import LiveNow, WatchStream, ListStreams
 
 urlpatterns = [
     path("", view=ListStreams.as_view(), name="list"),
+    path("now/", view=LiveNow.as_view(), name="now"),
     path("<str:pk>", view=WatchStream.as_view(), name="view"),
 ]
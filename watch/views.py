@@ -1,15 +1,138 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
-from django.views.generic import DetailView, ListView
+from django.views.generic import DetailView, ListView, TemplateView
+from rest_framework.request import Request
+from live.cache import stream_cache, stream_versions
+from live.db import use_primary
 from live.models import Stream
+from live.feed import LiveNowFeed
+from live.filters import StreamSearchFilter
+from live.models import ThumbnailURL
+from live.pagination import (
+    LiveNowPagination,
+    StreamCursorPagination,
+    StreamSearchPagination,
+)
+
+PAGE_KEY = "watch:page:{}:{}"
+
+
+class CachedPageMixin:
+    """
+    Serves anonymous GETs from the shared cache under a versioned key, so a
+    hit costs one or two cache reads and no ORM or template work.
+    """
+
+    # True while rendering a page for the cache
+    filling_page = False
+
+    def get_page_key(self) -> str:
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_page_key()
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        # Shared with everyone, so never rendered from a lagging replica
+        self.filling_page = True
+        with use_primary():
+            response = super().get(request, *args, **kwargs)
+            response.render()
+        if response.status_code == 200:
+            cache.set(key, response.content, settings.WATCH_PAGE_CACHE_TTL)
+        return response
 
 
-class WatchStream(DetailView):
+class WatchStream(CachedPageMixin, DetailView):
     model = Stream
+    replica_reads = True
     queryset = Stream.objects
     template_name = "watch.html"
 
+    def get_page_key(self):
+        pk = self.kwargs["pk"]
+        return PAGE_KEY.format(f"stream-{pk}", stream_versions.get(pk))
 
-class ListStreams(ListView):
+    def get_object(self, queryset=None):
+        pk = self.kwargs["pk"]
+        if self.filling_page and settings.LIVE_STREAM_CACHE_BACKEND != "shared":
+            # A process-local row can be older than the shared version in the
+            # page key, and would be cached under it for everyone
+            stream = self.get_queryset().filter(pk=pk).first()
+        else:
+            stream = stream_cache.get("pk", pk)
+        if stream is None:
+            raise Http404("Stream not found.")
+        return stream
+
+
+class ListStreams(CachedPageMixin, ListView):
     model = Stream
-    queryset = Stream.objects
+    # Only what list.html renders, thumbnails joined in the same query
+    queryset = Stream.objects.select_related("thumbnail").only(
+        "id",
+        "title",
+        "status",
+        "playback_id",
+        "created_at",
+        "thumbnail__thumbnail",
+        "thumbnail__renditions",
+    )
     template_name = "list.html"
+    pagination_class = StreamCursorPagination
+
+    def get_page_key(self):
+        path = hashlib.md5(self.request.get_full_path().encode()).hexdigest()
+        return PAGE_KEY.format(f"list-{path}", stream_versions.get_list())
+
+    def get_queryset(self):
+        request = Request(self.request)
+        return StreamSearchFilter().filter_queryset(
+            request, super().get_queryset(), self
+        )
+
+    def get_context_data(self, **kwargs):
+        request = Request(self.request)
+        search = StreamSearchFilter()
+        paginator = (
+            StreamSearchPagination()
+            if search.is_searching(request)
+            else self.pagination_class()
+        )
+        object_list = paginator.paginate_queryset(self.object_list, request, view=self)
+        # Cards are cached as fragments under their stream's own version
+        versions = stream_versions.get_streams([stream.pk for stream in object_list])
+        for stream in object_list:
+            stream.cache_version = versions[stream.pk]
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context["next_url"] = paginator.get_next_link()
+        context["previous_url"] = paginator.get_previous_link()
+        context["card_cache_ttl"] = settings.WATCH_FRAGMENT_CACHE_TTL
+        context["search"] = request.query_params.get(search.search_param, "")
+        return context
+
+
+class LiveNow(TemplateView):
+    template_name = "live_now.html"
+
+    def get_context_data(self, **kwargs):
+        request = Request(self.request)
+        paginator = LiveNowPagination()
+        ordering = request.query_params.get("order", "recent")
+        entries = paginator.paginate_queryset(LiveNowFeed(ordering), request)
+        for entry in entries:
+            entry["thumbnail_url"] = ThumbnailURL.animated(entry["playback_id"])
+        context = super().get_context_data(object_list=entries, **kwargs)
+        context["ordering"] = ordering
+        context["next_url"] = paginator.get_next_link()
+        context["previous_url"] = paginator.get_previous_link()
+        return context